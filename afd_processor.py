@@ -1,13 +1,27 @@
+import queue
 import re
+import threading
+import time
 from datetime import datetime
-from typing import Optional
+from typing import NamedTuple, Optional
 import mwparserfromhell
 import pywikibot
 from timezone_utils import ensure_utc, now_utc, from_timestamp_utc, to_utc_string
-from config import site
+from config import site, AFD_BATCH_SECONDS, AFD_BATCH_SIZE, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_PATH
+from page_cache import cached_page_text, open_page_cache
+from pipeline_metrics import PipelineMetrics
 #from reviewer_finder import get_reviewers
 #from notification_storage import save_pending_notification
 
+# Start of any {{la}} template, and one whose first positional value is plain text
+LA_START_RE = re.compile(r'\{\{\s*la\s*[|}]', re.IGNORECASE)
+LA_TEMPLATE_RE = re.compile(r'\{\{\s*la\s*\|\s*(?:1\s*=\s*)?([^{}|\[\]<>=\n]*?)\s*(?:\||\}\})', re.IGNORECASE)
+HEADING_RE = re.compile(r'^(={1,6})(.+?)\1[ \t]*$', re.MULTILINE)
+# Markup that hides templates or headings from the parser
+HIDDEN_MARKUP_RE = re.compile(r'<!--|<nowiki|<pre|<math|<syntaxhighlight|<source', re.IGNORECASE)
+# Templates, tables and tags, inside which a line can look like a heading without being one
+HEADING_BLOCKER_RE = re.compile(r'\{[{|]|<[A-Za-z/]')
+
 def process_afd(afd_title: str, afd_timestamp: datetime, afd_user: str = None):
     try:
         afd_page = pywikibot.Page(site, afd_title)
@@ -16,25 +30,65 @@ def process_afd(afd_title: str, afd_timestamp: datetime, afd_user: str = None):
             print(f"AfD page missing: {afd_title}")
             return
 
-        article_title = extract_article_title(afd_page.text)
+        cache = open_page_cache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES)
+        article_title = extract_article_title(cached_page_text(cache, afd_page))
         if not article_title:
             print(f"cannot extract article title from: {afd_title}")
             return
 
-        print(f"Afded article: {article_title}")
-        #reviewers = get_reviewers(article_title, afd_timestamp, afd_user)
-        reviewers = None
-
-        if not reviewers:
-            print(f"no reviewers found for: {article_title}")
-            return
-
-        #save_pending_notification(afd_title, article_title, afd_timestamp, reviewers)
+        process_afd_article(afd_title, article_title, afd_timestamp, afd_user)
 
     except Exception as e:
         print(f"AfD processing error '{afd_title}': {e}")
 
+def process_afd_article(afd_title: str, article_title: str, afd_timestamp: datetime, afd_user: str = None):
+    print(f"Afded article: {article_title}")
+    #reviewers = get_reviewers(article_title, afd_timestamp, afd_user)
+    reviewers = None
+
+    if not reviewers:
+        print(f"no reviewers found for: {article_title}")
+        return
+
+    #save_pending_notification(afd_title, article_title, afd_timestamp, reviewers)
+
 def extract_article_title(wikitext: str) -> Optional[str]:
+    """Return the article an AfD page is about, from its {{la}} template or else its first heading link."""
+    return fast_article_title(wikitext) or parse_article_title(wikitext)
+
+def fast_article_title(wikitext: str) -> Optional[str]:
+    """
+    Find the article title with regexes alone, when the page is simple enough for them to agree with the parser.
+
+    Returns None, so the caller falls back to parse_article_title, when a {{la}} template has
+    markup in its value, when the page has template parameters such as {{{la|...}}}, when
+    comments, nowiki or pre could hide a template or heading, or when a template, table or
+    tag comes before the heading the title would be read from.
+    """
+    if '{{{' in wikitext:
+        return None
+    hidden = HIDDEN_MARKUP_RE.search(wikitext)
+    limit = hidden.start() if hidden else len(wikitext)
+    la_start = LA_START_RE.search(wikitext, 0, limit)
+    if la_start:
+        match = LA_TEMPLATE_RE.match(wikitext, la_start.start())
+        if match and match.end() <= limit and match.group(1):
+            return match.group(1)
+        return None
+    if hidden:
+        # a {{la}} after the hidden markup still wins over any heading
+        return None
+    blocker = HEADING_BLOCKER_RE.search(wikitext)
+    for heading in HEADING_RE.finditer(wikitext):
+        if blocker and blocker.start() < heading.end():
+            return None
+        match = re.search(r'\[\[:?(.*?)\]\]', heading.group(2).strip())
+        if match:
+            return match.group(1).strip()
+    return None
+
+def parse_article_title(wikitext: str) -> Optional[str]:
+    """Find the article title with mwparserfromhell."""
     try:
         wikicode = mwparserfromhell.parse(wikitext)
 
@@ -54,3 +108,121 @@ def extract_article_title(wikitext: str) -> Optional[str]:
         print(f"title extraction error: {e}")
 
     return None
+
+
+class AfdEvent(NamedTuple):
+    afd_title: str
+    afd_timestamp: datetime
+    afd_user: str | None
+    # time.monotonic() when the event was submitted
+    submitted: float
+
+
+class AfdBatchProcessor:
+    """
+    Process new AfDs in micro-batches on a background thread.
+
+    Submitted AfDs are grouped into batches of up to batch_size, or whatever arrived within
+    batch_seconds of a batch's first AfD. The texts of a batch come from one multi-title
+    query instead of an exists() call and a text request per AfD,
+    and the article title is read with regexes, falling back to mwparserfromhell only for
+    pages they cannot read safely. The cost per AfD stays flat however many arrive at once.
+
+    Counters and the fetch, extract and end-to-end latencies are kept in .metrics, see stats().
+    """
+
+    def __init__(self, batch_size: int = AFD_BATCH_SIZE, batch_seconds: float = AFD_BATCH_SECONDS):
+        """
+        Args:
+            batch_size (int): Most AfDs per batch; the API takes 50 titles per query.
+            batch_seconds (float): Longest time the first AfD of a batch waits for more.
+        """
+        self.batch_size = max(1, batch_size)
+        self.batch_seconds = batch_seconds
+        self.metrics = PipelineMetrics(time.monotonic)
+        self.counts = {'submitted': 0, 'batches': 0, 'processed': 0, 'missing': 0, 'no_title': 0,
+                       'fast_path': 0, 'parser': 0, 'errors': 0}
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='afd-batches', daemon=True)
+        self._thread.start()
+
+    def submit(self, afd_title: str, afd_timestamp: datetime, afd_user: str = None) -> None:
+        self._count('submitted')
+        self._queue.put(AfdEvent(afd_title, afd_timestamp, afd_user, time.monotonic()))
+
+    def close(self) -> None:
+        """Process the AfDs already submitted, then stop the thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self.metrics.lock:
+            self.counts[name] += amount
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            event = self._queue.get()
+            if event is None:
+                break
+            batch = [event]
+            deadline = time.monotonic() + self.batch_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                batch.append(event)
+            try:
+                self.process_batch(batch)
+            except Exception as e:
+                self._count('errors', len(batch))
+                print(f"AfD batch processing error ({len(batch)} AfDs): {e}")
+
+    def process_batch(self, batch: list[AfdEvent]) -> None:
+        self._count('batches')
+        texts = self.metrics.timed('fetch', self.fetch_texts, [event.afd_title for event in batch])
+        for event in batch:
+            text = texts.get(event.afd_title)
+            if text is None:
+                self._count('missing')
+                print(f"AfD page missing: {event.afd_title}")
+            else:
+                article_title = self.metrics.timed('extract', self.extract, text)
+                if not article_title:
+                    self._count('no_title')
+                    print(f"cannot extract article title from: {event.afd_title}")
+                else:
+                    try:
+                        process_afd_article(event.afd_title, article_title, event.afd_timestamp, event.afd_user)
+                    except Exception as e:
+                        self._count('errors')
+                        print(f"AfD processing error '{event.afd_title}': {e}")
+            end_to_end = self.metrics.stage('end_to_end')
+            with self.metrics.lock:
+                self.counts['processed'] += 1
+                end_to_end.record(event.submitted, time.monotonic())
+
+    def fetch_texts(self, afd_titles: list[str]) -> dict[str, str]:
+        """Return the text of each existing AfD page, keyed by the submitted title, with one query per group of titles."""
+        pages = {afd_title: pywikibot.Page(site, afd_title) for afd_title in dict.fromkeys(afd_titles)}
+        # new AfD pages are never cached yet, so info and text come in the same query
+        list(site.preloadpages(list(pages.values()), groupsize=self.batch_size))
+        cache = open_page_cache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES)
+        return {afd_title: cached_page_text(cache, page) for afd_title, page in pages.items() if page.exists()}
+
+    def extract(self, wikitext: str) -> Optional[str]:
+        article_title = fast_article_title(wikitext)
+        if article_title:
+            self._count('fast_path')
+            return article_title
+        self._count('parser')
+        return parse_article_title(wikitext)
+
+    def stats(self) -> dict:
+        summary = self.metrics.summary()
+        with self.metrics.lock:
+            return {**self.counts, 'stages': summary['stages'], 'elapsed_seconds': summary['elapsed_seconds']}
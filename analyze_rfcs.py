@@ -1,5 +1,6 @@
 
 import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
 
 import mwparserfromhell
 from mwparserfromhell.wikicode import Wikicode
@@ -7,43 +8,45 @@ from pywikibot import Link, Page
 
 from asyncio_demo import SENTINEL
 from calculate_statistics import calculate_statistics
-from config import DRY_RUN, MAX_RFC_PAGES_TO_PROCESS, RESULT_PAGE_TITLE, site
+from config import (ANALYZE_API_THREADS, ANALYZE_METRICS_INTERVAL, ANALYZE_PRODUCERS, ANALYZE_WORKERS, DRY_RUN,
+                    MAX_RFC_PAGES_TO_PROCESS, RESULT_PAGE_TITLE, STATISTICS_ENGINE, site)
 from find_rfc import RfcStats, get_rfc_list
+from pipeline_metrics import MeteredQueue, PipelineMetrics, stream_metrics
 from stats_publisher import draft_report, publish_report
 
 
-class RfcSectionQueue():
-    def __init__(self):
-        self.queue = asyncio.Queue(5)
+class RfcSectionQueue(MeteredQueue):
+    """Sections waiting for a stats worker; bounded so producers cannot run far ahead."""
 
-    async def put(self, item: tuple[Wikicode, str, Link]) -> None:
-        # get the size and print it
-        size = self.queue.qsize()
-        print (f"RfcSectionQueue size before put: {size}")
-        await self.queue.put(item)
+    def __init__(self, metrics: PipelineMetrics | None = None):
+        super().__init__('sections', 5, metrics)
 
-    async def get(self) -> tuple[Wikicode, str, Link]:
-        rfc_info = await self.queue.get()
-        return rfc_info
-    
-class RfcStatsQueue():
-    def __init__(self):
-        self.queue = asyncio.Queue()
+    async def put(self, item: tuple[Wikicode | str, str, Link]) -> None:
+        await super().put(item)
+
+    async def get(self) -> tuple[Wikicode | str, str, Link]:
+        return await super().get()
+
+class RfcStatsQueue(MeteredQueue):
+    """Stats of finished RfCs, drained once the workers are done."""
+
+    def __init__(self, metrics: PipelineMetrics | None = None):
+        super().__init__('stats', 0, metrics)
 
     async def put(self, item: tuple[RfcStats, str, Link]) -> None:
-        # get the size and print it
-        size = self.queue.qsize()
-        print (f"RfcStatsQueue size before put: {size}")
-        await self.queue.put(item)
+        await super().put(item)
 
     async def get(self) -> tuple[RfcStats, str, Link]:
-        # get item from queue and return
-        stats = await self.queue.get()
-        return stats
-    
+        return await super().get()
 
-async def calculate_rfc_stats_worker(rfc_queue: RfcSectionQueue, rfc_stats_queue: RfcStatsQueue, worker_id: int) -> None:
-    """Worker that continuously processes items from queue until None is received (sentinel)."""
+
+async def calculate_rfc_stats_worker(rfc_queue: RfcSectionQueue, rfc_stats_queue: RfcStatsQueue, worker_id: int,
+                                     executor: Executor | None = None) -> None:
+    """Worker that continuously processes items from queue until None is received (sentinel).
+
+    The counting runs on the executor, so the event loop keeps serving the producers meanwhile.
+    """
+    loop = asyncio.get_running_loop()
     calculated_count = 0
     while True:
         print(f"[Worker {worker_id}] Waiting for RFC section...")
@@ -61,91 +64,90 @@ async def calculate_rfc_stats_worker(rfc_queue: RfcSectionQueue, rfc_stats_queue
         stats.link = link
 
         # publish fake status for demo purposes
-        stats.user_counts = calculate_statistics(rfc_section)
+        try:
+            stats.user_counts = await loop.run_in_executor(executor, rfc_queue.metrics.timed, 'stats',
+                                                           calculate_statistics, rfc_section, STATISTICS_ENGINE)
+        except Exception as e:
+            print(f"[Worker {worker_id}] Error calculating stats for RFC ID: {rfc_id}: {e}")
+            rfc_queue.queue.task_done()
+            continue
         print(f"[Worker {worker_id}] {calculated_count} Calculated stats for RFC ID: {rfc_id}, Link: {link}, User counts: {stats.user_counts}")
         await asyncio.sleep(0)  # Yield control
         await rfc_stats_queue.put((stats, rfc_id, link))
         rfc_queue.queue.task_done()
         calculated_count += 1
 
+def report_order(result: tuple[RfcStats, str, Link]) -> tuple[str, str]:
+    """Sort key putting report results in link order, so the report is the same whatever order they came in."""
+    stats, rfc_id, link = result
+    return str(link), rfc_id
+
 async def collect_results(rfc_stats_queue: RfcStatsQueue) -> list[tuple[RfcStats, str, Link]]:
     results: list[tuple[RfcStats, str, Link]] = []
     while True:
         try:
-            # use the underlying queue's non-blocking API to drain
-            stats, rfc_id, link = rfc_stats_queue.queue.get_nowait()
+            # drain without waiting; the workers are done
+            stats, rfc_id, link = rfc_stats_queue.get_nowait()
             results.append((stats, rfc_id, link))
         except asyncio.QueueEmpty:
             break
     return results
 
-async def queue_status_monitor(rfc_queue: RfcSectionQueue, rfc_stats_queue: RfcStatsQueue) -> None:
-    """Periodically prints the sizes of the queues."""
-    while True:
-        rfc_queue_size = rfc_queue.queue.qsize()
-        rfc_stats_queue_size = rfc_stats_queue.queue.qsize()
-        print(f"[Queue Monitor] RFC Section Queue size: {rfc_queue_size}, RFC Stats Queue size: {rfc_stats_queue_size}")
-        await asyncio.sleep(5)  # Adjust the interval as needed
-        
-async def analyze_rfcs():
-    # create a queue of RFCs to analyze
-
-
-
-    rfc_queue = RfcSectionQueue()
-    rfc_stats_queue = RfcStatsQueue()
-
-    # Start producer as a task
-    producer_task = asyncio.create_task(get_rfc_list(rfc_queue))
-    consumer_task = asyncio.create_task(calculate_rfc_stats_worker(rfc_queue, rfc_stats_queue, 1))
-    # Start queue status monitor
-    monitor_task = asyncio.create_task(queue_status_monitor(rfc_queue, rfc_stats_queue))
-
-    # Wait for the producer to finish
-    await producer_task
-
-    print("Producer finished, waiting for all items to be processed...")
-    
-    # Wait for all items in the queue to be processed
-    await rfc_queue.queue.join()
-    consumer_task.cancel()
-    monitor_task.cancel()
-
-    # collect status
-    results: list[tuple[RfcStats, str, Link]] = await collect_results(rfc_stats_queue)
-    content = draft_report(results)
-    if not DRY_RUN:
-        publish_report(content, RESULT_PAGE_TITLE)
-
-    # test read result page title from config
-    
+async def analyze_rfcs(workers: int = ANALYZE_WORKERS, producers: int = ANALYZE_PRODUCERS,
+                       api_threads: int = ANALYZE_API_THREADS,
+                       metrics_interval: float = ANALYZE_METRICS_INTERVAL) -> list[tuple[RfcStats, str, Link]]:
+    """
+    Collect the signature counts of every RfC linked from the list pages and publish the report.
+
+    get_rfc_list runs the producers that find the RfC sections and `workers` stats workers
+    count their signatures. Blocking pywikibot calls and the parsing run on a pool of
+    api_threads threads, so fetches for different RfCs overlap. Once every section is
+    queued, one sentinel per worker shuts the workers down.
+
+    Throughput, queue waits and service times of each stage are printed as JSON at the
+    end, and every metrics_interval seconds while running if it is above 0.
+
+    Args:
+        workers (int): Number of stats workers.
+        producers (int): Number of tasks reading RfC sections.
+        api_threads (int): Threads running blocking calls.
+        metrics_interval (float): Seconds between metrics snapshots, 0 for the final summary only.
+    Returns:
+        list[tuple[RfcStats, str, Link]]: The stats of each RfC, with its id and link.
+    """
+    workers = max(1, workers)
+    metrics = PipelineMetrics()
+    rfc_queue = RfcSectionQueue(metrics)
+    rfc_stats_queue = RfcStatsQueue(metrics)
+
+    with ThreadPoolExecutor(max_workers=max(1, api_threads), thread_name_prefix='api') as executor:
+        consumer_tasks = [
+            asyncio.create_task(calculate_rfc_stats_worker(rfc_queue, rfc_stats_queue, worker_id, executor))
+            for worker_id in range(workers)
+        ]
+        monitor_task = None
+        if metrics_interval > 0:
+            monitor_task = asyncio.create_task(stream_metrics(metrics, metrics_interval, [rfc_queue, rfc_stats_queue]))
 
+        try:
+            await get_rfc_list(rfc_queue, executor, producers, metrics)
+            print("Producers finished, sending sentinels to workers...")
+        finally:
+            for _ in range(workers):
+                await rfc_queue.put((SENTINEL, SENTINEL, SENTINEL))
+            await asyncio.gather(*consumer_tasks)
+            if monitor_task is not None:
+                monitor_task.cancel()
+
+        # collect status
+        results: list[tuple[RfcStats, str, Link]] = await collect_results(rfc_stats_queue)
+        # workers finish in any order; sort so the report is the same from run to run
+        results.sort(key=report_order)
+        content = draft_report(results)
+        if not DRY_RUN:
+            await asyncio.get_running_loop().run_in_executor(executor, metrics.timed, 'publish',
+                                                             publish_report, content, RESULT_PAGE_TITLE)
+
+    print(f"Pipeline metrics: {metrics.to_json(indent=2)}")
 
     return results
-
-    print("All items processed, sending sentinels to workers...")
-    
-    # # Start multiple consumer workers (each runs a loop until sentinel)
-    # num_workers = 3
-    # consumer_tasks = [
-    #     asyncio.create_task(calculate_rfc_stats_worker(rfc_queue, rfc_stats_queue, i))
-    #     for i in range(num_workers)
-    # ]
-    
-    # # Wait for producer to finish, then wait for all queued items to be processed
-    # await producer_task
-    # print("Producer finished, waiting for all items to be processed...")
-    # await rfc_queue.queue.join()  # blocks until all task_done() calls match put() calls
-    
-    # print("All items processed, sending sentinels to workers...")
-    # for _ in range(num_workers):
-    #     await rfc_queue.put((None, None, None))
-    
-    # # Wait for all workers to finish
-    # await asyncio.gather(*consumer_tasks)
-    
-    # results: list[tuple[RfcStats, str, Link]] = await collect_results(rfc_stats_queue)
-    # return results
-
-
-
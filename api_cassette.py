@@ -0,0 +1,170 @@
+import copy
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from pywikibot.data import api
+
+# Parameters that change between runs without changing the answer
+VOLATILE_PARAMS = {'token', 'maxlag', 'requestid', 'curtimestamp'}
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode for a request the cassette has no response for."""
+
+
+class ApiCassette:
+    """
+    Record the MediaWiki API traffic of a run to a cassette file, or replay it without network.
+
+    Every api.Request submitted through any pywikibot site, cached requests included, is
+    keyed by its site and parameters. In record mode the request goes to the wiki and the
+    response is appended to the cassette as one JSON line, with the seconds it took. In
+    replay mode the response is served from the cassette after the injected latency:
+    a fixed number of seconds per request, or 'recorded' to wait as long as the original
+    request did. A request made several times is answered with its recorded responses in
+    order, then with the last one.
+
+    Lines are written with a single os.write on a file opened for appending, so the
+    compare threads and forked worker processes of a recording can share one cassette.
+    """
+
+    def __init__(self, path: str, mode: str = 'replay', latency: float | str = 0.0):
+        """
+        Args:
+            path (str): Cassette file, JSON lines.
+            mode (str): 'record' or 'replay'.
+            latency (float | str): Seconds to wait per replayed request, or 'recorded'.
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.misses = 0
+        self.io_seconds = 0.0
+        self.responses: dict[str, deque] = {}
+        self.fd = None
+        self.originals = {}
+        if mode == 'record':
+            self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        else:
+            self.load()
+
+    def load(self) -> int:
+        """Read the recorded responses of the cassette, returning how many there are."""
+        count = 0
+        with open(self.path, encoding='utf-8') as cassette:
+            for line in cassette:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self.responses.setdefault(record['key'], deque()).append((record['seconds'], record['response']))
+                count += 1
+        print(f"Loaded {count} API responses from {self.path}")
+        return count
+
+    @staticmethod
+    def request_key(request: api.Request) -> str:
+        """Return the key of a request: its site and its parameters without the volatile ones."""
+        params = []
+        for name, value in sorted(request._encoded_items().items()):
+            if name in VOLATILE_PARAMS:
+                continue
+            params.append([name, value.decode('utf-8') if isinstance(value, bytes) else str(value)])
+        return json.dumps([str(request.site), params], ensure_ascii=False)
+
+    def submit(self, original, request: api.Request) -> dict:
+        """Record or replay one submitted request; original is the unpatched submit method."""
+        if getattr(request, '_cassette_handled', False):
+            # a CachedRequest falling through to Request.submit, already handled one level up
+            return original(request)
+        request._cassette_handled = True
+        try:
+            request._add_defaults()
+            key = self.request_key(request)
+            if self.mode == 'record':
+                return self._record(original, request, key)
+            return self._replay(request, key)
+        finally:
+            request._cassette_handled = False
+
+    def _record(self, original, request: api.Request, key: str) -> dict:
+        started = time.perf_counter()
+        result = original(request)
+        seconds = time.perf_counter() - started
+        line = json.dumps({'key': key, 'seconds': round(seconds, 4), 'response': result}, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.requests += 1
+            self.io_seconds += seconds
+            os.write(self.fd, line.encode('utf-8'))
+        return result
+
+    def _replay(self, request: api.Request, key: str) -> dict:
+        with self.lock:
+            recorded = self.responses.get(key)
+            if not recorded:
+                self.misses += 1
+                raise CassetteMissError(f"No recorded API response for {key}")
+            seconds, result = recorded.popleft() if len(recorded) > 1 else recorded[0]
+            self.requests += 1
+        delay = seconds if self.latency == 'recorded' else float(self.latency)
+        if delay > 0:
+            time.sleep(delay)
+        with self.lock:
+            self.io_seconds += delay
+        result = copy.deepcopy(result)
+        if isinstance(request, api.CachedRequest):
+            request._data = result
+        return result
+
+    def install(self) -> 'ApiCassette':
+        """Route the submit methods of api.Request and api.CachedRequest through this cassette."""
+        for cls in (api.Request, api.CachedRequest):
+            original = cls.__dict__['submit']
+            self.originals[cls] = original
+
+            def submit(request, original=original):
+                return self.submit(original, request)
+
+            cls.submit = submit
+        return self
+
+    def uninstall(self) -> None:
+        """Restore the original submit methods and close the cassette."""
+        for cls, original in self.originals.items():
+            cls.submit = original
+        self.originals = {}
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def print_stats(self) -> None:
+        verb = 'Recorded' if self.mode == 'record' else 'Replayed'
+        print(f"{verb} {self.requests} API requests ({self.path}), {self.io_seconds:.1f} s waiting on the API"
+              + (f", {self.misses} not in the cassette" if self.misses else ""))
+
+
+def install_cassette(path: str, mode: str, latency: float | str = 0.0) -> ApiCassette | None:
+    """
+    Start recording or replaying the API traffic of this process.
+
+    Args:
+        path (str): Cassette file.
+        mode (str): 'off', 'record' or 'replay'.
+        latency (float | str): Seconds to wait per replayed request, or 'recorded'.
+    Returns:
+        ApiCassette | None: The installed cassette, None when mode is 'off'.
+    """
+    if mode == 'off':
+        return None
+    return ApiCassette(path, mode, latency).install()
+
+
+def parse_latency(value: str) -> float | str:
+    """Argparse type for --replay-latency: a number of seconds or 'recorded'."""
+    return value if value == 'recorded' else float(value)
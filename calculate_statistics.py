@@ -1,16 +1,33 @@
 
 import mwparserfromhell
 
+from signature_scanner import DATETIME_RE, needs_parser, scan_signatures
+
 def contains_datetime(text: str) -> bool:
     """Check if the text contains a datetime pattern."""
-    import re
-    datetime_pattern = r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z'
-    # 01:02, 30 December 2025 (UTC)
-    datetime_pattern += r'|\d{2}:\d{2}, \d{1,2} [A-Za-z]+ \d{4} \(UTC\)'
-    return re.search(datetime_pattern, text) is not None
+    return DATETIME_RE.search(text) is not None
+
+def calculate_statistics(rfc_section: mwparserfromhell.wikicode.Wikicode | str,
+                         engine: str = 'parser') -> dict[str, tuple[int, int]]:
+    """
+    Calculate user mention statistics from the RFC section.
 
-def calculate_statistics(rfc_section: mwparserfromhell.wikicode.Wikicode) -> dict[str, tuple[int, int]]:
-    """Calculate user mention statistics from the RFC section."""
+    Args:
+        rfc_section (Wikicode | str): The section, parsed or as wikitext.
+        engine (str): 'parser' walks the mwparserfromhell nodes, 'scanner' reads the
+            wikitext with signature_scanner.scan_signatures, unless needs_parser finds
+            markup the scanner may read differently, which goes to the parser.
+    Returns:
+        dict[str, tuple[int, int]]: {user: (comments, bytes)}.
+    """
+    if engine == 'scanner' and not needs_parser(str(rfc_section)):
+        try:
+            return scan_signatures(str(rfc_section))
+        except RecursionError:
+            # nested deeper than the scanner follows; the parser caps its depth
+            pass
+    if isinstance(rfc_section, str):
+        rfc_section = mwparserfromhell.parse(rfc_section)
     user_counts: dict[str, int] = {}
     user_lengths: dict[str, int] = {}
     user_statistics: dict[str, tuple[int, int]] = {}
@@ -1,11 +1,31 @@
+import os
+
 import pywikibot
 
+from api_cassette import install_cassette, parse_latency
+
 USER_AGENT = 'en:User:Dw31415'
 EVENT_STREAM_URL = 'https://stream.wikimedia.org/v2/stream/recentchange'
+# Id of the last processed recentchange event, so listening resumes where it stopped (not in source control)
+EVENT_STREAM_STATE_PATH = 'eventstream_state.json'
+# Events handed to processing at a time, and the longest an event waits for its batch to fill
+EVENT_BATCH_SIZE = 50
+EVENT_BATCH_SECONDS = 1.0
+# Batches waiting to be processed before reading the stream pauses
+EVENT_QUEUE_BATCHES = 20
+# Longest wait in seconds between reconnects to the event stream
+EVENT_STREAM_MAX_BACKOFF = 60
 NOTIFICATION_TEMPLATE = '{{{{subst:User:DwBot/ReviewerAfdNotification|article={article}|afd={afd}}}}}'
 OPT_OUT_TEMPLATE = 'User:Dw31415/NoNPPDelivery'
 DRY_RUN = False
 KILL_PAGE = 'User:Dw31415/kill'
+# New AfDs processed per batch (the API allows 50 titles per query), and the longest an AfD waits for its batch to fill
+AFD_BATCH_SIZE = 50
+AFD_BATCH_SECONDS = 2.0
+# Hand new AfDs from the event stream to the batched AfD processor; off until the reviewer lookup is back
+AFD_PROCESSING = False
+# Seconds between two checks of the kill page's latest revision id by the kill switch watcher
+KILL_PAGE_POLL_SECONDS = 60
 RESULTS_PAGE = 'https://en.wikipedia.org/wiki/User:DwAlphaBot/RfcEditStats'
 RESULT_PAGE_TITLE = 'User:DwAlphaBot/RfcEditStats'
 RAW_PAGES_LIST = [
@@ -77,8 +97,55 @@ RFC_BOT_USERNAME = 'Legobot' # or 'RFC Bot' # or 'Legobot'
 YEARS_TO_PROCESS = [2024, 2025]
 # list(range(2012, 2022))
 MAX_RFC_PAGES_TO_PROCESS = 5
+# Number of site.compare requests kept in flight by collect_rfc_history
+COMPARE_CONCURRENCY = 4
 JOB_TO_RUN = 'examine_history'  # Options: 'analyze_rfcs', 'examine_history'
 
 RFC_ID_CSV = './data/quarry-100675-enwp-rfcs-per-year-as-tracked-by-rfc-bot-run1057519.csv'
 
+# Local history collected by collect_rfc_history (not in source control)
+HISTORY_DB_PATH = 'rfc.sqlite'
+# Shelve file used before the SQLite store, migrated on first open
+LEGACY_HISTORY_SHELVE = 'rfc.db'
+# collect_rfc_history commits after this many revisions or seconds, whichever comes first
+CHECKPOINT_EVERY_REVISIONS = 50
+CHECKPOINT_SECONDS = 30
+# Worker processes used by collect_rfc_history; above 1 each (year, page) shard runs in its own process
+COLLECT_WORKERS = 1
+# Shard-local stores written by the workers before they are merged into HISTORY_DB_PATH
+SHARD_DIR = 'shards'
+# Store the raw HTML diff table of each revision next to its compact deleted/added lines
+KEEP_RAW_DIFF_TABLE = False
+# Worker processes building publish_history records; 1 publishes serially in this process
+PUBLISH_WORKERS = 1
+# Removal revisions handed to a publish worker at a time
+PUBLISH_CHUNK_SIZE = 16
+# Word frequencies for the RfC question keywords: 'all' counts every year together, 'year' counts each year on its own
+KEYWORD_DF_SCOPE = 'all'
+# How analyze_rfcs finds sections and counts signatures: 'parser' uses mwparserfromhell, 'scanner' reads the raw wikitext
+STATISTICS_ENGINE = 'parser'
+# Linked RfC pages checked per API query by analyze_rfcs (the API allows 50 titles per query)
+PRELOAD_GROUP_SIZE = 50
+# Page revisions whose section index analyze_rfcs keeps, so every RfC on a page shares one parse
+SECTION_INDEX_CACHE_SIZE = 32
+# analyze_rfcs: tasks reading RfC sections, workers counting signatures, and threads running blocking pywikibot calls
+ANALYZE_PRODUCERS = 4
+ANALYZE_WORKERS = 4
+ANALYZE_API_THREADS = 8
+# Seconds between the JSON metrics snapshots analyze_rfcs prints while running; 0 prints only the final summary
+ANALYZE_METRICS_INTERVAL = 0
+# Seconds watch_rfcs waits for more RfC edits before publishing a changed report
+RFC_WATCH_DEBOUNCE = 300
+# Page texts and diff tables fetched from the wiki, kept between runs keyed by revision (not in source control)
+PAGE_CACHE_PATH = 'page_cache.sqlite'
+# Compressed size the page cache may reach before its least recently used entries are evicted
+PAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Record every API request of a run to a cassette, or replay one with no network: 'off', 'record' or 'replay'.
+# Read from the environment because the site below already talks to the API when config is imported.
+API_CASSETTE_MODE = os.environ.get('RFC_API_CASSETTE', 'off')
+API_CASSETTE_PATH = os.environ.get('RFC_API_CASSETTE_PATH', 'api_cassette.jsonl')
+# Seconds waited per replayed request, or 'recorded' to wait as long as the recorded request took
+API_REPLAY_LATENCY = parse_latency(os.environ.get('RFC_API_REPLAY_LATENCY', '0'))
+
+api_cassette = install_cassette(API_CASSETTE_PATH, API_CASSETTE_MODE, API_REPLAY_LATENCY)
 site = pywikibot.Site('en', 'wikipedia')
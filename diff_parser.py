@@ -0,0 +1,83 @@
+import html
+import re
+from typing import Iterator
+
+# One cell of a site.compare(..., 'table') diff. MediaWiki escapes '<' inside the
+# changed text, so a literal '<' always starts markup and '</td>' always ends the cell.
+CELL_RE = re.compile(r'<td\b([^>]*)>(.*?)</td\s*>', re.DOTALL | re.IGNORECASE)
+CLASS_RE = re.compile(r'''\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))''', re.IGNORECASE)
+TAG_RE = re.compile(r'<!--.*?-->|<[^>]*>', re.DOTALL)
+
+LINE_KINDS = {
+    'diff-deletedline': 'deleted-context',
+    'diff-addedline': 'added-context',
+}
+
+
+def iter_diff_lines(diff_table: str) -> Iterator[tuple[str, str]]:
+    """
+    Yield the changed lines of a diff table in a single pass.
+
+    Args:
+        diff_table (str): HTML table returned by site.compare(..., 'table').
+    Returns:
+        Iterator[tuple[str, str]]: ('deleted-context' or 'added-context', unescaped line text),
+            in document order.
+    """
+    for cell in CELL_RE.finditer(diff_table or ''):
+        attributes = cell.group(1)
+        if 'line' not in attributes:
+            # context, marker, lineno and empty cells
+            continue
+        class_match = CLASS_RE.search(attributes)
+        if not class_match:
+            continue
+        classes = (class_match.group(1) or class_match.group(2) or class_match.group(3)).split()
+        for css_class in classes:
+            kind = LINE_KINDS.get(css_class)
+            if kind:
+                yield kind, html.unescape(TAG_RE.sub('', cell.group(2)))
+                break
+
+
+def extract_diff_lines(diff_table: str) -> dict[str, list[str]]:
+    """
+    Drop-in replacement for pywikibot.diff.html_comparator without building a soup.
+
+    Args:
+        diff_table (str): HTML table returned by site.compare(..., 'table').
+    Returns:
+        dict[str, list[str]]: Deleted and added lines under 'deleted-context' and 'added-context'.
+    """
+    comparands: dict[str, list[str]] = {'deleted-context': [], 'added-context': []}
+    for kind, text in iter_diff_lines(diff_table):
+        comparands[kind].append(text)
+    return comparands
+
+
+if __name__ == "__main__":
+    # Benchmark against html_comparator on the diff tables in handle_revision's examples
+    import ast
+    import timeit
+    from pathlib import Path
+
+    from pywikibot.diff import html_comparator
+
+    source = Path(__file__).with_name('handle_revision.py').read_text(encoding='utf-8')
+    fixtures = []
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Dict):
+            for key, value in zip(node.keys, node.values):
+                if isinstance(key, ast.Constant) and key.value == 'diff_table' and isinstance(value, ast.Constant):
+                    fixtures.append(value.value)
+
+    for diff_table in fixtures:
+        assert extract_diff_lines(diff_table) == html_comparator(diff_table), "output differs from html_comparator"
+
+    rounds = 200
+    soup_seconds = timeit.timeit(lambda: [html_comparator(t) for t in fixtures], number=rounds)
+    fast_seconds = timeit.timeit(lambda: [extract_diff_lines(t) for t in fixtures], number=rounds)
+    print(f"{len(fixtures)} diff tables x {rounds} rounds, identical output")
+    print(f"html_comparator:    {soup_seconds * 1000 / rounds:.3f} ms per round")
+    print(f"extract_diff_lines: {fast_seconds * 1000 / rounds:.3f} ms per round")
+    print(f"speedup: {soup_seconds / fast_seconds:.1f}x")
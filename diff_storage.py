@@ -0,0 +1,60 @@
+import hashlib
+import json
+import zlib
+
+from diff_parser import extract_diff_lines
+
+COMPACT_DIFF_FORMAT = 'compact-v1'
+
+
+def compact_diff(diff_table: str) -> dict:
+    """
+    Reduce a site.compare diff table to its changed lines.
+
+    Args:
+        diff_table (str): HTML table returned by site.compare(..., 'table').
+    Returns:
+        dict: The format tag, a sha1 of the original table and the zlib compressed
+            deleted and added lines.
+    """
+    comparands = extract_diff_lines(diff_table or '')
+    lines = {'deleted': comparands['deleted-context'], 'added': comparands['added-context']}
+    return {
+        'format': COMPACT_DIFF_FORMAT,
+        'hash': hashlib.sha1((diff_table or '').encode('utf-8')).hexdigest(),
+        'lines': zlib.compress(json.dumps(lines, ensure_ascii=False).encode('utf-8')),
+    }
+
+
+def diff_lines(details: dict, diff_table: str | None = None) -> dict[str, list[str]]:
+    """
+    Return the deleted and added lines of a stored revision in either form.
+
+    Args:
+        details (dict): Revision details as written by save_revision.
+        diff_table (str | None): Raw diff table to use when the record has no compact diff.
+    Returns:
+        dict[str, list[str]]: Same shape as html_comparator, with 'deleted-context' and 'added-context'.
+    """
+    compact = details.get('diff_compact')
+    if compact is not None:
+        lines = json.loads(zlib.decompress(compact['lines']).decode('utf-8'))
+        return {'deleted-context': lines['deleted'], 'added-context': lines['added']}
+    if diff_table is None:
+        diff_table = details.get('diff_table')
+    return extract_diff_lines(diff_table or '')
+
+
+def diff_text(details: dict) -> str:
+    """Return the text to search for RfC ids: the raw table if kept, else the changed lines."""
+    if details.get('diff_table'):
+        return details['diff_table']
+    if details.get('diff_compact') is not None:
+        lines = diff_lines(details)
+        return '\n'.join(lines['deleted-context'] + lines['added-context'])
+    return ''
+
+
+def without_diff(details: dict) -> dict:
+    """Return a copy of details without the compact diff, for logging."""
+    return {key: value for key, value in details.items() if key != 'diff_compact'}
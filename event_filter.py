@@ -0,0 +1,130 @@
+import json
+import re
+from typing import Callable, Collection
+
+# Every "title" member of the raw JSON, with its still escaped value
+_TITLE_PATTERN = re.compile(rb'"title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def _field_pattern(name: str, value: str | int) -> bytes:
+    """Regex for "name": value in compact or spaced JSON; numbers must not continue with more digits."""
+    if isinstance(value, int):
+        return rb'"%s"\s*:\s*%d(?![0-9.])' % (re.escape(name.encode()), value)
+    return rb'"%s"\s*:\s*"%s"' % (re.escape(name.encode()), _json_string_pattern(value))
+
+
+def _json_string_pattern(text: str) -> bytes:
+    """Regex for text inside a JSON string, allowing the escaped forms an encoder may pick for '/'."""
+    return b''.join(rb'\\?/' if char == '/' else re.escape(char.encode('utf-8')) for char in text)
+
+
+def _has_title(raw: bytes, titles: Collection[str]) -> bool:
+    """Return whether some "title" member of the raw JSON is one of titles; only escaped values are decoded."""
+    for match in _TITLE_PATTERN.finditer(raw):
+        value = match[1]
+        try:
+            title = json.loads(b'"' + value + b'"') if b'\\' in value else value.decode('utf-8')
+        except ValueError:
+            continue
+        if title in titles:
+            return True
+    return False
+
+
+class EventRule:
+    """
+    A declarative test of a recentchange event, cheap on raw bytes and exact on the decoded event.
+
+    fields and title_prefix are checked on the raw JSON bytes, where they are necessary
+    conditions: an event failing any of them is dropped without being decoded. The decoded
+    event is checked again exactly, along with predicate, so a byte pattern that happens to
+    match inside some other field never lets a wrong event through.
+    """
+
+    def __init__(self, name: str, fields: dict[str, str | int] | None = None, title_prefix: str | None = None,
+                 predicate: Callable[[dict], bool] | None = None, titles: Collection[str] | None = None):
+        """
+        Args:
+            name (str): Name used in the counters.
+            fields (dict[str, str | int] | None): Top-level fields the event must have, e.g. {'wiki': 'enwiki'}.
+            title_prefix (str | None): Start the event title must have.
+            predicate (Callable[[dict], bool] | None): Exact test of the decoded event.
+            titles (Collection[str] | None): Titles the event must be about; read on every check, so a set
+                updated later also updates the rule.
+        """
+        self.name = name
+        self.fields = dict(fields or {})
+        self.title_prefix = title_prefix
+        self.titles = titles
+        self.predicate = predicate
+        patterns = [_field_pattern(key, value) for key, value in (fields or {}).items()]
+        if title_prefix:
+            patterns.append(rb'"title"\s*:\s*"' + _json_string_pattern(title_prefix))
+        self.patterns = [re.compile(pattern) for pattern in patterns]
+        # string values JSON cannot escape differently, such as "enwiki", are first looked for as plain bytes
+        self.literals = [b'"' + value.encode() + b'"' for value in (fields or {}).values()
+                         if isinstance(value, str) and value.isascii() and not set(value) & set('/\\"')]
+
+    def may_match(self, raw: bytes) -> bool:
+        """Return False only if the event surely fails this rule."""
+        # a substring test rejects most of the firehose before any regular expression runs
+        if any(literal not in raw for literal in self.literals):
+            return False
+        if not all(pattern.search(raw) for pattern in self.patterns):
+            return False
+        return self.titles is None or _has_title(raw, self.titles)
+
+    def matches(self, event: dict) -> bool:
+        """Return whether the decoded event passes this rule."""
+        if any(event.get(key) != value for key, value in self.fields.items()):
+            return False
+        if self.title_prefix and not str(event.get('title', '')).startswith(self.title_prefix):
+            return False
+        if self.titles is not None and event.get('title') not in self.titles:
+            return False
+        return self.predicate is None or self.predicate(event)
+
+
+class EventFilter:
+    """
+    Reject recentchange events on their raw bytes, and decode only those some rule may accept.
+
+    Counts the events seen, dropped before decoding, decoded, rejected after decoding,
+    undecodable and matched per rule.
+    """
+
+    def __init__(self, rules: list[EventRule]):
+        self.rules = rules
+        self.seen = 0
+        self.dropped = 0
+        self.decoded = 0
+        self.rejected = 0
+        self.errors = 0
+        self.matched = {rule.name: 0 for rule in rules}
+
+    def accepts_raw(self, raw: bytes) -> bool:
+        """Return whether the raw data of an event may pass a rule; counts it as seen, and as dropped if not."""
+        self.seen += 1
+        if any(rule.may_match(raw) for rule in self.rules):
+            return True
+        self.dropped += 1
+        return False
+
+    def decode(self, data: str | bytes) -> tuple[dict, EventRule] | None:
+        """Decode an event the raw check let through and return it with the first rule it matches, or None."""
+        try:
+            event = json.loads(data)
+        except ValueError:
+            self.errors += 1
+            return None
+        self.decoded += 1
+        for rule in self.rules:
+            if rule.matches(event):
+                self.matched[rule.name] += 1
+                return event, rule
+        self.rejected += 1
+        return None
+
+    def stats(self) -> dict:
+        return {'seen': self.seen, 'dropped': self.dropped, 'decoded': self.decoded, 'rejected': self.rejected,
+                'errors': self.errors, 'matched': dict(self.matched)}
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import time
 
@@ -6,13 +7,18 @@ from pywikibot.pagegenerators import PageTitleFilterPageGenerator
 from pywikibot import page
 import pywikibot
 from timezone_utils import ensure_utc, now_utc, from_timestamp_utc, to_utc_string
-from typing import Dict
-import requests
-from config import USER_AGENT, EVENT_STREAM_URL, site
-from afd_processor import process_afd
+from typing import Callable, Dict
+from config import (AFD_PROCESSING, EVENT_BATCH_SECONDS, EVENT_BATCH_SIZE, EVENT_QUEUE_BATCHES, EVENT_STREAM_MAX_BACKOFF,
+                    EVENT_STREAM_STATE_PATH, USER_AGENT, EVENT_STREAM_URL, site)
+from sse_client import EventStreamClient, load_last_event_id, process_event_batches
+from event_filter import EventFilter, EventRule
+from afd_processor import AfdBatchProcessor, process_afd
 
 TALK = 1
 
+# batches the new AfDs of the stream while follow_eventstream runs with AFD_PROCESSING on
+afd_batches: AfdBatchProcessor | None = None
+
 def listen_eventstream():
     recent_changes = pagegenerators.RecentChangesPageGenerator(site)
     # gen = yield_talk_pages(recent_changes)
@@ -47,57 +53,67 @@ def listen_eventstream3():
 
 
 def listen_eventstream2():
+    """Follow the recentchange stream until interrupted, resuming after the last processed event."""
     print("Listening to eventstream...")
-    headers = {'User-Agent': USER_AGENT}
+    asyncio.run(follow_eventstream(process_event))
+
+async def follow_eventstream(handle_data: Callable[[str], None], stop: asyncio.Event | None = None) -> None:
+    """
+    Hand the data of every event of EVENT_STREAM_URL to handle_data, on a worker thread.
+
+    The stream is read by sse_client.EventStreamClient, which reconnects with backoff and
+    resumes from the last event received. Events are processed in batches from a bounded
+    queue, and the id of each processed batch is saved to EVENT_STREAM_STATE_PATH so the
+    next run continues from there.
+
+    With AFD_PROCESSING on, the new AfDs are handed to an AfdBatchProcessor, which is
+    drained when the stream closes.
+    """
+    global afd_batches
+    if AFD_PROCESSING:
+        afd_batches = AfdBatchProcessor()
+    queue: asyncio.Queue = asyncio.Queue(EVENT_QUEUE_BATCHES)
+    client = EventStreamClient(EVENT_STREAM_URL, queue, headers={'User-Agent': USER_AGENT},
+                               last_event_id=load_last_event_id(EVENT_STREAM_STATE_PATH),
+                               batch_size=EVENT_BATCH_SIZE, batch_seconds=EVENT_BATCH_SECONDS,
+                               max_backoff=EVENT_STREAM_MAX_BACKOFF, data_filter=event_filter.accepts_raw)
+    consumer = asyncio.create_task(process_event_batches(
+        queue, lambda event: asyncio.to_thread(handle_data, event.data), EVENT_STREAM_STATE_PATH))
     try:
-        with requests.get(EVENT_STREAM_URL, headers=headers, stream=True) as response:
-            response.raise_for_status()
-
-            # print number of lines received every 30 seconds
-            print(f"Connected to eventstream: {EVENT_STREAM_URL}, status code {response.status_code},  length: {response.headers.get('Content-Length')}")
-
-            for line in response.iter_lines():
-                if line and line.startswith(b'data: '):
-                    #print(f"Received event: {line[6:].decode('utf-8')}")
-                    process_event(line[6:].decode('utf-8'))
-
-    except requests.exceptions.RequestException as e:
-        print(f"eventstream error: {e}")
-        time.sleep(60)
-        listen_eventstream()
+        await client.run(stop)
+    finally:
+        await queue.put(None)
+        await consumer
+        print(f"Event stream closed after {client.events_received} events over {client.connections} connections")
+        print(f"Event filter: {json.dumps(event_filter.stats())}")
+        if afd_batches is not None:
+            await asyncio.to_thread(afd_batches.close)
+            print(f"AfD batches: {json.dumps(afd_batches.stats())}")
+            afd_batches = None
 
 def process_event(line_data: str):
     try:
-        data = json.loads(line_data)
-
-        # if meta.uri does not contain 'en.wikipedia.org', ignore the event
-        meta = data.get('meta', {})
-        uri = meta.get('uri', '')
-        if 'en.wikipedia.org' not in uri or 'Talk' not in uri:
-            #print(f"Ignoring non-enwiki event: {uri}")
+        # events no rule wants were already dropped on their raw bytes by the stream client
+        decoded = event_filter.decode(line_data)
+        if decoded is None:
             return
+        data, rule = decoded
+        uri = data.get('meta', {}).get('uri', '')
 
-        # create a page object for the event title
-        event_page = pywikibot.Page(site, data.get('title', ''))
-        
-        print(f"Event page: {event_page.title()} (exists: {event_page.exists()})")
-        
-        # print pretty JSON of the event data
-        
-        print(f"Processing event: {data.get('title', 'No Title')}, uri: {uri}")
-        logging.debug("Event data: %s", {data.get('title', 'No Title')})
-        print(json.dumps(data, indent=2))
-
-        raise NotImplementedError("AfD event processing is currently disabled.")
-    
-        
+        if rule is TALK_EVENT_RULE:
+            print(f"Processing event: {data.get('title', 'No Title')}, uri: {uri}")
+            logging.debug("Event data: %s", line_data)
+            return
 
-        # if is_afd_event(data):
-        #     afd_title = data['title']
-        #     timestamp = from_timestamp_utc(data['timestamp'])
-        #     afd_user = data.get('user', '')
-        #     print(f"New AfD: {afd_title}")
-        #     process_afd(afd_title, timestamp, afd_user)
+        # only AFD_EVENT_RULE is left, in the filter while AFD_PROCESSING is on; it already checked is_afd_event
+        afd_title = data['title']
+        timestamp = from_timestamp_utc(data['timestamp'])
+        afd_user = data.get('user', '')
+        print(f"New AfD: {afd_title}")
+        if afd_batches is not None:
+            afd_batches.submit(afd_title, timestamp, afd_user)
+        else:
+            process_afd(afd_title, timestamp, afd_user)
 
     except (json.JSONDecodeError, Exception) as e:
         if isinstance(e, json.JSONDecodeError):
@@ -113,3 +129,12 @@ def is_afd_event(data: Dict) -> bool:
         title.startswith('Wikipedia:Articles for deletion/') and
         '/Log/' not in title
     )
+
+# Edits and page creations of enwiki talk pages
+TALK_EVENT_RULE = EventRule('enwiki-talk', fields={'wiki': 'enwiki', 'namespace': TALK})
+# New AfD discussions; the byte-level checks are the necessary parts of is_afd_event
+AFD_EVENT_RULE = EventRule('enwiki-afd', fields={'wiki': 'enwiki', 'type': 'new'},
+                           title_prefix='Wikipedia:Articles for deletion/', predicate=is_afd_event)
+
+# with AfD processing off, new AfDs are dropped on their raw bytes like any other event
+event_filter = EventFilter([AFD_EVENT_RULE, TALK_EVENT_RULE] if AFD_PROCESSING else [TALK_EVENT_RULE])
@@ -1,26 +1,45 @@
 
 import datetime
+import glob
+import multiprocessing
 import os
+import pickle
 import re
-from config import LIST_OF_RFC_PAGES, RAW_PAGES_LIST, RFC_BOT_USERNAME, RFC_ID_CSV, YEARS_TO_PROCESS, site
+import tempfile
+from collections import deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Iterable, Iterator
+from config import CHECKPOINT_EVERY_REVISIONS, CHECKPOINT_SECONDS, COLLECT_WORKERS, COMPARE_CONCURRENCY, HISTORY_DB_PATH, KEEP_RAW_DIFF_TABLE, KEYWORD_DF_SCOPE, LEGACY_HISTORY_SHELVE, LIST_OF_RFC_PAGES, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_PATH, PUBLISH_CHUNK_SIZE, PUBLISH_WORKERS, RAW_PAGES_LIST, RFC_BOT_USERNAME, RFC_ID_CSV, SHARD_DIR, YEARS_TO_PROCESS, site
 from pywikibot import Page
 from pywikibot.page import Revision
 from pywikibot.site import APISite
 from pywikibot.diff import html_comparator
 from pywikibot.time  import Timestamp
-import shelve
 import csv
 
-from handle_revision import handle_revision, print_removed_entries
+from diff_storage import compact_diff, diff_lines
+from handle_revision import build_removal_record, find_removed_rfcs, find_shortcut, print_removed_entries, write_removal_record
+from kill_page import KillSwitchEngaged, kill_requested
+from history_store import ENTRY_DETAILS_PREFIX, MIGRATED_FROM_KEY, RFC_INDEX_KEY, HistoryStore, legacy_shelve_exists, migrate_shelve
+from output_writers import OutputWriters
+from page_cache import cached_compare, open_page_cache
+from rfc_timeline import RfcTimeline, build_timelines
+from word_extraction import KeywordEngine
 
 
+# Worker processes are spawned, not forked: by the time a pool starts, this process holds
+# the site's HTTP session and runs the kill switch watcher and compare threads, whose
+# sockets and locks a forked child would inherit mid-use
+WORKER_CONTEXT = multiprocessing.get_context('spawn')
+
 
 class RevisionRun:
-    def __init__(self, year, page_title, timestamp = datetime.datetime.now().timestamp(), comment = '', bot_username = 'Legobot'):
+    def __init__(self, year, page_title, timestamp = None, comment = '', bot_username = 'Legobot'):
         self.type = 'r-1'
         self.year = year
         self.page_title = page_title
-        self.timestamp = timestamp
+        # the start of this run; a default argument would be the time the module was imported
+        self.timestamp = timestamp if timestamp is not None else datetime.datetime.now().timestamp()
         self.comment = comment
         self.bot_username = bot_username
         self.revisions_examined = 0
@@ -49,64 +68,282 @@ class RevisionRun:
         })
 
 
-def examine_history():
+def open_history_db(path: str = HISTORY_DB_PATH) -> HistoryStore:
+    """
+    Open the history store, migrating the legacy rfc.db shelve the first time.
+
+    Args:
+        path (str): Location of the SQLite history database.
+    Returns:
+        HistoryStore: The opened store.
+    """
+    db = HistoryStore(path, checkpoint_every=CHECKPOINT_EVERY_REVISIONS, checkpoint_seconds=CHECKPOINT_SECONDS)
+    if RFC_INDEX_KEY not in db:
+        # stores written before the rfc_id index existed; new revisions are indexed as they are saved
+        print(f"Building the RfC id index of {path}...")
+        indexed = db.rebuild_rfc_index()
+        print(f"Indexed {indexed} revisions")
+    if MIGRATED_FROM_KEY not in db and legacy_shelve_exists(LEGACY_HISTORY_SHELVE):
+        print(f"Migrating {LEGACY_HISTORY_SHELVE} into {path}...")
+        copied = migrate_shelve(LEGACY_HISTORY_SHELVE, db)
+        print(f"Migrated {copied} records from {LEGACY_HISTORY_SHELVE}")
+    return db
+
+def fetch_diff_tables(entries: Iterable[Revision], executor: ThreadPoolExecutor, max_in_flight: int) -> Iterator[tuple[Revision, Future]]:
+    """
+    Keep up to max_in_flight site.compare requests running and yield them in revision order.
+
+    Diff tables already in the page cache are read from it instead of being requested.
+
+    Args:
+        entries (Iterable[Revision]): Revisions to diff against their parent, in the order they should be saved.
+        executor (ThreadPoolExecutor): Pool used to run the compare requests.
+        max_in_flight (int): Maximum number of compare requests submitted but not yet yielded.
+    Returns:
+        Iterator[tuple[Revision, Future]]: Each revision with the future holding its diff table.
+    """
+    in_flight: deque[tuple[Revision, Future]] = deque()
+    cache = open_page_cache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES)
+    for entry in entries:
+        future = executor.submit(cached_compare, cache, site, entry.get('parentid'), entry.get('revid'))
+        in_flight.append((entry, future))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft()
+    while in_flight:
+        yield in_flight.popleft()
+
+def update_high_water_mark(db: HistoryStore, year: int, page_title: str, bot_username: str, revisions: list[Revision], mark_revid: int = 0,
+                           processed_elsewhere: frozenset[int] = frozenset()) -> None:
+    """
+    Record the newest revision up to which every revision of the page has been processed.
+
+    Args:
+        db (HistoryStore): The history store.
+        year (int): The year being collected.
+        page_title (str): The RfC list page.
+        bot_username (str): The bot whose edits are collected.
+        revisions (list[Revision]): The revisions loaded for the page, in revid order.
+        mark_revid (int): Revid of the previous mark; revisions up to it count as processed.
+        processed_elsewhere (frozenset[int]): Revids processed in another store, e.g. the main store of a shard.
+    """
+    mark = None
+    for entry in revisions:
+        if entry.revid > mark_revid and entry.revid not in processed_elsewhere and not db.is_processed(entry.revid):
+            break
+        mark = entry
+    if mark is not None:
+        db.set_high_water_mark(year, page_title, bot_username, mark.revid, mark.timestamp)
+
+def collect_page_history(db: HistoryStore, executor: ThreadPoolExecutor, year: int, page_title: str, bot_username: str,
+                         concurrency: int = COMPARE_CONCURRENCY, resume: bool = True, keep_raw_diff: bool = KEEP_RAW_DIFF_TABLE,
+                         processed_elsewhere: frozenset[int] = frozenset()) -> dict:
+    """
+    Collect one year of bot revisions of one RfC list page into db.
+
+    Args:
+        db (HistoryStore): The history store to write to.
+        executor (ThreadPoolExecutor): Pool used for the site.compare requests.
+        year (int): The year to collect.
+        page_title (str): The RfC list page, e.g. 'Wikipedia:Requests_for_comment/Biographies'.
+        bot_username (str): The bot whose edits are collected.
+        concurrency (int): Number of compare requests kept in flight.
+        resume (bool): Start from the page's high-water mark and skip processed revisions.
+        keep_raw_diff (bool): Also store the raw HTML diff table of each revision.
+        processed_elsewhere (frozenset[int]): Revids already processed in another store, skipped when resuming.
+    Returns:
+        dict: The completed run stats.
+    """
+    run = RevisionRun(year=year, page_title=page_title, comment='Examining history for deletions', bot_username=bot_username)
+    db[run.get_key()] = run
+
+    try:
+        rfc_page = Page(site, page_title)
+    except Exception as e:
+        db.sync()
+        print(f"Error loading page {page_title}: {e}")
+        return run.get_complete_stats()[1]
+
+    db[run.get_key()] = run
+
+    starttime: Timestamp = Timestamp(year, 1, 1, 0, 0, 0)
+    endtime: Timestamp = Timestamp(year + 1, 1, 1, 0, 0, 0)
+    mark = db.get_high_water_mark(year, page_title, bot_username) if resume else None
+    mark_revid = 0
+    if mark:
+        # Only ask for revisions from the last one collected onwards
+        mark_revid, mark_timestamp = mark
+        starttime = max(starttime, Timestamp.fromISOformat(mark_timestamp))
+        print(f"Resuming {page_title} in year {year} from revision {mark_revid} ({mark_timestamp})")
+
+    if isinstance(site, APISite):
+        # Seems like we need to use site.loadrevisions to be able to filter by user
+        # Loads revisions into the page object
+        history = site.loadrevisions(page=rfc_page, user=bot_username, starttime=starttime, endtime=endtime, rvdir=True)
+
+    # TODO: Do I need to access _revisions or is there a better way?
 
-    db = shelve.open('rfc.db', writeback=False)
+    # Will print revision entries where the comment contains 'added'
+    #  * revid: 1330081275
+    # * timestamp: 2025-12-29T10:01:21Z
+    # * user: Legobot
+    # * comment: Added: [[Talk:Denis Kapustin (militant)]].
+    revisions = sorted((rfc_page._revisions or {}).values(), key=lambda entry: entry.revid)
+    pending = revisions
+    if resume:
+        pending = [entry for entry in revisions if entry.revid > mark_revid and entry.revid not in processed_elsewhere
+                   and not db.is_processed(entry.revid)]
+        print(f"Skipping {len(revisions) - len(pending)} revisions already processed for {page_title} in year {year}")
 
+    # Diffs are fetched concurrently but saved in revision order
+    for entry, diff_future in fetch_diff_tables(pending, executor, concurrency):
+        if kill_requested():
+            # the high-water mark stops at the first unsaved revision, so the next run resumes here
+            print(f"Kill switch set, stopping {page_title} in year {year}")
+            break
+        save_revision(db, run, entry, page_title=page_title, year=year, diff_future=diff_future, keep_raw_diff=keep_raw_diff)
+    update_high_water_mark(db, year, page_title, bot_username, revisions, mark_revid, processed_elsewhere)
+    stats_key, stats_value = run.get_complete_stats()
+    db[stats_key] = stats_value
+    print(f"Completed examining history. Stats: {stats_value}")
+    db.sync()
+    return stats_value
+
+def collect_shard(year: int, page_title: str, bot_username: str, shard_path: str, concurrency: int, resume: bool,
+                  mark: tuple[int, str] | None = None, keep_raw_diff: bool = KEEP_RAW_DIFF_TABLE,
+                  processed_revids: list[int] = ()) -> dict:
+    """
+    Worker process entry point: collect one (year, page) shard into its own store.
+
+    Args:
+        year (int): The year to collect.
+        page_title (str): The RfC list page.
+        bot_username (str): The bot whose edits are collected.
+        shard_path (str): Path of the shard-local SQLite store.
+        concurrency (int): Number of compare requests kept in flight.
+        resume (bool): Start from mark and skip processed revisions.
+        mark (tuple[int, str] | None): The page's high-water mark in the main store.
+        keep_raw_diff (bool): Also store the raw HTML diff table of each revision.
+        processed_revids (list[int]): Revisions after mark the main store already processed; they are not collected again.
+    Returns:
+        dict: The completed run stats.
+    """
+    db = HistoryStore(shard_path, checkpoint_every=CHECKPOINT_EVERY_REVISIONS, checkpoint_seconds=CHECKPOINT_SECONDS)
+    if mark and db.get_high_water_mark(year, page_title, bot_username) is None:
+        db.set_high_water_mark(year, page_title, bot_username, *mark)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='compare') as executor:
+        stats = collect_page_history(db, executor, year, page_title, bot_username, concurrency, resume, keep_raw_diff,
+                                     frozenset(processed_revids))
+    db.close()
+    return stats
+
+def merge_shard(db: HistoryStore, shard_path: str) -> None:
+    """Merge a shard store into db and delete the shard files."""
+    db.merge_from(shard_path)
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(shard_path + suffix):
+            os.remove(shard_path + suffix)
+
+def summarize_run_stats(stats_list: list[dict]) -> dict[int, dict]:
+    """Add up the revisions examined, errors and seconds of several runs per year."""
+    summary: dict[int, dict] = {}
+    for stats in stats_list:
+        year_summary = summary.setdefault(stats.get('year'), {'runs': 0, 'revisions_examined': 0, 'revisions_with_errors': 0, 'seconds_taken': 0.0})
+        year_summary['runs'] += 1
+        year_summary['revisions_examined'] += stats.get('revisions_examined', 0)
+        year_summary['revisions_with_errors'] += stats.get('revisions_with_errors', 0)
+        year_summary['seconds_taken'] += stats.get('seconds_taken', 0.0)
+    return summary
+
+def examine_history_sharded(db: HistoryStore, workers: int, concurrency: int, resume: bool, keep_raw_diff: bool = KEEP_RAW_DIFF_TABLE) -> None:
+    """
+    Collect every (year, page) shard in its own worker process, then merge the shards into db.
+
+    Shards left behind by an interrupted run are merged before new work starts.
+    """
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    for leftover in sorted(glob.glob(os.path.join(SHARD_DIR, '*.sqlite'))):
+        print(f"Merging leftover shard {leftover}")
+        merge_shard(db, leftover)
+
+    bot_username = RFC_BOT_USERNAME
+    stats_list = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT) as pool:
+        futures = {}
+        for year in YEARS_TO_PROCESS:
+            for raw_page_title in RAW_PAGES_LIST:
+                page_title = f"Wikipedia:{raw_page_title}"
+                shard_path = os.path.join(SHARD_DIR, f"{year}-{raw_page_title.replace('/', '_')}.sqlite")
+                mark = db.get_high_water_mark(year, page_title, bot_username) if resume else None
+                # the shard starts empty, so it is told which revisions past the mark need no collecting
+                processed = db.processed_revids(year, page_title, mark[0] if mark else 0) if resume else []
+                future = pool.submit(collect_shard, year, page_title, bot_username, shard_path, concurrency, resume, mark,
+                                     keep_raw_diff, processed)
+                futures[future] = shard_path
+
+        for future in as_completed(futures):
+            if kill_requested():
+                # shards already running finish their current page; the others do not start
+                for pending_future in futures:
+                    pending_future.cancel()
+            shard_path = futures[future]
+            try:
+                stats_list.append(future.result())
+            except CancelledError:
+                continue
+            except Exception as e:
+                print(f"Error collecting shard {shard_path}: {e}")
+            # Partial shards are merged too; their processed flags let the next run resume
+            if os.path.exists(shard_path):
+                merge_shard(db, shard_path)
+                print(f"Merged shard {shard_path}")
+
+    print("Summary of sharded collection per year:")
+    for year, year_summary in sorted(summarize_run_stats(stats_list).items()):
+        print(f"Year {year}: {year_summary}")
+
+def examine_history(concurrency: int = COMPARE_CONCURRENCY, resume: bool = True, workers: int = COLLECT_WORKERS, keep_raw_diff: bool = KEEP_RAW_DIFF_TABLE):
+
+    db = open_history_db()
+    concurrency = max(1, concurrency)
+
+    if workers > 1:
+        examine_history_sharded(db, workers, concurrency, resume, keep_raw_diff)
+        db.close()
+        return
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='compare')
     for year in YEARS_TO_PROCESS:
         for raw_page_title in RAW_PAGES_LIST:
+            if kill_requested():
+                break
             page_title = f"Wikipedia:{raw_page_title}"
-            bot_username = RFC_BOT_USERNAME
-            run = RevisionRun(year=year, page_title=page_title, comment='Examining history for deletions', bot_username=bot_username)    
-            db[run.get_key()] = run
-            
-            try:
-                rfc_page = Page(site, page_title)
-            except Exception as e:
-                db.sync()
-                print(f"Error loading page {page_title}: {e}")
-                                
-            db[run.get_key()] = run
-
-            if isinstance(site, APISite):
-                # Seems like we need to use site.loadrevisions to be able to filter by user
-                # Loads revisions into the page object
-                starttime: Timestamp = Timestamp(year, 1, 1, 0, 0, 0)
-                endtime: Timestamp = Timestamp(year + 1, 1, 1, 0, 0, 0)
-                history = site.loadrevisions(page=rfc_page, user=bot_username, starttime=starttime, endtime=endtime, rvdir=True)
-
-            # TODO: Do I need to access _revisions or is there a better way?
-
-            # Will print revision entries where the comment contains 'added'
-            #  * revid: 1330081275
-            # * timestamp: 2025-12-29T10:01:21Z
-            # * user: Legobot
-            # * comment: Added: [[Talk:Denis Kapustin (militant)]].
-            for entry in (rfc_page._revisions or {}).values():
-                save_revision(db, run, entry, page_title=page_title, year=year)
-            stats_key, stats_value = run.get_complete_stats()
-            db[stats_key] = stats_value
-            print(f"Completed examining history. Stats: {stats_value}")
-            db.sync()
+            collect_page_history(db, executor, year, page_title, RFC_BOT_USERNAME, concurrency, resume, keep_raw_diff)
+    executor.shutdown()
     db.close()
 
-def save_revision(db: shelve.Shelf[any], run: RevisionRun, entry: Revision, page_title: str = '', year: int = 0):
+def save_revision(db: HistoryStore, run: RevisionRun, entry: Revision, page_title: str = '', year: int = 0, diff_future: Future | None = None,
+                  keep_raw_diff: bool = KEEP_RAW_DIFF_TABLE):
     try:
         processed_key = f"RevisionRunEntryId-{entry.revid}"
         db[processed_key] = False
-        db.sync()
-        diff_table = site.compare(entry.get('parentid'), entry.get('revid'),'table')
+        if diff_future is not None:
+            diff_table = diff_future.result()
+        else:
+            diff_table = cached_compare(open_page_cache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES), site, entry.get('parentid'), entry.get('revid'))
         revision_details = {
             'revid': entry.revid,
             'parentid': entry.parentid,
             'timestamp': entry.timestamp,
             'user': entry.user,
             'comment': entry.comment,
-            'diff_table': diff_table,
+            # deleted and added lines only; readers go through diff_storage.diff_lines
+            'diff_compact': compact_diff(diff_table),
             'page_title': page_title,
             'bot_username': run.bot_username,
             'year': year
         }
+        if keep_raw_diff:
+            revision_details['diff_table'] = diff_table
         db[f"RevisionRunEntryDetails-{entry.revid}"] = revision_details
         db[processed_key] = True
         run.increment_revisions_examined()
@@ -115,10 +352,30 @@ def save_revision(db: shelve.Shelf[any], run: RevisionRun, entry: Revision, page
     # catch any exception
     except Exception as e:
         print(f"Error saving revision {entry.revid}: {e}")
-    finally:
-        db.sync()
-    
+
     db[run.get_key()] = run
+    # The processed flag, details and run counters of this revision are committed together
+    db.checkpoint()
+
+def compact_history(batch_size: int = 500):
+    """Replace the raw diff tables of already collected revisions with compact diffs."""
+    db = open_history_db()
+    converted = 0
+    # materialize the keys first so rows are not rewritten under an open cursor
+    for key in list(db.keys(ENTRY_DETAILS_PREFIX)):
+        details = db[key]
+        if details.get('diff_compact') is not None or 'diff_table' not in details:
+            continue
+        details['diff_compact'] = compact_diff(details.pop('diff_table'))
+        db[key] = details
+        converted += 1
+        if converted % batch_size == 0:
+            db.sync()
+            print(f"Compacted {converted} revisions")
+    db.sync()
+    print(f"Compacted {converted} revisions, reclaiming space...")
+    db.vacuum()
+    db.close()
 
 def handle_entry(entry):
     print_keys = ['revid', 'parentid', 'timestamp', 'user', 'comment']
@@ -131,22 +388,27 @@ def handle_entry(entry):
     # Maybe site.compare(revid1, revid2) or something like that?
 
 def list_run_stats():
-    db = shelve.open('rfc.db', writeback=False)
+    db = open_history_db()
     year_counts = {}
-    for key in db.keys():
-        value = db[key]
-        if key.startswith('RevisionRunStats-'):
-            stats = db[key]
-            year = stats.get('year')
-            if year not in year_counts:
-                year_counts[year] = 0
-            year_counts[year] += stats.get('revisions_examined', 0)
-            print(f"Stats for {key}: {stats}")
+    for key, stats in db.iter_run_stats():
+        year = stats.get('year')
+        if year not in year_counts:
+            year_counts[year] = 0
+        year_counts[year] += stats.get('revisions_examined', 0)
+        print(f"Stats for {key}: {stats}")
     print("Summary of revisions examined per year:")
     for year, count in year_counts.items():
         print(f"Year {year}: {count} revisions examined")
     db.close()
 
+def revisions_examined_per_year(db: HistoryStore) -> dict[int, int]:
+    """Add up the revisions examined by the collection runs stored in db, per year."""
+    year_counts = {}
+    for key, stats in db.iter_run_stats():
+        year = stats.get('year')
+        year_counts[year] = year_counts.get(year, 0) + stats.get('revisions_examined', 0)
+    return year_counts
+
 def get_rfc_id_list():
     """Reads the RFC IDs from the CSV file and returns them as a dictionary."""
     rfc_id_list = {}
@@ -178,19 +440,122 @@ def find_rfcs_in_text(rfc_texts: str, rfc_id_dict: dict) -> list[str]:
             rfc_ids.append(match)
     return rfc_ids
 
-def scan_all_rfcs(db: shelve.Shelf[any], rfc_id_dict: dict):
-    for key in db.keys():
-        value = db[key]
-        if key.startswith('RevisionRunEntryDetails-'):
-            details = db[key]
-            diff_texts = details.get('diff_table', [])
-            rfc_ids = find_rfcs_in_text(diff_texts, rfc_id_dict)
-            for rfc_id in rfc_ids:
-                bot_entry = rfc_id_dict.get(rfc_id, {})
-                # add details to bot_entry
-                diff_entries = bot_entry.get('diff_entries', [])
-                diff_entries.append(details)
-                bot_entry['diff_entries'] = diff_entries
+def load_rfc_timelines(db: HistoryStore, rfc_id_dict: dict) -> dict[str, RfcTimeline]:
+    """Build the revision timeline of every known RfC in one pass over the rfc_id index."""
+    return build_timelines(db.iter_rfc_index(), find_shortcut, rfc_id_dict)
+
+def removal_record(details: dict, timelines: dict[str, RfcTimeline]) -> dict:
+    """
+    Build the output record of one stored removal revision.
+
+    Args:
+        details (dict): Revision details as written by save_revision.
+        timelines (dict[str, RfcTimeline]): Revision timelines of the known RfCs, see load_rfc_timelines.
+    Returns:
+        dict: The record for handle_revision.write_removal_record.
+    """
+    lines = diff_lines(details)
+    return build_removal_record(details, find_removed_rfcs(details, lines), timelines)
+
+def iter_removal_records(db: HistoryStore, rfc_id_dict: dict, workers: int = 1,
+                         chunk_size: int = PUBLISH_CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Yield the output record of every stored removal revision, in revid order.
+
+    Only revisions whose edit summary mentions a removal are read, once each. The
+    revisions affecting each RfC come from timelines built once from the rfc_id index,
+    so no other diff is read and nothing is sorted per RfC. With more than one worker
+    the revisions are parsed in worker processes; pool.map still hands the records
+    back in revid order.
+
+    Args:
+        db (HistoryStore): The history store.
+        rfc_id_dict (dict): RfC ids read from the CSV, see get_rfc_id_list.
+        workers (int): Number of worker processes, 1 to parse in this process.
+        chunk_size (int): Revisions sent to a worker at a time.
+    Returns:
+        Iterator[dict]: Records for handle_revision.write_removal_record.
+    """
+    if workers <= 1:
+        timelines = load_rfc_timelines(db, rfc_id_dict)
+        for details in db.iter_revisions(comment_contains='removed'):
+            yield removal_record(details, timelines)
+        return
+
+    revids = db.revids(comment_contains='removed')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_CONTEXT, initializer=init_publish_worker,
+                             initargs=(db.path, rfc_id_dict)) as pool:
+        yield from pool.map(publish_worker_record, revids, chunksize=max(1, chunk_size))
+
+def stream_entry_details(db: HistoryStore, rfc_id_dict: dict, file_names: dict, writers: OutputWriters | None = None,
+                         workers: int = PUBLISH_WORKERS, chunk_size: int = PUBLISH_CHUNK_SIZE,
+                         keyword_scope: str = KEYWORD_DF_SCOPE) -> int:
+    """
+    Publish removed RfCs in two passes over the removal records.
+
+    The first pass builds the records (see iter_removal_records), spools them to a
+    temporary file and counts the words of each RfC question into a keyword engine.
+    The second pass writes the spooled records in revid order, picking each question's
+    words by TF-IDF against the finished counts.
+
+    Args:
+        db (HistoryStore): The history store.
+        rfc_id_dict (dict): RfC ids read from the CSV, see get_rfc_id_list.
+        file_names (dict): Filled with the output files written per year.
+        writers (OutputWriters | None): Open writers for the run's output files.
+        workers (int): Number of worker processes building the records.
+        chunk_size (int): Revisions sent to a worker at a time.
+        keyword_scope (str): 'all' to count word frequencies over all years, 'year' per year.
+    Returns:
+        int: Number of revisions read.
+    """
+    engines: dict[int | None, KeywordEngine] = {}
+    counted_links = set()
+    handled = 0
+    with tempfile.TemporaryFile() as spool:
+        for record in iter_removal_records(db, rfc_id_dict, workers, chunk_size):
+            engine = engines.setdefault(record['year'] if keyword_scope == 'year' else None, KeywordEngine())
+            for rfc in record['rfcs']:
+                # each question is printed once, so it counts as one document
+                if rfc['has_text'] and rfc['link'] not in counted_links:
+                    counted_links.add(rfc['link'])
+                    engine.add_document(rfc['words'])
+            if kill_requested():
+                raise KillSwitchEngaged(f"kill switch set after {handled} revisions")
+            pickle.dump(record, spool, pickle.HIGHEST_PROTOCOL)
+            handled += 1
+            print(f"details for revision {record['revid']}")
+
+        spool.seek(0)
+        for _ in range(handled):
+            record = pickle.load(spool)
+            engine = engines[record['year'] if keyword_scope == 'year' else None]
+            write_removal_record(record, file_names, writers, engine)
+    return handled
+
+# per process state of the publish workers, set by init_publish_worker
+publish_worker_db: HistoryStore | None = None
+publish_worker_timelines: dict[str, RfcTimeline] = {}
+
+def init_publish_worker(db_path: str, rfc_id_dict: dict):
+    """Open a read connection to the history store and build the RfC timelines in a publish worker process."""
+    global publish_worker_db, publish_worker_timelines
+    publish_worker_db = HistoryStore(db_path)
+    publish_worker_timelines = load_rfc_timelines(publish_worker_db, rfc_id_dict)
+
+def publish_worker_record(revid: int) -> dict:
+    """Build the output record of one revision in a publish worker."""
+    details = publish_worker_db[f"{ENTRY_DETAILS_PREFIX}{revid}"]
+    return removal_record(details, publish_worker_timelines)
+
+def list_rfc_revisions(rfc_id: str, comment_kw: str | None = None):
+    """Print the collected revisions that touched one RfC, optionally only those with a comment keyword."""
+    db = open_history_db()
+    revisions = db.revisions_for_rfc(rfc_id, comment_kw)
+    print(f"{len(revisions)} revisions affecting RfC {rfc_id}:")
+    for revision in revisions:
+        print(f"* {revision['timestamp']} {revision['page_title']} {revision['revid']}: {revision['comment']}")
+    db.close()
 
 
 def upload_changes_to_wiki(file_names: dict):
@@ -198,6 +563,9 @@ def upload_changes_to_wiki(file_names: dict):
         # {filename, error_filename}
         filename, error_filename = file_set
         page_title = f"User:DwAlphaBot/RfcHistory/{year}"
+        if kill_requested():
+            print(f"Kill switch set, not uploading {page_title}")
+            break
         # read local file content
         try:
             with open(filename, 'r', encoding='utf-8') as f:
@@ -210,30 +578,35 @@ def upload_changes_to_wiki(file_names: dict):
         except Exception as e:
             print(f"Error uploading changes to wiki page {page_title}: {e}")
 
-def list_entry_details():
+def list_entry_details(workers: int = PUBLISH_WORKERS):
 
     # check for exising details and exit if they exist for the first year to avoid unnecessary processing
-    # check the logs directory
+    # year files are only renamed into place once a run completes, so an existing file is a full output
 
     if os.path.exists('./logs/removed_rfcs_2020.txt'):
         print("Details for the year 2020 already exist. Exiting to avoid unnecessary processing.")
         return
 
-    db = shelve.open('rfc.db', writeback=False)
-    rfc_id_dict = get_rfc_id_list()
-    year_counts = {}
-    scan_all_rfcs(db,rfc_id_dict)
+    db = open_history_db()
     file_names = {}
-    for key in db.keys():
-        value = db[key]
-        if key.startswith('RevisionRunEntryDetails-'):
-            details = db[key]
-            handle_revision(details, rfc_id_dict, file_names)
-            print(f"details for {key}")
-    print("Summary of revisions examined per year:")
-    for year, count in year_counts.items():
-        print(f"Year {year}: {count} revisions examined")
-    db.close()
+    try:
+        rfc_id_dict = get_rfc_id_list()
+        db.replace_rfc_ids(rfc_id_dict)
+        db.sync()
+        with OutputWriters() as writers:
+            stream_entry_details(db, rfc_id_dict, file_names, writers, workers)
+    except KillSwitchEngaged as e:
+        print(f"Publishing stopped by kill switch, no year files were written ({e})")
+        return
+    except Exception as e:
+        print(f"Publishing stopped, no year files were written: {e.__class__.__name__}: {e}")
+        return
+    else:
+        print("Summary of revisions examined per year:")
+        for year, count in revisions_examined_per_year(db).items():
+            print(f"Year {year}: {count} revisions examined")
+    finally:
+        db.close()
 
     # upload changes to wiki
     upload_changes_to_wiki(file_names)
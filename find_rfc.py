@@ -1,12 +1,21 @@
 
 
 import asyncio
+from concurrent.futures import Executor
 from pywikibot import Link, Page
 from analyze_rfcs import SENTINEL
-from config import LIST_OF_RFC_PAGES, MAX_RFC_PAGES_TO_PROCESS, site
-from typing import List, Tuple
+from config import (LIST_OF_RFC_PAGES, MAX_RFC_PAGES_TO_PROCESS, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_PATH, PRELOAD_GROUP_SIZE,
+                    SECTION_INDEX_CACHE_SIZE, STATISTICS_ENGINE, site)
+from kill_page import kill_requested
+from page_cache import cached_page_text, open_page_cache, preload_uncached_texts
+from pipeline_metrics import MeteredQueue, PipelineMetrics
+from section_index import SectionIndexCache
+from typing import Iterator, List, Tuple
 import mwparserfromhell
 
+# section indexes of recently read pages, shared by all RfCs on a page revision
+section_indexes = SectionIndexCache(SECTION_INDEX_CACHE_SIZE)
+
 def is_not_other_list_page(page: Page) -> bool:
     other_list_pages = [
         "Wikipedia:Requests for comment",
@@ -22,81 +31,120 @@ def is_not_other_list_page(page: Page) -> bool:
 def is_not_user_page(page: Page) -> bool:
     return not page.title().startswith("User")
 
-def get_links_from_text(page: Page) -> List[Tuple[Page, Link]]:
+def collect_linked_pages(page: Page) -> List[Tuple[Page, Link]]:
+    """Return a Page and Link for each distinct link (page and section) in the text, without querying the API.
+
+    Links to different sections of one page, like several RfCs on a noticeboard, share a Page object.
+    """
     import pywikibot
     from pywikibot import textlib
 
-    result_set = set()
-    results = []
-
-    rfc_number = 0
-
+    pages = {}
+    seen = set()
+    candidates = []
     for m in pywikibot.link_regex.finditer(textlib.removeDisabledParts(page.text)):
-        link = pywikibot.Link(m["title"], site)
         try:
-            anchor = m.groupdict().get("label") or ""
-            rfc_page = Page(site, link.title, link.namespace)
-            print(f"  (page exists: {rfc_page.title()} {rfc_page.exists()})")
-            if rfc_page.exists():
-                if rfc_page in result_set:
-                    continue
-                result_set.add(rfc_page)
-                results.append((rfc_page, link))
-                rfc_number += 1
-                if rfc_number >= 200:
-                    print(f"Reached max RFC pages to process. {len(results)} pages collected.")
-                    return results
-
+            link = pywikibot.Link(m["title"], site)
+            rfc_page = pages.setdefault((link.namespace, link.title), Page(site, link.title, link.namespace))
+            if (rfc_page, link.section) in seen:
+                continue
+            seen.add((rfc_page, link.section))
+            candidates.append((rfc_page, link))
         except Exception as e:
-            print(f"Error processing link {m} {link}: {e}")
+            print(f"Error processing link {m}: {e}")
+    return candidates
 
+def resolve_redirects(pages: List[Page]) -> dict[str, Page]:
+    """Return the target of each redirect page, keyed by the redirect's title, using a single API query."""
+    from pywikibot.data import api
 
-    return results
+    if not pages:
+        return {}
+    request = api.Request(site=site, parameters={
+        'action': 'query',
+        'titles': [page.title() for page in pages],
+        'redirects': True,
+    })
+    redirects = request.submit().get('query', {}).get('redirects', [])
+    targets = {}
+    for redirect in redirects:
+        targets.setdefault(redirect['to'], Page(site, redirect['to']))
+    return {redirect['from']: targets[redirect['to']] for redirect in redirects}
 
-def get_sections_from_page(page: Page, rfc_id: str) -> mwparserfromhell.wikicode.Wikicode | None:
-    """Return list of sections as dicts: {'heading': str, 'text': str}.
+def iter_linked_rfc_pages(page: Page, groupsize: int = PRELOAD_GROUP_SIZE,
+                          limit: int = 200) -> Iterator[List[Tuple[Page, Link]]]:
+    """
+    Yield the existing pages linked from an RfC list page, one batch at a time.
 
-    Uses mwparserfromhell when available; falls back to a regex-based splitter.
+    Each batch of up to groupsize titles is preloaded with one query, which fills in existence,
+    the redirect flag and the latest revision id. Redirects in the batch are then resolved and
+    their targets preloaded with one more query each, instead of a request per link. Finally the
+    text of the revisions not already in the page cache is loaded with one more query.
+
+    Args:
+        page (Page): The RfC list page.
+        groupsize (int): Titles per query.
+        limit (int): Stop after this many existing pages.
+    Returns:
+        Iterator[List[Tuple[Page, Link]]]: (page, link) pairs of each batch, in link order,
+            with redirects replaced by their targets.
     """
-    text = page.text or ""
+    candidates = collect_linked_pages(page)
+    result_set = set()
+    rfc_number = 0
+    for start in range(0, len(candidates), groupsize):
+        batch = candidates[start:start + groupsize]
+        try:
+            pages = list(dict.fromkeys(rfc_page for rfc_page, _ in batch))
+            list(site.preloadpages(pages, groupsize=groupsize, content=False))
+            targets = resolve_redirects([rfc_page for rfc_page in pages
+                                         if rfc_page.exists() and rfc_page.isRedirectPage()])
+            target_pages = list(dict.fromkeys(targets.values()))
+            list(site.preloadpages(target_pages, groupsize=groupsize, content=False))
+            # only revisions not in the page cache are downloaded
+            preload_uncached_texts(open_page_cache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES), site,
+                                   [rfc_page for rfc_page in pages + target_pages if not rfc_page.isRedirectPage()],
+                                   groupsize)
+        except Exception as e:
+            print(f"Error preloading linked pages {start + 1}-{start + len(batch)}: {e}")
+            continue
 
-    # Try mwparserfromhell first for robust parsing
-    try:
-        wikicode = mwparserfromhell.parse(text)
-        sections = []
-        for sec in wikicode.get_sections(include_lead=False):
-            if rfc_id not in str(sec).lower():
+        results = []
+        for rfc_page, link in batch:
+            rfc_page = targets.get(rfc_page.title(), rfc_page)
+            print(f"  (page exists: {rfc_page.title()} {rfc_page.exists()})")
+            if not rfc_page.exists() or (rfc_page, link.section) in result_set:
                 continue
-            headings = sec.filter_headings()
-            heading = str(headings[0].title).strip() if headings else ""    
-            return sec
-        return None
-    except Exception:
-        # Fallback: crude regex-based section split
-        import re
-
-        pattern = re.compile(r"(?m)^(={2,})\s*(.+?)\s*\1\s*$")
-        matches = list(pattern.finditer(text))
-        if not matches:
-            return [{"heading": "", "text": text}]
-
-        sections = []
-        last_end = 0
-        last_heading = ""
-        for m in matches:
-            start = m.start()
-            if last_end < start:
-                body = text[last_end:start]
-                if last_heading or body.strip():
-                    sections.append({"heading": last_heading, "text": body})
-            last_heading = m.group(2).strip()
-            last_end = m.end()
-
-        # append trailing part
-        if last_end < len(text):
-            sections.append({"heading": last_heading, "text": text[last_end:]})
-
-        return sections
+            result_set.add((rfc_page, link.section))
+            results.append((rfc_page, link))
+            rfc_number += 1
+            if rfc_number >= limit:
+                print(f"Reached max RFC pages to process. {rfc_number} pages collected.")
+                yield results
+                return
+        yield results
+
+def get_links_from_text(page: Page) -> List[Tuple[Page, Link]]:
+    """Return every existing page linked from the page, see iter_linked_rfc_pages."""
+    return [result for batch in iter_linked_rfc_pages(page) for result in batch]
+
+def get_sections_from_page(page: Page, rfc_id: str) -> mwparserfromhell.wikicode.Wikicode | str | None:
+    """Return the first section of the page that mentions rfc_id.
+
+    Every RfC on a page revision shares one section index, built with mwparserfromhell
+    (or signature_scanner with STATISTICS_ENGINE = 'scanner') and falling back to a
+    regex-based splitter. The section is Wikicode when the page was parsed, else wikitext.
+    """
+    return find_rfc_section(page, fetch_page_text(page), rfc_id)
+
+def fetch_page_text(page: Page) -> str:
+    """Return the text of the page's latest revision, from the page cache when possible."""
+    return cached_page_text(open_page_cache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES), page)
+
+def find_rfc_section(page: Page, text: str, rfc_id: str) -> mwparserfromhell.wikicode.Wikicode | str | None:
+    """Return the first section of text, the latest revision of page, that mentions rfc_id."""
+    index = section_indexes.get(page.title(), page.latest_revision_id, text, STATISTICS_ENGINE)
+    return index.section(rfc_id)
     
 class RfcStats:
     def __init__(self):
@@ -114,48 +162,98 @@ def calculate_rfc_stats(rfc_section: mwparserfromhell.wikicode.Wikicode, rfc_id:
 
     return stats
 
-async def get_rfc_list(rfc_queue) -> None:
-    print("RFC Pages to monitor:")
-    for page in LIST_OF_RFC_PAGES:
-        print(f"- {page}")
-        list_page = Page(site, page)
-        if list_page.exists():
-            print(f"{list_page.title}  (Page exists)")
-        else:
-            print(f"  (Page does not exist)")
-        
-        # print the initial content of the page
-        # print(f"  Content preview: {list_page.text[:50]}...")
+def rfc_id_from_link(link: Link) -> str:
+    """Return the lowercase id of a link to a section like 'rfc ABD0AB3', or "" if it links to no RfC."""
+    target_rfc = link.section or "*******No section linked*****"
+    if 'rfc ' in target_rfc.lower():
+        return target_rfc.lower().split('rfc ')[1].strip()
+    return ""
 
-        results = []
+async def list_rfc_links(link_queue: MeteredQueue, executor: Executor | None, producers: int) -> None:
+    """
+    Queue (page, rfc_id, link) for every RfC linked from the list pages, then one sentinel per producer.
 
-        rfc_page_results = get_links_from_text(list_page)
-        print(f"  Found {len(rfc_page_results)} linked RFC pages.")
-        for result in rfc_page_results:
-            rfc_page, link = result
-            print(f"    - Linked RFC Page: {rfc_page.title()} (Link: {link})")
-            target_rfc = link.section or "*******No section linked*****"
-            # for section like rfc ABD0AB3
-            # extract the id after 'rfc '
-            rfc_id = ""
-            if 'rfc ' in target_rfc.lower():
-                rfc_id = target_rfc.lower().split('rfc ')[1].strip()
-            # if no id found, skip
-            if rfc_id == "":
-                continue
-            
-            rfc_section = get_sections_from_page(rfc_page, rfc_id)
-            if rfc_section is not None:
-                print(f"Putting in queue: {rfc_page.title()} (Link: {link})")
-                await asyncio.sleep(0)  # Yield control
-                await rfc_queue.put((rfc_section, rfc_id, link))
-                # Yield control to allow workers to process
-                await asyncio.sleep(0)
-                # results.append(calculate_rfc_stats(rfc_section, rfc_id, link))
+    The batched page lookups of iter_linked_rfc_pages block, so each batch is read on the executor
+    while the producers work through the sections already queued.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        for page in LIST_OF_RFC_PAGES:
+            if kill_requested():
+                print("Kill switch set, not listing more RfCs")
+                break
+            print(f"- {page}")
+            list_page = Page(site, page)
+            if await loop.run_in_executor(executor, list_page.exists):
+                print(f"{list_page.title()}  (Page exists)")
             else:
-                print(f"      No matching section found for RFC ID: {rfc_id}")
+                print(f"  (Page does not exist)")
                 continue
-        await rfc_queue.put((SENTINEL, SENTINEL, SENTINEL))  # Sentinel to signal completion
+
+            found = 0
+            batches = iter_linked_rfc_pages(list_page)
+            while (rfc_page_results := await loop.run_in_executor(executor, link_queue.metrics.timed, 'list',
+                                                                  next, batches, None)) is not None:
+                found += len(rfc_page_results)
+                print(f"  Found {len(rfc_page_results)} linked RFC pages ({found} so far).")
+                if kill_requested():
+                    print("Kill switch set, not listing more RfCs")
+                    return
+                for rfc_page, link in rfc_page_results:
+                    print(f"    - Linked RFC Page: {rfc_page.title()} (Link: {link})")
+                    rfc_id = rfc_id_from_link(link)
+                    # if no id found, skip
+                    if rfc_id == "":
+                        continue
+                    await link_queue.put((rfc_page, rfc_id, link))
+    finally:
+        for _ in range(producers):
+            await link_queue.put((SENTINEL, SENTINEL, SENTINEL))
+
+async def rfc_section_producer(link_queue: MeteredQueue, rfc_queue, executor: Executor | None, producer_id: int) -> None:
+    """Find the section of each queued RfC on the executor and queue it for the stats workers, until a sentinel."""
+    loop = asyncio.get_running_loop()
+    timed = link_queue.metrics.timed
+    while True:
+        rfc_page, rfc_id, link = await link_queue.get()
+        if rfc_page is SENTINEL:
+            print(f"[Producer {producer_id}] Received sentinel, exiting")
+            break
+        try:
+            text = await loop.run_in_executor(executor, timed, 'fetch', fetch_page_text, rfc_page)
+            rfc_section = await loop.run_in_executor(executor, timed, 'parse', find_rfc_section, rfc_page, text, rfc_id)
+        except Exception as e:
+            print(f"[Producer {producer_id}] Error reading {rfc_page.title()}: {e}")
+            continue
+        if rfc_section is not None:
+            print(f"[Producer {producer_id}] Putting in queue: {rfc_page.title()} (Link: {link})")
+            await rfc_queue.put((rfc_section, rfc_id, link))
+        else:
+            print(f"      No matching section found for RFC ID: {rfc_id}")
+
+async def get_rfc_list(rfc_queue, executor: Executor | None = None, producers: int = 1,
+                       metrics: PipelineMetrics | None = None) -> None:
+    """
+    Queue the section of every RfC linked from the list pages.
+
+    One task lists the linked RfCs, batch by batch, while `producers` tasks read their sections.
+    All blocking pywikibot calls run on the executor (the loop's default one if None), so
+    page lookups, text fetches and parses of different RfCs overlap. Returns once every
+    section is queued; the caller then sends the stats workers their sentinels.
+
+    Args:
+        rfc_queue (RfcSectionQueue): Queue of (section, rfc_id, link) read by the stats workers.
+        executor (Executor | None): Pool running the blocking calls.
+        producers (int): Number of tasks reading sections.
+        metrics (PipelineMetrics | None): Where the list, fetch and parse stages are timed.
+    """
+    print("RFC Pages to monitor:")
+    producers = max(1, producers)
+    link_queue = MeteredQueue('links', producers * 2, metrics)
+    producer_tasks = [asyncio.create_task(rfc_section_producer(link_queue, rfc_queue, executor, producer_id))
+                      for producer_id in range(producers)]
+    await list_rfc_links(link_queue, executor, producers)
+    await asyncio.gather(*producer_tasks)
             # collect the list of links on the page
         # collect the list of links on the page
         # links = list_page.linkedPages()
@@ -1,4 +1,5 @@
 
+from contextlib import nullcontext
 from datetime import datetime
 from pydoc import text
 import re
@@ -9,7 +10,10 @@ from config import site
 
 from pywikibot.diff import html_comparator
 
-from word_extraction import extract_words
+from diff_storage import diff_lines, without_diff
+from output_writers import OutputWriters
+from rfc_timeline import EMPTY_TIMELINE, RfcTimeline, sorted_timeline
+from word_extraction import KeywordEngine, find_words, select_words
 
 page_shortcuts = {}
 
@@ -34,130 +38,128 @@ def find_shortcut(page_title: str) -> str:
 
     return page_shortcuts.get(page_title, page_title)    
 
-comment_keywords = ['added','removed', 'deleted', 'maintenance']
+def open_output(filename: str, writers: OutputWriters | None):
+    """Return the run's long-lived handle for filename, or a one-off append handle without writers."""
+    if writers is None:
+        return open(filename, 'a', encoding='utf-8')
+    return nullcontext(writers.open(filename))
 
-def extract_revisions(diff_entries: list[dict]) -> list[dict]:
+def build_removal_record(entry: dict, rfcs: dict[str, dict], timelines: dict[str, RfcTimeline]) -> dict:
     """
-    Given a list of diff entries, extract revision information.
+    Work out everything file_appender writes for a revision, without touching printed_links or common_words.
 
     Args:
-        diff_entries (list[dict]): List of diff entries.
+        entry (dict): The revision details.
+        rfcs (dict[str, dict]): RfCs found in the deleted lines, keyed by link.
+        timelines (dict[str, RfcTimeline]): Revision timelines keyed by RfC id.
     Returns:
-        list[dict]: List of revisions extracted.
+        dict: A picklable record for write_removal_record.
     """
-    revisions_by_shortcut = {}
-    revisions = []
-    for entry in diff_entries:
-        revision_id = entry.get('revid')
-        page_title = entry.get('page_title')
-        comment = entry.get('comment', '').lower()
-        # extract key words added, maintenance, removed from comment    
-        keywords_found = [kw for kw in comment_keywords if kw in comment]
-        revision = {
-            'revid': revision_id,
-            'page_title': page_title,
-            'comment_kw': ", ".join(keywords_found),
-            'shortcut': find_shortcut(page_title),
-            'timestamp': entry.get('timestamp')
-        }
-        if page_title and revision_id:
-            label = f"{find_shortcut(page_title)} {revision_id}"
-            diff_template = "{{" + f"Diff|{page_title}|prev|{revision_id}|{label}" + "}}"
-            revision['diff_template'] = diff_template
-        revisions.append(revision)
-        shortcut = revision['shortcut']
-        if shortcut not in revisions_by_shortcut:
-            revisions_by_shortcut[shortcut] = []
-        revisions_by_shortcut[shortcut].append(revision)
-
-    # sort each shortcut's revisions by timestamp ascending
-    for revs in revisions_by_shortcut.values():
-        revs.sort(key=lambda x: x.get('timestamp'))
-
-    # find first and last revision by shortcut
-    for revs in revisions_by_shortcut.values():
-        if revs:
-            first_rev = revs[0]
-            last_rev = revs[-1]
-            
-    first_and_last_revs = []
-
-    for revs in revisions_by_shortcut.values():
-        if revs:
-            first_rev = revs[0]
-            last_rev = revs[-1]
-            first_and_last_revs.append(first_rev)
-            if last_rev != first_rev:
-                first_and_last_revs.append(last_rev)
-
-    # sort first_and_last_revs by timestamp ascending
-    first_and_last_revs.sort(key=lambda x: x.get('timestamp'))
-
-    return first_and_last_revs
-
-def file_appender(entry: dict, rfcs: dict[str, dict], rfc_id_dict: dict[str, dict], file_names: dict):
-    """
-    Append text to a file.
+    timestamp: Timestamp = entry.get('timestamp')
+    if timestamp:
+        # get YYYY-MM-DD HH:MM format
+        timestamp_str = f"expired {timestamp.year}-{timestamp.month:02}-{timestamp.day:02} {timestamp.hour:02}:{timestamp.minute:02}"
+    else:
+        timestamp_str = ''
+
+    record = {
+        'year': entry.get('year'),
+        'revid': entry.get('revid'),
+        # find shortcut for page title
+        'shortcut': find_shortcut(entry.get('page_title', '')),
+        'timestamp_str': timestamp_str,
+        'rfcs': [],
+    }
+    if not rfcs:
+        record['entry_text'] = f"{without_diff(entry)}"
+        return record
 
-    Args:
-        filename (str): The name of the file to append to.
-        text (str): The text to append.
+    for rfc in rfcs.values():
+        rfc_id = rfc.get('rfc_id', '')
+        record['rfcs'].append({
+            'link': rfc.get('link', ''),
+            'rfc_id': rfc_id,
+            'user': rfc.get('user'),
+            'datetime': rfc.get('datetime'),
+            'has_text': bool(rfc.get('rfc_text')),
+            'words': find_words(rfc.get('rfc_text', '')),
+            'diff_templates': timelines.get(rfc_id, EMPTY_TIMELINE).diff_templates(),
+        })
+    return record
+
+def write_removal_record(record: dict, file_names: dict, writers: OutputWriters | None = None,
+                         keywords: KeywordEngine | None = None):
     """
+    Write a record from build_removal_record to its year's output file.
 
-    # find shortcut for page title
-    entry_page_title = entry.get('page_title', '')
-    shortcut = find_shortcut(entry_page_title)
-
+    Records must be written in revid order: links already in printed_links are skipped,
+    and without a keyword engine the common word counts change with every record.
 
-    year = entry.get('year')
+    Args:
+        record (dict): The record to write.
+        file_names (dict): Filled with the output and error file names per year.
+        writers (OutputWriters | None): Open writers for the run; without them each call appends.
+        keywords (KeywordEngine | None): Built keyword engine for the record's year; without one
+            the words are picked by word_extraction.select_words.
+    """
+    year = record['year']
     filename = f"./logs/removed_rfcs_{year}.txt"
     error_filename = f"./logs/removed_rfcs_errors_{year}.txt"
     if file_names is not None:
         file_names[year] = (filename, error_filename)
 
     # if rfcs is empty, log to error file
-    if not rfcs:
-        with open(error_filename, 'a', encoding='utf-8') as f:
-            f.write(f"== No RFCs found for revision {entry.get('revid')} ==\n")
-            f.write(f"Entry details: {entry}\n\n")
+    if not record['rfcs']:
+        with open_output(error_filename, writers) as f:
+            f.write(f"== No RFCs found for revision {record['revid']} ==\n")
+            f.write(f"Entry details: {record['entry_text']}\n\n")
         return
-    
-
-    if rfcs:
-        with open(filename, 'a', encoding='utf-8') as f:
-            timestamp: Timestamp = entry.get('timestamp')
-            if timestamp:
-                # get YYYY-MM-DD HH:MM format
-                timestamp_str = f"expired {timestamp.year}-{timestamp.month:02}-{timestamp.day:02} {timestamp.hour:02}:{timestamp.minute:02}"
-            else:
-                timestamp_str = ''
-
-            #f.write(f"== Removed RFC from {shortcut} {entry.get('revid')} {timestamp_str}  ==\n")
-            for rfc in rfcs.values():                
-                link = rfc.get('link', '')
-                rfc_id = rfc.get('rfc_id', '')
-                diff_entries = rfc_id_dict.get(rfc_id, {}).get('diff_entries', [])
-                revisions = extract_revisions(diff_entries)
-
-                # extract words from rfc text
-                extracted_words = extract_words(rfc.get('rfc_text', ''))
-
-                # only print the following if not seen before in printed_links
-                if rfc.get('link') not in printed_links:
-                    header = f"=== {link} {timestamp_str} ===\n" if link else f"== Removed RFC from {shortcut} {entry.get('revid')} {timestamp_str}  ==\n"
-                    f.write(f"{header}")
-                    printed_links[rfc.get('link')] = shortcut
-                    f.write(f"* Id: {rfc_id}\n")
-                    if rfc.get('user'):
-                        f.write(f"* User: {rfc.get('user')}\n")
-                    if rfc.get('datetime'):
-                        f.write(f"* Question Date: {rfc.get('datetime')}\n")
-                    if revisions:
-                        f.write("* Revisions affecting this RFC:\n")
-                        for rev in revisions:
-                            f.write(f"** {rev.get('diff_template')}\n")
-                    if rfc.get('rfc_text'):
-                        f.write(f"* RFC question (some extracted words): {extracted_words}\n\n")
+
+    shortcut = record['shortcut']
+    timestamp_str = record['timestamp_str']
+    with open_output(filename, writers) as f:
+        #f.write(f"== Removed RFC from {shortcut} {record['revid']} {timestamp_str}  ==\n")
+        for rfc in record['rfcs']:
+            link = rfc['link']
+            # extract words from rfc text; select_words has to see every RfC, printed or not
+            extracted_words = select_words(rfc['words']) if keywords is None else None
+
+            # only print the following if not seen before in printed_links
+            if link not in printed_links:
+                header = f"=== {link} {timestamp_str} ===\n" if link else f"== Removed RFC from {shortcut} {record['revid']} {timestamp_str}  ==\n"
+                f.write(f"{header}")
+                printed_links[link] = shortcut
+                f.write(f"* Id: {rfc['rfc_id']}\n")
+                if rfc['user']:
+                    f.write(f"* User: {rfc['user']}\n")
+                if rfc['datetime']:
+                    f.write(f"* Question Date: {rfc['datetime']}\n")
+                if rfc['diff_templates']:
+                    f.write("* Revisions affecting this RFC:\n")
+                    for diff_template in rfc['diff_templates']:
+                        f.write(f"** {diff_template}\n")
+                if rfc['has_text']:
+                    if keywords is not None:
+                        extracted_words = keywords.keywords(rfc['words'])
+                    f.write(f"* RFC question (some extracted words): {extracted_words}\n\n")
+
+def file_appender(entry: dict, rfcs: dict[str, dict], rfc_id_dict: dict[str, dict], file_names: dict, writers: OutputWriters | None = None):
+    """
+    Write the removed RfCs of a revision to its year's output file.
+
+    Args:
+        entry (dict): The revision details.
+        rfcs (dict[str, dict]): RfCs found in the deleted lines, keyed by link.
+        rfc_id_dict (dict[str, dict]): RfC ids with their 'diff_entries'.
+        file_names (dict): Filled with the output and error file names per year.
+        writers (OutputWriters | None): Open writers for the run; without them each call appends.
+    """
+    timelines = {}
+    for rfc in rfcs.values():
+        rfc_id = rfc.get('rfc_id', '')
+        diff_entries = (rfc_id_dict or {}).get(rfc_id, {}).get('diff_entries', [])
+        timelines[rfc_id] = sorted_timeline(diff_entries, find_shortcut)
+    write_removal_record(build_removal_record(entry, rfcs, timelines), file_names, writers)
 
 def extract_user_and_date(rfc_text: str) -> tuple[str, Timestamp]:
     """
@@ -199,9 +201,17 @@ def extract_user_and_date(rfc_text: str) -> tuple[str, Timestamp]:
 
     return (user, rfc_datetime)
 
-def print_removed_entries(entry, print_keys, diff_table=None, rfc_id_dict=None, file_names=None):
+def find_removed_rfcs(entry: dict, diff_compare: dict[str, list[str]]) -> dict[str, dict]:
+    """
+    Find the RfCs in the deleted lines of a revision, with their question text, user and date.
+
+    Args:
+        entry (dict): The revision details.
+        diff_compare (dict[str, list[str]]): The revision's changed lines, see diff_storage.diff_lines.
+    Returns:
+        dict[str, dict]: RfCs keyed by their link.
+    """
     rfcs: dict[str, dict] = {}
-    diff_compare = html_comparator(diff_table)
 
     deleted_content = diff_compare['deleted-context'] or []
     deleted_lines = '\n'.join(deleted_content)
@@ -259,8 +269,14 @@ def print_removed_entries(entry, print_keys, diff_table=None, rfc_id_dict=None,
 
     # find rfc_link but no rfc_texts
 
+    return rfcs
 
-    file_appender(entry, rfcs, rfc_id_dict, file_names)
+def print_removed_entries(entry, print_keys, diff_table=None, rfc_id_dict=None, file_names=None, diff_compare=None, writers=None):
+    # compact records carry the extracted lines, older ones only the raw table
+    if diff_compare is None:
+        diff_compare = diff_lines(entry, diff_table)
+    rfcs = find_removed_rfcs(entry, diff_compare)
+    file_appender(entry, rfcs, rfc_id_dict, file_names, writers)
 
     # print(f'== Removed RFC Entries ==')
     # for rfc_text in rfc_texts:
@@ -374,10 +390,10 @@ def print_removed_entries2(entry, print_keys, diff_table=None):
 
 
 
-def handle_revision(entry: dict, rfc_id_dict: dict, file_names: dict):
+def handle_revision(entry: dict, rfc_id_dict: dict, file_names: dict, diff_compare: dict | None = None, writers: OutputWriters | None = None):
     print_keys = ['revid', 'parentid', 'timestamp', 'user', 'comment']
     if 'removed' in entry.get('comment', '').lower():
-        print_removed_entries(entry, print_keys, entry.get('diff_table'), rfc_id_dict, file_names)
+        print_removed_entries(entry, print_keys, entry.get('diff_table'), rfc_id_dict, file_names, diff_compare, writers)
 
 if __name__ == "__main__":
     #entry = {'revid': 1063078964, 'parentid': 1062709000, 'timestamp': Timestamp(2022, 1, 1, 3, 1, 22), 'user': 'Legobot', 'comment': 'Removed: [[Wikipedia talk:Notability (organizations and companies)]].', 'diff_table': '<tr>\n  <td colspan="2" class="diff-lineno">Line 55:</td>\n  <td colspan="2" class="diff-lineno">Line 55:</td>\n</tr>\n<tr>\n  <td class="diff-marker"></td>\n  <td class="diff-context diff-side-deleted"><div>(Editors {{u|Binksternet}}, {{u|Black Kite}}, {{u|FormalDude}} expressed opinions above). &lt;s&gt;Also, @ {{u|CAMERAwMUSTACHE}}, {{u|ChicagoWikiEditor}}, {{u|FMSky}} if they have time for suggestions, would be welcome&lt;/s&gt;.</div></td>\n  <td class="diff-marker"></td>\n  <td class="diff-context diff-side-added"><div>(Editors {{u|Binksternet}}, {{u|Black Kite}}, {{u|FormalDude}} expressed opinions above). &lt;s&gt;Also, @ {{u|CAMERAwMUSTACHE}}, {{u|ChicagoWikiEditor}}, {{u|FMSky}} if they have time for suggestions, would be welcome&lt;/s&gt;.</div></td>\n</tr>\n<tr>\n  <td class="diff-marker"></td>\n  <td class="diff-context diff-side-deleted"><div>[[User:Cornerstonepicker|Cornerstonepicker]] ([[User talk:Cornerstonepicker|talk]]) 02:13, 3 December 2021 (UTC)}}</div></td>\n  <td class="diff-marker"></td>\n  <td class="diff-context diff-side-added"><div>[[User:Cornerstonepicker|Cornerstonepicker]] ([[User talk:Cornerstonepicker|talk]]) 02:13, 3 December 2021 (UTC)}}</div></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><div>\'\'\'[[Wikipedia talk:Notability (organizations and companies)#rfc_4ED494F|Wikipedia talk:Notability (organizations and companies)]]\'\'\'</div></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><div>{{rfcquote|text=</div></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><div>Should the line {{tq|The scope of this guideline covers all groups of people organized together for a purpose with the exception of non-profit educational institutions, religions or sects, and sports teams.}} be altered to state:</div></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><div>*\'\'\'A\'\'\': That esports are within the scope of this notability guideline</div></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><div>*\'\'\'B\'\'\': That esports are not within the scope of this notability guideline</div></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><div>*\'\'\'C\'\'\': No change</div></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><br /></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><div>This RfC is proposed in the context of the no consensus [[Wikipedia:Articles for deletion/Stalwart Esports (2nd nomination)|Stalwart Esports AfD]] where the closer opined that there was a "real need" for guidance on which guideline or policy was controlling.</div></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker" data-marker="−"></td>\n  <td class="diff-deletedline diff-side-deleted"><div>02:32, 2 December 2021 (UTC)}}</div></td>\n  <td colspan="2" class="diff-empty diff-side-added"></td>\n</tr>\n<tr>\n  <td class="diff-marker"></td>\n  <td class="diff-context diff-side-deleted"><div>{{RFC list footer|bio|hide_instructions={{{hide_instructions}}} }}</div></td>\n  <td class="diff-marker"></td>\n  <td class="diff-context diff-side-added"><div>{{RFC list footer|bio|hide_instructions={{{hide_instructions}}} }}</div></td>\n</tr>\n', 'page_title': 'Wikipedia:Requests_for_comment/Biographies', 'year': 2022}
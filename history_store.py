@@ -0,0 +1,481 @@
+import glob
+import pickle
+import re
+import shelve
+import sqlite3
+import time
+from typing import Any, Iterator
+
+from diff_storage import diff_lines
+
+RUN_START_PREFIX = 'RevisionRunStart-'
+RUN_STATS_PREFIX = 'RevisionRunStats-'
+ENTRY_ID_PREFIX = 'RevisionRunEntryId-'
+ENTRY_DETAILS_PREFIX = 'RevisionRunEntryDetails-'
+
+MIGRATED_FROM_KEY = 'HistoryStoreMeta-migrated-from'
+RFC_INDEX_KEY = 'HistoryStoreMeta-rfc-index'
+
+# Keywords of Legobot edit summaries recorded with each rfc_id -> revision row
+COMMENT_KEYWORDS = ['added', 'removed', 'deleted', 'maintenance']
+
+RFC_ID_RE = re.compile(r'#rfc_([a-zA-Z0-9]+)')
+
+# Statements used by HistoryStore.merge_from, with the shard attached as "shard"
+MERGE_STATEMENTS = [
+    'INSERT OR REPLACE INTO main.runs SELECT * FROM shard.runs',
+    # Never let a failed retry in a shard overwrite a revision the main store already processed
+    'INSERT OR REPLACE INTO main.revisions SELECT * FROM shard.revisions AS s '
+    'WHERE s.processed = 1 OR NOT EXISTS (SELECT 1 FROM main.revisions AS m WHERE m.revid = s.revid)',
+    'INSERT OR REPLACE INTO main.high_water_marks SELECT * FROM shard.high_water_marks AS s '
+    'WHERE NOT EXISTS (SELECT 1 FROM main.high_water_marks AS m WHERE m.year = s.year '
+    'AND m.page_title = s.page_title AND m.bot_username = s.bot_username AND m.revid >= s.revid)',
+    'INSERT OR REPLACE INTO main.rfc_revisions SELECT * FROM shard.rfc_revisions',
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    year INTEGER,
+    page_title TEXT,
+    bot_username TEXT,
+    started REAL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_kind_year ON runs (kind, year);
+CREATE INDEX IF NOT EXISTS runs_page_title ON runs (page_title);
+
+CREATE TABLE IF NOT EXISTS revisions (
+    revid INTEGER PRIMARY KEY,
+    processed INTEGER NOT NULL DEFAULT 0,
+    parentid INTEGER,
+    timestamp TEXT,
+    year INTEGER,
+    page_title TEXT,
+    bot_username TEXT,
+    comment TEXT,
+    details BLOB
+);
+CREATE INDEX IF NOT EXISTS revisions_year_page ON revisions (year, page_title);
+CREATE INDEX IF NOT EXISTS revisions_page_title ON revisions (page_title, revid);
+
+CREATE TABLE IF NOT EXISTS rfc_ids (
+    rfc_id TEXT PRIMARY KEY,
+    rfc_page TEXT,
+    details BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rfc_ids_rfc_page ON rfc_ids (rfc_page);
+
+CREATE TABLE IF NOT EXISTS high_water_marks (
+    year INTEGER NOT NULL,
+    page_title TEXT NOT NULL,
+    bot_username TEXT NOT NULL,
+    revid INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (year, page_title, bot_username)
+);
+
+CREATE TABLE IF NOT EXISTS rfc_revisions (
+    rfc_id TEXT NOT NULL,
+    revid INTEGER NOT NULL,
+    timestamp TEXT,
+    page_title TEXT,
+    comment TEXT,
+    comment_kw TEXT,
+    PRIMARY KEY (rfc_id, revid)
+);
+CREATE INDEX IF NOT EXISTS rfc_revisions_revid ON rfc_revisions (revid);
+
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+"""
+
+
+def _timestamp_text(value) -> str | None:
+    """Return a sortable ISO 8601 string for a pywikibot Timestamp or datetime."""
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def comment_keywords_of(comment: str | None) -> str:
+    """Return the COMMENT_KEYWORDS found in an edit summary, comma separated."""
+    comment = (comment or '').lower()
+    return ", ".join(kw for kw in COMMENT_KEYWORDS if kw in comment)
+
+
+def rfc_ids_in_details(details: dict) -> list[str]:
+    """Return the distinct RfC ids linked from the changed lines of a revision, in order of appearance."""
+    lines = diff_lines(details)
+    text = '\n'.join(lines['deleted-context'] + lines['added-context'])
+    return list(dict.fromkeys(RFC_ID_RE.findall(text)))
+
+
+def _revid_from_key(key: str, prefix: str) -> int:
+    try:
+        return int(key[len(prefix):])
+    except ValueError:
+        raise KeyError(key)
+
+
+class HistoryStore:
+    """
+    SQLite backed replacement for the rfc.db shelve.
+
+    Keys use the same string prefixes as the shelve, so code written against
+    ``shelve.Shelf`` keeps working. Behind the mapping interface runs,
+    revisions and processed flags live in indexed tables, which lets callers
+    query by year, page or prefix without unpickling every record.
+
+    Writes are grouped into one transaction that is committed by ``sync()``,
+    ``close()`` or a full ``checkpoint()`` window. A crash therefore loses at
+    most the writes made since the last commit, and never half of one.
+    """
+
+    def __init__(self, path: str, checkpoint_every: int = 1, checkpoint_seconds: float = 0.0):
+        self.path = path
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.checkpoint_seconds = checkpoint_seconds
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # shelve compatible mapping interface
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key.startswith(ENTRY_DETAILS_PREFIX):
+            self.put_revision(value, revid=_revid_from_key(key, ENTRY_DETAILS_PREFIX))
+        elif key.startswith(ENTRY_ID_PREFIX):
+            self.set_processed(_revid_from_key(key, ENTRY_ID_PREFIX), bool(value))
+        elif key.startswith(RUN_START_PREFIX):
+            self._put_run(key, 'start', value, getattr(value, '__dict__', {}))
+        elif key.startswith(RUN_STATS_PREFIX):
+            self._put_run(key, 'stats', value, value)
+        else:
+            self.conn.execute('INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)',
+                              (key, pickle.dumps(value)))
+
+    def __getitem__(self, key: str) -> Any:
+        if key.startswith(ENTRY_DETAILS_PREFIX):
+            row = self.conn.execute('SELECT details FROM revisions WHERE revid = ?',
+                                    (_revid_from_key(key, ENTRY_DETAILS_PREFIX),)).fetchone()
+            if row is None or row[0] is None:
+                raise KeyError(key)
+            return pickle.loads(row[0])
+        if key.startswith(ENTRY_ID_PREFIX):
+            row = self.conn.execute('SELECT processed FROM revisions WHERE revid = ?',
+                                    (_revid_from_key(key, ENTRY_ID_PREFIX),)).fetchone()
+            if row is None:
+                raise KeyError(key)
+            return bool(row[0])
+        if key.startswith(RUN_START_PREFIX) or key.startswith(RUN_STATS_PREFIX):
+            row = self.conn.execute('SELECT value FROM runs WHERE key = ?', (key,)).fetchone()
+        else:
+            row = self.conn.execute('SELECT value FROM kv WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return pickle.loads(row[0])
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self, prefix: str = '') -> Iterator[str]:
+        """
+        Iterate over stored keys, optionally only those starting with prefix.
+
+        Only the tables that can hold the prefix are read, and no values are unpickled.
+        """
+        def wanted(table_prefix: str) -> bool:
+            return table_prefix.startswith(prefix) or prefix.startswith(table_prefix)
+
+        if wanted(RUN_START_PREFIX) or wanted(RUN_STATS_PREFIX):
+            for (key,) in self.conn.execute('SELECT key FROM runs ORDER BY key'):
+                if key.startswith(prefix):
+                    yield key
+        if wanted(ENTRY_ID_PREFIX):
+            for (revid,) in self.conn.execute('SELECT revid FROM revisions ORDER BY revid'):
+                key = f'{ENTRY_ID_PREFIX}{revid}'
+                if key.startswith(prefix):
+                    yield key
+        if wanted(ENTRY_DETAILS_PREFIX):
+            for (revid,) in self.conn.execute(
+                    'SELECT revid FROM revisions WHERE details IS NOT NULL ORDER BY revid'):
+                key = f'{ENTRY_DETAILS_PREFIX}{revid}'
+                if key.startswith(prefix):
+                    yield key
+        for (key,) in self.conn.execute('SELECT key FROM kv ORDER BY key'):
+            if key.startswith(prefix):
+                yield key
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.keys())
+
+    def sync(self) -> None:
+        self.conn.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def checkpoint(self) -> bool:
+        """
+        Mark the end of one unit of work, committing when the window is full.
+
+        The window is full after checkpoint_every units or once checkpoint_seconds
+        have passed since the last commit, whichever comes first.
+
+        Returns:
+            bool: True if the pending writes were committed.
+        """
+        self._uncommitted += 1
+        elapsed = time.monotonic() - self._last_commit
+        if self._uncommitted >= self.checkpoint_every or (self.checkpoint_seconds and elapsed >= self.checkpoint_seconds):
+            self.sync()
+            return True
+        return False
+
+    def vacuum(self) -> None:
+        """Commit and rebuild the database file so space freed by updates is returned to disk."""
+        self.sync()
+        self.conn.execute('VACUUM')
+
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+    # table level access
+
+    def _put_run(self, key: str, kind: str, value: Any, fields: dict) -> None:
+        self.conn.execute(
+            'INSERT OR REPLACE INTO runs (key, kind, year, page_title, bot_username, started, value) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, kind, fields.get('year'), fields.get('page_title'), fields.get('bot_username'),
+             fields.get('timestamp'), pickle.dumps(value)))
+
+    def put_revision(self, details: dict, revid: int | None = None) -> None:
+        """Store the details of one revision, keeping its processed flag."""
+        revid = revid if revid is not None else details['revid']
+        self.conn.execute(
+            'INSERT INTO revisions (revid, parentid, timestamp, year, page_title, bot_username, comment, details) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (revid) DO UPDATE SET parentid = excluded.parentid, timestamp = excluded.timestamp, '
+            'year = excluded.year, page_title = excluded.page_title, bot_username = excluded.bot_username, '
+            'comment = excluded.comment, details = excluded.details',
+            (revid, details.get('parentid'), _timestamp_text(details.get('timestamp')), details.get('year'),
+             details.get('page_title'), details.get('bot_username'), details.get('comment'),
+             pickle.dumps(details)))
+        self._index_rfc_ids(revid, details)
+
+    def _index_rfc_ids(self, revid: int, details: dict) -> None:
+        self.conn.execute('DELETE FROM rfc_revisions WHERE revid = ?', (revid,))
+        timestamp = _timestamp_text(details.get('timestamp'))
+        comment = details.get('comment')
+        self.conn.executemany(
+            'INSERT INTO rfc_revisions (rfc_id, revid, timestamp, page_title, comment, comment_kw) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            ((rfc_id, revid, timestamp, details.get('page_title'), comment, comment_keywords_of(comment))
+             for rfc_id in rfc_ids_in_details(details)))
+
+    def revisions_for_rfc(self, rfc_id: str, comment_kw: str | None = None) -> list[dict]:
+        """
+        Look up the revisions whose changed lines link to an RfC, oldest first.
+
+        Args:
+            rfc_id (str): The RfC id, e.g. '76C58B0'.
+            comment_kw (str | None): Only return revisions whose edit summary has this keyword, e.g. 'added'.
+        Returns:
+            list[dict]: revid, timestamp, page_title, comment and comment_kw of each revision.
+        """
+        query = ('SELECT revid, timestamp, page_title, comment, comment_kw FROM rfc_revisions '
+                 'WHERE rfc_id = ?')
+        params: list = [rfc_id]
+        if comment_kw is not None:
+            query += " AND (', ' || comment_kw || ',') LIKE ?"
+            params.append(f'%, {comment_kw},%')
+        query += ' ORDER BY timestamp, revid'
+        return [{'revid': revid, 'timestamp': timestamp, 'page_title': page_title, 'comment': comment,
+                 'comment_kw': kw}
+                for revid, timestamp, page_title, comment, kw in self.conn.execute(query, params)]
+
+    def iter_rfc_index(self) -> Iterator[tuple]:
+        """Yield every (rfc_id, revid, timestamp, page_title, comment_kw) index row, by RfC id and then oldest first."""
+        yield from self.conn.execute(
+            'SELECT rfc_id, revid, timestamp, page_title, comment_kw FROM rfc_revisions '
+            'ORDER BY rfc_id, timestamp, revid')
+
+    def rebuild_rfc_index(self, batch_size: int = 1000) -> int:
+        """Rebuild the rfc_id -> revisions index from every stored revision."""
+        self.conn.execute('DELETE FROM rfc_revisions')
+        revids = [revid for (revid,) in self.conn.execute(
+            'SELECT revid FROM revisions WHERE details IS NOT NULL ORDER BY revid')]
+        for count, revid in enumerate(revids, start=1):
+            self._index_rfc_ids(revid, self[f'{ENTRY_DETAILS_PREFIX}{revid}'])
+            if count % batch_size == 0:
+                self.sync()
+        self[RFC_INDEX_KEY] = 1
+        self.sync()
+        return len(revids)
+
+    def set_processed(self, revid: int, processed: bool) -> None:
+        self.conn.execute(
+            'INSERT INTO revisions (revid, processed) VALUES (?, ?) '
+            'ON CONFLICT (revid) DO UPDATE SET processed = excluded.processed',
+            (revid, int(processed)))
+
+    def is_processed(self, revid: int) -> bool:
+        row = self.conn.execute('SELECT processed FROM revisions WHERE revid = ?', (revid,)).fetchone()
+        return bool(row and row[0])
+
+    def processed_revids(self, year: int, page_title: str, after_revid: int = 0) -> list[int]:
+        """Return the processed revids of a page and year newer than after_revid, in revid order."""
+        return [revid for (revid,) in self.conn.execute(
+            'SELECT revid FROM revisions WHERE processed = 1 AND year = ? AND page_title = ? AND revid > ? '
+            'ORDER BY revid', (year, page_title, after_revid))]
+
+    def get_high_water_mark(self, year: int, page_title: str, bot_username: str) -> tuple[int, str] | None:
+        """Return (revid, ISO timestamp) of the last revision collected for a page and year, if any."""
+        row = self.conn.execute(
+            'SELECT revid, timestamp FROM high_water_marks WHERE year = ? AND page_title = ? AND bot_username = ?',
+            (year, page_title, bot_username)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set_high_water_mark(self, year: int, page_title: str, bot_username: str, revid: int, timestamp) -> None:
+        self.conn.execute(
+            'INSERT OR REPLACE INTO high_water_marks (year, page_title, bot_username, revid, timestamp) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (year, page_title, bot_username, revid, _timestamp_text(timestamp)))
+
+    def iter_revisions(self, year: int | None = None, page_title: str | None = None,
+                       comment_contains: str | None = None) -> Iterator[dict]:
+        """
+        Yield stored revision details in revid order.
+
+        Args:
+            year (int | None): Only yield revisions collected for this year.
+            page_title (str | None): Only yield revisions of this RfC list page.
+            comment_contains (str | None): Only yield revisions whose edit summary contains this text, ignoring case.
+        Returns:
+            Iterator[dict]: Revision details as written by save_revision.
+        """
+        query, params = self._revision_query('details', year, page_title, comment_contains)
+        for (details,) in self.conn.execute(query, params):
+            yield pickle.loads(details)
+
+    def revids(self, year: int | None = None, page_title: str | None = None,
+               comment_contains: str | None = None) -> list[int]:
+        """Return the revids iter_revisions would yield, in the same order, without loading any details."""
+        query, params = self._revision_query('revid', year, page_title, comment_contains)
+        return [revid for (revid,) in self.conn.execute(query, params)]
+
+    def _revision_query(self, column: str, year: int | None, page_title: str | None,
+                        comment_contains: str | None) -> tuple[str, list]:
+        query = f'SELECT {column} FROM revisions WHERE details IS NOT NULL'
+        params: list = []
+        if comment_contains is not None:
+            query += ' AND comment LIKE ?'
+            params.append(f'%{comment_contains}%')
+        if year is not None:
+            query += ' AND year = ?'
+            params.append(year)
+        if page_title is not None:
+            query += ' AND page_title = ?'
+            params.append(page_title)
+        query += ' ORDER BY revid'
+        return query, params
+
+    def iter_run_stats(self, year: int | None = None) -> Iterator[tuple[str, dict]]:
+        """Yield (key, stats) for completed runs, optionally limited to one year."""
+        query = "SELECT key, value FROM runs WHERE kind = 'stats'"
+        params: list = []
+        if year is not None:
+            query += ' AND year = ?'
+            params.append(year)
+        query += ' ORDER BY key'
+        for key, value in self.conn.execute(query, params):
+            yield key, pickle.loads(value)
+
+    def merge_from(self, shard_path: str) -> None:
+        """
+        Copy runs, revisions and high-water marks from another store file into this one.
+
+        Args:
+            shard_path (str): Path of a store written by a collection worker.
+        """
+        self.sync()
+        self.conn.execute('ATTACH DATABASE ? AS shard', (shard_path,))
+        try:
+            for statement in MERGE_STATEMENTS:
+                self.conn.execute(statement)
+            self.conn.commit()
+        finally:
+            self.conn.execute('DETACH DATABASE shard')
+
+    def replace_rfc_ids(self, rfc_id_dict: dict[str, dict]) -> None:
+        """Replace the rfc_ids table with the rows read from the RfC id CSV."""
+        self.conn.execute('DELETE FROM rfc_ids')
+        self.conn.executemany(
+            'INSERT INTO rfc_ids (rfc_id, rfc_page, details) VALUES (?, ?, ?)',
+            ((rfc_id, row.get('rfc_page'), pickle.dumps(row)) for rfc_id, row in rfc_id_dict.items()))
+
+    def get_rfc_ids(self) -> dict[str, dict]:
+        return {rfc_id: pickle.loads(details)
+                for rfc_id, details in self.conn.execute('SELECT rfc_id, details FROM rfc_ids')}
+
+
+def legacy_shelve_exists(shelve_path: str) -> bool:
+    """Return True if any of the files dbm creates for shelve_path exist."""
+    return bool(glob.glob(glob.escape(shelve_path) + '*'))
+
+
+def migrate_shelve(shelve_path: str, store: HistoryStore, batch_size: int = 1000) -> int:
+    """
+    Copy every record of an existing shelve file into store.
+
+    Args:
+        shelve_path (str): Path passed to shelve.open when the file was written, e.g. 'rfc.db'.
+        store (HistoryStore): Destination store.
+        batch_size (int): Number of records written per transaction.
+    Returns:
+        int: Number of records copied.
+    """
+    copied = 0
+    with shelve.open(shelve_path, flag='r') as legacy:
+        for key in legacy.keys():
+            try:
+                store[key] = legacy[key]
+            except Exception as e:
+                print(f"Error migrating {key}: {e}")
+                continue
+            copied += 1
+            if copied % batch_size == 0:
+                store.sync()
+                print(f"Migrated {copied} records from {shelve_path}")
+    store[MIGRATED_FROM_KEY] = shelve_path
+    store.sync()
+    return copied
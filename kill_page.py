@@ -1,13 +1,111 @@
+import threading
+
 import pywikibot
-from config import site, KILL_PAGE
+from config import site, KILL_PAGE, KILL_PAGE_POLL_SECONDS, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_PATH
+from page_cache import cached_page_text, open_page_cache
+
+# Set once the kill page asks the bot to stop; long loops check it through kill_requested(), with no I/O
+kill_switch = threading.Event()
+
+
+class KillSwitchEngaged(Exception):
+    """Raised by a job that stops because the kill page asked it to."""
+
+
+def kill_requested() -> bool:
+    """Return whether the kill page asked the bot to stop, as last seen by the watcher or check_kill_page."""
+    return kill_switch.is_set()
+
+def read_kill_page(page: pywikibot.Page) -> bool:
+    """Return whether the latest revision of the page asks the bot to stop."""
+    return 'kill' in cached_page_text(open_page_cache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES), page).lower()
 
 def check_kill_page():
     try:
         kill_page = pywikibot.Page(site, KILL_PAGE)
         print(f"Checking kill page: {KILL_PAGE}")
-        if kill_page.exists() and 'kill' in kill_page.text.lower():
+        # exists() loads the latest revision id, so an unchanged page is read from the cache
+        if kill_page.exists() and read_kill_page(kill_page):
             print("Kill page detected. Shutting down bot.")
+            kill_switch.set()
             return True
     except Exception as e:
         print(f"Error checking kill page: {e}")
-    return False
\ No newline at end of file
+    return False
+
+
+class KillSwitchWatcher(threading.Thread):
+    """
+    Daemon thread setting kill_switch once the kill page asks the bot to stop.
+
+    Every interval seconds it asks the API for the page's latest revision id only, which
+    needs no text. The text is read only when that id changes, from the page cache if the
+    revision was read before. check_now() makes it look at once, e.g. when the
+    recentchange stream reports an edit to the page.
+    """
+
+    def __init__(self, page_title: str = KILL_PAGE, interval: float = KILL_PAGE_POLL_SECONDS):
+        """
+        Args:
+            page_title (str): The kill page.
+            interval (float): Seconds between two revision id checks.
+        """
+        super().__init__(name='kill-switch', daemon=True)
+        self.page_title = page_title
+        self.interval = interval
+        self.last_revid: int | None = None
+        self.polls = 0
+        self.text_reads = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def check_now(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+
+    def poll(self) -> bool:
+        """Look at the latest revision id, and at the text if it changed; return whether the page asks to stop."""
+        self.polls += 1
+        # a new Page object, so the revision id is asked for again
+        page = pywikibot.Page(site, self.page_title)
+        if not page.exists():
+            self.last_revid = None
+            return False
+        if page.latest_revision_id == self.last_revid:
+            return False
+        self.last_revid = page.latest_revision_id
+        self.text_reads += 1
+        return read_kill_page(page)
+
+    def run(self) -> None:
+        print(f"Watching kill page {self.page_title} every {self.interval}s")
+        while not self._stopped.is_set():
+            try:
+                if self.poll():
+                    print(f"Kill page detected (revision {self.last_revid}). Shutting down bot.")
+                    kill_switch.set()
+                    return
+            except Exception as e:
+                print(f"Error checking kill page: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+# the watcher started by start_kill_switch_watcher, if any
+kill_switch_watcher: KillSwitchWatcher | None = None
+
+def start_kill_switch_watcher(interval: float = KILL_PAGE_POLL_SECONDS) -> KillSwitchWatcher:
+    """Start the kill page watcher of this process, once; later calls return the running one."""
+    global kill_switch_watcher
+    if kill_switch_watcher is None or not kill_switch_watcher.is_alive():
+        kill_switch_watcher = KillSwitchWatcher(interval=interval)
+        kill_switch_watcher.start()
+    return kill_switch_watcher
+
+def wake_kill_switch_watcher() -> None:
+    """Make the running watcher look at the kill page now."""
+    if kill_switch_watcher is not None:
+        kill_switch_watcher.check_now()
@@ -6,37 +6,78 @@ from threading import Thread
 
 from pywikibot import Page
 import analyze_rfcs
-from config import DRY_RUN, site, LIST_OF_RFC_PAGES, JOB_TO_RUN
+import rfc_watcher
+from config import ANALYZE_PRODUCERS, ANALYZE_WORKERS, COLLECT_WORKERS, COMPARE_CONCURRENCY, DRY_RUN, KEEP_RAW_DIFF_TABLE, PUBLISH_WORKERS, site, LIST_OF_RFC_PAGES, JOB_TO_RUN, api_cassette
 from find_rfc import get_rfc_list
-from kill_page import check_kill_page
+from kill_page import kill_requested, start_kill_switch_watcher
+from page_cache import print_page_cache_stats
 from event_handler import listen_eventstream
-from examine_history import examine_history, list_entry_details, list_run_stats
+from history_store import COMMENT_KEYWORDS
+from examine_history import compact_history, examine_history, list_entry_details, list_rfc_revisions, list_run_stats
 #from examine_history import examine_history
 #from notification_processor import process_pending_notifications
 
 SENTINEL = None
 
-valid_jobs = ['analyze_rfcs', 'collect_rfc_history', 'publish_history']
+valid_jobs = ['analyze_rfcs', 'collect_rfc_history', 'publish_history', 'compact_history', 'rfc_revisions', 'watch_rfcs']
 
 def main():
 
     parser = argparse.ArgumentParser(description='Run the RFC Bot with specified job.')
     parser.add_argument('-j', '--job', type=str, choices=valid_jobs, default=JOB_TO_RUN,
-                        help='The job to run. Options: analyze_rfcs, collect_rfc_history, publish_history, list_run_stats')
+                        help='The job to run. Options: analyze_rfcs, collect_rfc_history, publish_history, compact_history, rfc_revisions, watch_rfcs')
+    parser.add_argument('-c', '--concurrency', type=int, default=COMPARE_CONCURRENCY,
+                        help='Number of diff requests kept in flight by collect_rfc_history')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Make collect_rfc_history rescan whole years, ignoring high-water marks and processed flags')
+    parser.add_argument('--keep-raw-diff', action='store_true', default=KEEP_RAW_DIFF_TABLE,
+                        help='Make collect_rfc_history also store the raw HTML diff table of each revision')
+    parser.add_argument('--rfc-id', type=str,
+                        help='The RfC id to look up with the rfc_revisions job, e.g. 76C58B0')
+    parser.add_argument('--comment-kw', type=str, choices=COMMENT_KEYWORDS,
+                        help='Only list revisions whose edit summary has this keyword (rfc_revisions job)')
+    parser.add_argument('-w', '--workers', type=int,
+                        help='Number of workers; collect_rfc_history runs each (year, page) shard in its own worker process, '
+                             'publish_history builds the records of removed RfCs in worker processes, '
+                             'analyze_rfcs counts signatures in worker tasks '
+                             f'(defaults: {COLLECT_WORKERS} for collect_rfc_history, {PUBLISH_WORKERS} for publish_history, '
+                             f'{ANALYZE_WORKERS} for analyze_rfcs)')
+    parser.add_argument('--producers', type=int, default=ANALYZE_PRODUCERS,
+                        help='Number of tasks reading RfC sections in analyze_rfcs')
     args = parser.parse_args()
+    if args.job == 'rfc_revisions' and not args.rfc_id:
+        parser.error('the rfc_revisions job needs --rfc-id')
+
+    # polls the kill page in the background; the jobs check kill_requested() between steps
+    start_kill_switch_watcher()
 
     # get_rfc_list()
     
     if args.job == 'analyze_rfcs':
-        asyncio.run(analyze_rfcs.analyze_rfcs())
+        asyncio.run(analyze_rfcs.analyze_rfcs(workers=args.workers or ANALYZE_WORKERS, producers=args.producers))
+
+    if args.job == 'watch_rfcs':
+        try:
+            asyncio.run(rfc_watcher.watch_rfcs())
+        except KeyboardInterrupt:
+            print("Stopped watching RfCs")
 
     if args.job == 'collect_rfc_history':
-        examine_history()
+        examine_history(concurrency=args.concurrency, resume=not args.no_resume, workers=args.workers or COLLECT_WORKERS, keep_raw_diff=args.keep_raw_diff)
+
+    if args.job == 'compact_history':
+        compact_history()
+
+    if args.job == 'rfc_revisions':
+        list_rfc_revisions(args.rfc_id, args.comment_kw)
 
     if args.job == 'publish_history':
         #list_run_stats() # optional step to list the stats of all runs before publishing details
-        list_entry_details()
-        
+        list_entry_details(workers=args.workers or PUBLISH_WORKERS)
+
+    print_page_cache_stats()
+    if api_cassette is not None:
+        api_cassette.print_stats()
 
     # exit for now
     return
@@ -49,8 +90,8 @@ def main():
     listen_eventstream()
 
     while True and cycle_count < 1:
-        if check_kill_page():
-            pass
+        if kill_requested():
+            break
         else:
             print("Bot is running...")
             #listen_eventstream()
@@ -0,0 +1,79 @@
+import os
+from typing import TextIO
+
+# suffix of the temporary file each output is written to until the run completes
+PARTIAL_SUFFIX = '.partial'
+
+
+class OutputWriters:
+    """
+    Long-lived, buffered output files for one publish run.
+
+    Each path gets a single handle that stays open for the whole run and writes to
+    '<path>.partial'. commit() renames every partial file over its final path, so a
+    year file only ever appears once it is complete; abort() removes the partial
+    files and leaves any previous outputs untouched.
+    """
+
+    def __init__(self, buffering: int = 1024 * 1024, encoding: str = 'utf-8'):
+        self.buffering = buffering
+        self.encoding = encoding
+        self.handles: dict[str, TextIO] = {}
+
+    def open(self, path: str) -> TextIO:
+        """
+        Return the open handle for path, creating its partial file on first use.
+
+        Args:
+            path (str): Final path of the output file.
+        Returns:
+            TextIO: Buffered handle writing to the partial file.
+        """
+        handle = self.handles.get(path)
+        if handle is None:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handle = open(path + PARTIAL_SUFFIX, 'w', encoding=self.encoding, buffering=self.buffering)
+            self.handles[path] = handle
+        return handle
+
+    def paths(self) -> list[str]:
+        """Return the final paths written so far."""
+        return list(self.handles)
+
+    def commit(self) -> list[str]:
+        """
+        Flush and close every handle, then atomically move each partial file into place.
+
+        Returns:
+            list[str]: The final paths that were written.
+        """
+        committed = []
+        for path, handle in self.handles.items():
+            handle.flush()
+            os.fsync(handle.fileno())
+            handle.close()
+            os.replace(path + PARTIAL_SUFFIX, path)
+            committed.append(path)
+        self.handles.clear()
+        return committed
+
+    def abort(self) -> None:
+        """Close every handle and remove the partial files."""
+        for path, handle in self.handles.items():
+            handle.close()
+            try:
+                os.remove(path + PARTIAL_SUFFIX)
+            except FileNotFoundError:
+                pass
+        self.handles.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
@@ -0,0 +1,196 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterable
+
+from pywikibot import Page
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE INDEX IF NOT EXISTS entries_hash ON entries (hash);
+"""
+
+# caches opened by open_page_cache, one per path and process
+_open_caches: dict[tuple[str, int], 'PageCache'] = {}
+_open_lock = threading.Lock()
+
+
+class PageCache:
+    """
+    Page texts and diff tables fetched from the wiki, kept in SQLite between runs.
+
+    Entries are keyed by revision, see text_key and diff_key. A revision never changes,
+    so an entry never goes stale. Values are stored zlib compressed under the sha1 of
+    their text, so identical texts are stored once. Once the compressed values take more
+    than max_bytes, the least recently used entries are evicted.
+
+    One connection is shared by all threads of a process, behind a lock.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        self.total_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            return self.conn.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is not None
+
+    def get(self, key: str) -> str | None:
+        """Return the value stored under key, or None, and count the hit or miss."""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT blobs.data FROM entries JOIN blobs ON blobs.hash = entries.hash WHERE entries.key = ?',
+                (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.conn.commit()
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def put(self, key: str, value: str) -> None:
+        """Store value under key, evicting the least recently used entries if the cache is full."""
+        raw = value.encode('utf-8')
+        digest = hashlib.sha1(raw).hexdigest()
+        with self.lock:
+            if self.conn.execute('SELECT 1 FROM blobs WHERE hash = ?', (digest,)).fetchone() is None:
+                data = zlib.compress(raw)
+                self.conn.execute('INSERT INTO blobs (hash, size, data) VALUES (?, ?, ?)', (digest, len(data), data))
+                self.total_bytes += len(data)
+            old = self.conn.execute('SELECT hash FROM entries WHERE key = ?', (key,)).fetchone()
+            self.conn.execute('INSERT OR REPLACE INTO entries (key, hash, last_used) VALUES (?, ?, ?)',
+                              (key, digest, time.time()))
+            if old is not None and old[0] != digest:
+                self._drop_unused_blob(old[0])
+            self._evict()
+            self.conn.commit()
+
+    def _drop_unused_blob(self, digest: str) -> None:
+        if self.conn.execute('SELECT 1 FROM entries WHERE hash = ? LIMIT 1', (digest,)).fetchone() is None:
+            row = self.conn.execute('SELECT size FROM blobs WHERE hash = ?', (digest,)).fetchone()
+            if row is not None:
+                self.conn.execute('DELETE FROM blobs WHERE hash = ?', (digest,))
+                self.total_bytes -= row[0]
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes:
+            row = self.conn.execute('SELECT key, hash FROM entries ORDER BY last_used LIMIT 1').fetchone()
+            if row is None:
+                break
+            self.conn.execute('DELETE FROM entries WHERE key = ?', (row[0],))
+            self._drop_unused_blob(row[1])
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return the hit, miss and eviction counts of this run and the size of the cache."""
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': entries, 'bytes': self.total_bytes}
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+
+
+def open_page_cache(path: str, max_bytes: int) -> PageCache:
+    """
+    Return the cache stored at path, opening it on first use in this process.
+
+    Worker processes forked after the cache was opened get their own connection.
+    """
+    key = (path, os.getpid())
+    with _open_lock:
+        cache = _open_caches.get(key)
+        if cache is None:
+            cache = _open_caches[key] = PageCache(path, max_bytes)
+        return cache
+
+
+def print_page_cache_stats() -> None:
+    """Print the counters of every cache this process opened."""
+    for (path, pid), cache in _open_caches.items():
+        if pid == os.getpid():
+            stats = cache.stats()
+            print(f"Page cache {path}: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+                  f"{stats['entries']} entries in {stats['bytes'] / 1024 / 1024:.1f} MiB")
+
+
+def text_key(site, title: str, revid: int) -> str:
+    """Key of the wikitext of one revision of a page."""
+    return f"text|{site}|{title}|{revid}"
+
+
+def diff_key(site, parentid: int, revid: int) -> str:
+    """Key of the site.compare diff table between a revision and its parent."""
+    return f"diff|{site}|{parentid}|{revid}"
+
+
+def cached_page_text(cache: PageCache, page: Page) -> str:
+    """
+    Return the text of the latest revision of an existing page, fetching it only if it is not cached.
+
+    The latest revision id comes from the page info, which preloadpages and exists() already load.
+    The page may have been edited since, so a text that has to be fetched is cached under the
+    id of the revision it was read from, never under the older id.
+    """
+    text = cache.get(text_key(page.site, page.title(), page.latest_revision_id))
+    if text is None:
+        revision = page.latest_revision
+        text = revision.text or ""
+        cache.put(text_key(page.site, page.title(), revision.revid), text)
+    return text
+
+
+def preload_uncached_texts(cache: PageCache, site, pages: Iterable[Page], groupsize: int = 50) -> None:
+    """
+    Load the text of the pages whose latest revision is not cached, groupsize titles per query.
+
+    The pages must already have their page info loaded, e.g. by preloadpages(..., content=False).
+    The texts are cached, and counted as misses, when cached_page_text reads them.
+    """
+    missing = [page for page in pages
+               if page.exists() and text_key(site, page.title(), page.latest_revision_id) not in cache]
+    list(site.preloadpages(missing, groupsize=groupsize))
+
+
+def cached_compare(cache: PageCache, site, parentid: int, revid: int) -> str:
+    """Return site.compare(parentid, revid, 'table'), asking the wiki only the first time."""
+    key = diff_key(site, parentid, revid)
+    diff_table = cache.get(key)
+    if diff_table is None:
+        diff_table = site.compare(parentid, revid, 'table')
+        cache.put(key, diff_table)
+    return diff_table
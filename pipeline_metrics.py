@@ -0,0 +1,197 @@
+import asyncio
+import json
+import threading
+import time
+from typing import Any, Callable
+
+# Upper bounds in seconds of the latency histogram buckets; the last bucket is everything slower
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class LatencyHistogram:
+    """Count, total, maximum and bucketed distribution of a series of durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for number, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[number] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, fraction: float) -> float:
+        """Return the upper bound of the bucket holding the given fraction of the durations (max for the last one)."""
+        if self.count == 0:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for number, count in enumerate(self.buckets):
+            seen += count
+            if seen >= wanted and count:
+                return LATENCY_BUCKETS[number] if number < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def as_dict(self) -> dict:
+        labels = [f"<={bound}" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+        return {
+            'count': self.count,
+            'total_seconds': round(self.total, 4),
+            'mean_seconds': round(self.total / self.count, 4) if self.count else 0.0,
+            'p50_seconds': self.quantile(0.5),
+            'p95_seconds': self.quantile(0.95),
+            'max_seconds': round(self.max, 4),
+            'histogram': {label: count for label, count in zip(labels, self.buckets) if count},
+        }
+
+
+class StageMetrics:
+    """Service times and throughput of one stage of the pipeline."""
+
+    def __init__(self):
+        self.service = LatencyHistogram()
+        self.errors = 0
+        self.first_started: float | None = None
+        self.last_finished: float | None = None
+
+    def record(self, started: float, finished: float) -> None:
+        self.service.record(finished - started)
+        if self.first_started is None or started < self.first_started:
+            self.first_started = started
+        if self.last_finished is None or finished > self.last_finished:
+            self.last_finished = finished
+
+    def as_dict(self) -> dict:
+        active = (self.last_finished - self.first_started) if self.first_started is not None else 0.0
+        return {
+            'items': self.service.count,
+            'errors': self.errors,
+            'items_per_second': round(self.service.count / active, 3) if active > 0 else 0.0,
+            'service': self.service.as_dict(),
+        }
+
+
+class QueueMetrics:
+    """Time items wait in a bounded queue, and time producers spend blocked on it being full."""
+
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self.wait = LatencyHistogram()
+        self.blocked = LatencyHistogram()
+        self.max_depth = 0
+
+    def as_dict(self) -> dict:
+        return {
+            'maxsize': self.maxsize,
+            'max_depth': self.max_depth,
+            'wait': self.wait.as_dict(),
+            'producer_blocked_seconds': round(self.blocked.total, 4),
+            'puts_blocked_over_1ms': self.blocked.count - self.blocked.buckets[0],
+        }
+
+
+class PipelineMetrics:
+    """
+    Per-stage and per-queue instrumentation of an asyncio pipeline.
+
+    Stages are timed where the work runs, including on executor threads, so the
+    service times do not include time spent waiting for a free thread. All
+    recording goes through one lock.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.lock = threading.Lock()
+        self.stages: dict[str, StageMetrics] = {}
+        self.queues: dict[str, QueueMetrics] = {}
+
+    def stage(self, name: str) -> StageMetrics:
+        with self.lock:
+            return self.stages.setdefault(name, StageMetrics())
+
+    def queue(self, name: str, maxsize: int = 0) -> QueueMetrics:
+        with self.lock:
+            return self.queues.setdefault(name, QueueMetrics(maxsize))
+
+    def timed(self, stage_name: str, function: Callable, *args) -> Any:
+        """Call function(*args) and record its duration, or an error, under stage_name."""
+        stage = self.stage(stage_name)
+        started = self.clock()
+        try:
+            return function(*args)
+        except Exception:
+            with self.lock:
+                stage.errors += 1
+            raise
+        finally:
+            finished = self.clock()
+            with self.lock:
+                stage.record(started, finished)
+
+    def summary(self) -> dict:
+        """Return every stage and queue as a JSON-serializable dict."""
+        with self.lock:
+            return {
+                'elapsed_seconds': round(self.clock() - self.started, 3),
+                'stages': {name: stage.as_dict() for name, stage in self.stages.items()},
+                'queues': {name: queue.as_dict() for name, queue in self.queues.items()},
+            }
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.summary(), **kwargs)
+
+
+class MeteredQueue:
+    """
+    An asyncio.Queue that records how long each item waits in it and how long put blocks.
+
+    Items are stored with the time they entered the queue. The underlying queue is kept in
+    .queue for qsize() and task_done().
+    """
+
+    def __init__(self, name: str, maxsize: int = 0, metrics: PipelineMetrics | None = None):
+        self.name = name
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.metrics = metrics or PipelineMetrics()
+        self.queue_metrics = self.metrics.queue(name, maxsize)
+
+    async def put(self, item) -> None:
+        clock = self.metrics.clock
+        started = clock()
+        entry = [started, item]
+        await self.queue.put(entry)
+        # put returns as soon as the entry is in the queue, before any getter can run
+        entry[0] = clock()
+        with self.metrics.lock:
+            self.queue_metrics.blocked.record(entry[0] - started)
+            self.queue_metrics.max_depth = max(self.queue_metrics.max_depth, self.queue.qsize())
+
+    def _unwrap(self, entry):
+        queued, item = entry
+        with self.metrics.lock:
+            self.queue_metrics.wait.record(self.metrics.clock() - queued)
+        return item
+
+    async def get(self):
+        return self._unwrap(await self.queue.get())
+
+    def get_nowait(self):
+        return self._unwrap(self.queue.get_nowait())
+
+
+async def stream_metrics(metrics: PipelineMetrics, interval: float, queues: list[MeteredQueue] = ()) -> None:
+    """Print a one-line JSON snapshot of the metrics, with the current queue sizes, every interval seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        snapshot = metrics.summary()
+        for queue in queues:
+            snapshot['queues'].setdefault(queue.name, {})['size'] = queue.queue.qsize()
+        print(f"[Metrics] {json.dumps(snapshot)}")
@@ -0,0 +1,113 @@
+from itertools import groupby
+from typing import Callable, Iterable, NamedTuple
+
+from history_store import comment_keywords_of
+
+
+class TimelineEntry(NamedTuple):
+    """One revision affecting an RfC."""
+    timestamp: str
+    revid: int
+    shortcut: str
+    keywords: str
+    page_title: str
+
+    def diff_template(self) -> str | None:
+        """Return the {{Diff}} template linking to this revision, as written to the year files."""
+        if not (self.page_title and self.revid):
+            return None
+        label = f"{self.shortcut} {self.revid}"
+        return "{{" + f"Diff|{self.page_title}|prev|{self.revid}|{label}" + "}}"
+
+
+class RfcTimeline:
+    """
+    The revisions affecting one RfC, oldest first.
+
+    The first and last revision of each list page (by shortcut) are worked out once
+    when the timeline is built, so rendering an RfC entry is a walk over first_and_last.
+    """
+
+    __slots__ = ('entries', 'first', 'last', 'first_and_last')
+
+    def __init__(self, entries: tuple[TimelineEntry, ...]):
+        """
+        Args:
+            entries (tuple[TimelineEntry, ...]): The revisions, already ordered by timestamp.
+        """
+        self.entries = entries
+        self.first: dict[str, TimelineEntry] = {}
+        self.last: dict[str, TimelineEntry] = {}
+        for entry in entries:
+            self.first.setdefault(entry.shortcut, entry)
+            self.last[entry.shortcut] = entry
+        ends = {entry.revid for entry in self.first.values()} | {entry.revid for entry in self.last.values()}
+        self.first_and_last = tuple(entry for entry in entries if entry.revid in ends)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def diff_templates(self) -> list[str | None]:
+        """Return the {{Diff}} templates of the first and last revision of each list page, oldest first."""
+        return [entry.diff_template() for entry in self.first_and_last]
+
+
+EMPTY_TIMELINE = RfcTimeline(())
+
+
+def timeline_entry(row: dict, shortcut_of: Callable[[str], str]) -> TimelineEntry:
+    """Make a TimelineEntry from an index row or stored revision details."""
+    page_title = row.get('page_title')
+    keywords = row.get('comment_kw')
+    if keywords is None:
+        keywords = comment_keywords_of(row.get('comment', ''))
+    return TimelineEntry(row.get('timestamp'), row.get('revid'), shortcut_of(page_title), keywords, page_title)
+
+
+def timeline_from_rows(rows: Iterable[dict], shortcut_of: Callable[[str], str]) -> RfcTimeline:
+    """
+    Build a timeline from rows already ordered by timestamp, e.g. HistoryStore.revisions_for_rfc.
+
+    Args:
+        rows (Iterable[dict]): Rows with revid, timestamp and page_title, oldest first.
+        shortcut_of (Callable[[str], str]): Maps a list page title to its shortcut.
+    Returns:
+        RfcTimeline: The timeline of the rows.
+    """
+    return RfcTimeline(tuple(timeline_entry(row, shortcut_of) for row in rows))
+
+
+def sorted_timeline(rows: Iterable[dict], shortcut_of: Callable[[str], str]) -> RfcTimeline:
+    """Build a timeline from rows in any order, sorting them once by timestamp."""
+    entries = [timeline_entry(row, shortcut_of) for row in rows]
+    entries.sort(key=lambda entry: entry.timestamp)
+    return RfcTimeline(tuple(entries))
+
+
+def build_timelines(index_rows: Iterable[tuple], shortcut_of: Callable[[str], str],
+                    rfc_ids: Iterable[str] | None = None) -> dict[str, RfcTimeline]:
+    """
+    Build the timelines of many RfCs in one pass over the rfc_id index.
+
+    Args:
+        index_rows (Iterable[tuple]): (rfc_id, revid, timestamp, page_title, comment_kw) rows
+            ordered by rfc_id, then timestamp, see HistoryStore.iter_rfc_index.
+        shortcut_of (Callable[[str], str]): Maps a list page title to its shortcut.
+        rfc_ids (Iterable[str] | None): Only keep the timelines of these RfCs.
+    Returns:
+        dict[str, RfcTimeline]: Timelines keyed by RfC id.
+    """
+    wanted = set(rfc_ids) if rfc_ids is not None else None
+    shortcuts: dict[str, str] = {}
+    timelines = {}
+    for rfc_id, rows in groupby(index_rows, key=lambda row: row[0]):
+        if wanted is not None and rfc_id not in wanted:
+            continue
+        entries = []
+        for _, revid, timestamp, page_title, comment_kw in rows:
+            shortcut = shortcuts.get(page_title)
+            if shortcut is None:
+                shortcut = shortcuts[page_title] = shortcut_of(page_title)
+            entries.append(TimelineEntry(timestamp, revid, shortcut, comment_kw, page_title))
+        timelines[rfc_id] = RfcTimeline(tuple(entries))
+    return timelines
@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable
+
+from pywikibot import Link, Page
+
+from analyze_rfcs import report_order
+from calculate_statistics import calculate_statistics
+from config import (ANALYZE_API_THREADS, DRY_RUN, EVENT_BATCH_SECONDS, EVENT_BATCH_SIZE, EVENT_QUEUE_BATCHES,
+                    EVENT_STREAM_MAX_BACKOFF, EVENT_STREAM_URL, KILL_PAGE, RAW_PAGES_LIST, RESULT_PAGE_TITLE, RFC_WATCH_DEBOUNCE,
+                    STATISTICS_ENGINE, USER_AGENT, site)
+from event_filter import EventFilter, EventRule
+from kill_page import kill_requested, start_kill_switch_watcher, wake_kill_switch_watcher
+from find_rfc import RfcStats, fetch_page_text, find_rfc_section, iter_linked_rfc_pages, rfc_id_from_link
+from sse_client import EventStreamClient, SseEvent, process_event_batches
+from stats_publisher import draft_report, publish_report
+from timezone_utils import now_utc
+
+
+def list_page_titles(raw_pages: list[str] = RAW_PAGES_LIST) -> list[str]:
+    """Return the titles of the RfC list pages, e.g. 'Wikipedia:Requests for comment/Biographies'."""
+    return [f"Wikipedia:{raw_page.replace('_', ' ')}" for raw_page in raw_pages]
+
+def list_open_rfcs(list_title: str) -> list[tuple[str, str, Link]]:
+    """Return (page title, rfc_id, link) for every RfC linked from the list page, with redirects resolved."""
+    rfcs = []
+    for batch in iter_linked_rfc_pages(Page(site, list_title)):
+        for rfc_page, link in batch:
+            rfc_id = rfc_id_from_link(link)
+            if rfc_id:
+                rfcs.append((rfc_page.title(), rfc_id, link))
+    return rfcs
+
+def section_digest(section) -> str:
+    return hashlib.sha1(str(section).encode('utf-8')).hexdigest()
+
+def count_changed_sections(page_title: str,
+                           digests: dict[str, str | None]) -> dict[str, tuple[str | None, dict | None]]:
+    """
+    Recount the signatures of the RfCs whose section differs in the page's latest revision.
+
+    Args:
+        page_title (str): Page hosting the RfCs.
+        digests (dict[str, str | None]): Digest of each RfC's section when it was last counted, None if never.
+    Returns:
+        dict[str, tuple[str | None, dict | None]]: (digest, user counts) of each RfC whose section changed,
+            and (None, None) for each RfC with no section on the page.
+    """
+    # a new Page object, so the latest revision id is looked up again
+    page = Page(site, page_title)
+    text = fetch_page_text(page)
+    changed = {}
+    for rfc_id, digest in digests.items():
+        section = find_rfc_section(page, text, rfc_id)
+        if section is None:
+            changed[rfc_id] = (None, None)
+            continue
+        new_digest = section_digest(section)
+        if new_digest != digest:
+            changed[rfc_id] = (new_digest, calculate_statistics(section, STATISTICS_ENGINE))
+    return changed
+
+
+class RfcWatcher:
+    """
+    Keep the signature counts of the open RfCs current from the recentchange stream.
+
+    An edit to a list page re-reads the RfCs it links to; an edit to a page hosting open
+    RfCs recounts those whose section changed, and only those. Edits that arrive while a
+    round of updates runs are handled together in the next round, so a busy page is read
+    once per round. A changed report is published debounce seconds after its first
+    change, with every change made meanwhile, so the page is edited at most once per interval.
+
+    State is only touched on the event loop; the page reads and counts run on the executor.
+    """
+
+    def __init__(self, list_titles: list[str], executor: Executor | None = None,
+                 debounce: float = RFC_WATCH_DEBOUNCE, page_title: str = RESULT_PAGE_TITLE,
+                 list_open_rfcs: Callable[[str], list[tuple[str, str, Link]]] = list_open_rfcs,
+                 count_changed_sections: Callable[[str, dict[str, str | None]], dict] = count_changed_sections,
+                 publish_report: Callable[[str, str], None] = publish_report):
+        """
+        Args:
+            list_titles (list[str]): The RfC list pages, see list_page_titles.
+            executor (Executor | None): Pool running the blocking pywikibot calls.
+            debounce (float): Seconds a report change waits for more changes before it is published.
+            page_title (str): Page the report is published to.
+            list_open_rfcs (Callable): Reads a list page, see list_open_rfcs.
+            count_changed_sections (Callable): Recounts the changed sections of a page, see count_changed_sections.
+            publish_report (Callable): Saves the report to a page, see stats_publisher.publish_report.
+        """
+        self.list_titles = list(list_titles)
+        self.executor = executor
+        self.debounce = debounce
+        self.page_title = page_title
+        self.list_open_rfcs = list_open_rfcs
+        self.count_changed_sections = count_changed_sections
+        self.publish_report = publish_report
+        # (page title, rfc_id, link) of the RfCs linked from each list page
+        self.listed: dict[str, list[tuple[str, str, Link]]] = {}
+        # link of each open RfC, by hosting page title and rfc_id
+        self.hosted: dict[str, dict[str, Link]] = {}
+        # (section digest, stats) of each counted RfC; both None while its section was not found
+        self.counted: dict[tuple[str, str], tuple[str | None, RfcStats | None]] = {}
+        # titles the event filter lets through, updated in place as RfCs open and close; edits to
+        # the kill page make the kill switch watcher look at it at once
+        self.titles: set[str] = set(self.list_titles) | {KILL_PAGE}
+        self.event_filter = EventFilter([EventRule('rfc-pages', fields={'wiki': 'enwiki', 'type': 'edit'},
+                                                   titles=self.titles)])
+        self.pending: set[str] = set()
+        self.pending_changed = asyncio.Event()
+        self.report_changed = asyncio.Event()
+        self.published: str | None = None
+        self.relists = 0
+        self.refreshes = 0
+        self.recounts = 0
+        self.publishes = 0
+
+    async def scan(self) -> None:
+        """Read every list page and count every open RfC, as analyze_rfcs would."""
+        await self.update(set(self.list_titles))
+
+    async def update(self, titles: set[str]) -> None:
+        """Re-read the edited list pages, then recount the edited pages and those with RfCs not counted yet."""
+        await asyncio.gather(*(self.relist(title) for title in titles if title in self.list_titles))
+        uncounted = {page_title for page_title, rfc_ids in self.hosted.items()
+                     if any((page_title, rfc_id) not in self.counted for rfc_id in rfc_ids)}
+        await asyncio.gather(*(self.refresh_page(page_title) for page_title in (titles & self.hosted.keys()) | uncounted))
+
+    async def relist(self, list_title: str) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            self.listed[list_title] = await loop.run_in_executor(self.executor, self.list_open_rfcs, list_title)
+        except Exception as e:
+            print(f"Error reading RfC list {list_title}: {e}")
+            return
+        self.relists += 1
+        hosted: dict[str, dict[str, Link]] = {}
+        # an RfC listed under several topics is counted once
+        for rfcs in self.listed.values():
+            for page_title, rfc_id, link in rfcs:
+                hosted.setdefault(page_title, {}).setdefault(rfc_id, link)
+        self.hosted = hosted
+        closed = [key for key in self.counted if key[1] not in hosted.get(key[0], {})]
+        for key in closed:
+            print(f"RfC {key[1]} on {key[0]} is no longer listed")
+            del self.counted[key]
+        if closed:
+            self.report_changed.set()
+        titles = set(self.list_titles) | {KILL_PAGE} | hosted.keys()
+        self.titles.intersection_update(titles)
+        self.titles.update(titles)
+
+    async def refresh_page(self, page_title: str) -> None:
+        loop = asyncio.get_running_loop()
+        digests = {rfc_id: self.counted.get((page_title, rfc_id), (None, None))[0]
+                   for rfc_id in self.hosted.get(page_title, {})}
+        try:
+            changed = await loop.run_in_executor(self.executor, self.count_changed_sections, page_title, digests)
+        except Exception as e:
+            print(f"Error reading {page_title}: {e}")
+            return
+        self.refreshes += 1
+        for rfc_id, (digest, user_counts) in changed.items():
+            link = self.hosted.get(page_title, {}).get(rfc_id)
+            if link is None:
+                # closed while the page was read
+                continue
+            if user_counts is None:
+                # keep the last counts of a section that went away; the list page drops the RfC soon
+                print(f"      No matching section found for RFC ID: {rfc_id} on {page_title}")
+                self.counted.setdefault((page_title, rfc_id), (None, None))
+                continue
+            stats = RfcStats()
+            stats.link = link
+            stats.user_counts = user_counts
+            self.counted[(page_title, rfc_id)] = (digest, stats)
+            self.recounts += 1
+            self.report_changed.set()
+            print(f"Recounted RfC {rfc_id} on {page_title}: {len(user_counts)} users")
+
+    async def handle_event(self, event: SseEvent) -> None:
+        """Queue the page of an edit to a watched page for the next round of updates."""
+        decoded = self.event_filter.decode(event.data)
+        if decoded is None:
+            return
+        data, rule = decoded
+        if data['title'] == KILL_PAGE:
+            wake_kill_switch_watcher()
+            return
+        self.pending.add(data['title'])
+        self.pending_changed.set()
+
+    async def apply_edits(self, stop: asyncio.Event) -> None:
+        """Run a round of updates for the pages edited since the last one, until stop is set."""
+        while not stop.is_set():
+            await wait_for_either(self.pending_changed, stop)
+            self.pending_changed.clear()
+            titles, self.pending = self.pending, set()
+            if titles:
+                await self.update(titles)
+
+    def draft(self) -> str:
+        results = [(stats, rfc_id, stats.link) for (page_title, rfc_id), (digest, stats) in self.counted.items()
+                   if stats is not None]
+        results.sort(key=report_order)
+        return draft_report(results)
+
+    async def publish(self) -> None:
+        """Publish the report, unless it is the one published last."""
+        content = self.draft()
+        if content == self.published:
+            print("RfC report unchanged, not publishing")
+            return
+        if DRY_RUN:
+            print(f"Dry run, not publishing the RfC report ({len(self.counted)} RfCs)")
+        else:
+            try:
+                await asyncio.get_running_loop().run_in_executor(self.executor, self.publish_report, content,
+                                                                 self.page_title)
+            except Exception as e:
+                print(f"Error publishing {self.page_title}: {e}")
+                return
+        self.published = content
+        self.publishes += 1
+
+    async def publish_changes(self, stop: asyncio.Event) -> None:
+        """Publish the report debounce seconds after it changes, until stop is set, then once more if it changed."""
+        while not stop.is_set():
+            await wait_for_either(self.report_changed, stop)
+            if stop.is_set():
+                break
+            # changes made meanwhile go into the same edit
+            try:
+                await asyncio.wait_for(stop.wait(), self.debounce)
+            except asyncio.TimeoutError:
+                pass
+            self.report_changed.clear()
+            await self.publish()
+        if self.report_changed.is_set():
+            self.report_changed.clear()
+            await self.publish()
+
+    def stats(self) -> dict:
+        return {'open_rfcs': len(self.counted), 'watched_titles': len(self.titles), 'relists': self.relists,
+                'page_refreshes': self.refreshes, 'recounts': self.recounts, 'publishes': self.publishes,
+                'events': self.event_filter.stats()}
+
+
+async def stop_on_kill(stop: asyncio.Event, interval: float = 1.0) -> None:
+    """Set stop once the kill switch is set; checks the flag only, with no I/O."""
+    while not stop.is_set():
+        if kill_requested():
+            print("Kill switch set, stopping the RfC watcher")
+            stop.set()
+            return
+        await asyncio.sleep(interval)
+
+async def wait_for_either(event: asyncio.Event, stop: asyncio.Event) -> None:
+    waiters = [asyncio.create_task(event.wait()), asyncio.create_task(stop.wait())]
+    try:
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for waiter in waiters:
+            waiter.cancel()
+
+async def watch_rfcs(stop: asyncio.Event | None = None, debounce: float = RFC_WATCH_DEBOUNCE,
+                     api_threads: int = ANALYZE_API_THREADS) -> RfcWatcher:
+    """
+    Keep User:DwAlphaBot/RfcEditStats current from the recentchange stream until stop is set.
+
+    Starts with a full scan of the list pages, like analyze_rfcs, and publishes the report.
+    Then the stream is read from when the scan started, so edits made during the scan are
+    not missed, and only the edited list pages and RfC sections are read again.
+
+    Args:
+        stop (asyncio.Event | None): Set to stop watching; runs until interrupted if None.
+        debounce (float): Seconds a report change waits for more changes before it is published.
+        api_threads (int): Threads running blocking calls.
+    Returns:
+        RfcWatcher: The watcher, with its final counts.
+    """
+    stop = stop or asyncio.Event()
+    start_kill_switch_watcher()
+    since = now_utc().strftime('%Y-%m-%dT%H:%M:%SZ')
+    with ThreadPoolExecutor(max_workers=max(1, api_threads), thread_name_prefix='api') as executor:
+        watcher = RfcWatcher(list_page_titles(), executor, debounce)
+        await watcher.scan()
+        print(f"Watching {len(watcher.counted)} open RfCs on {len(watcher.hosted)} pages")
+        await watcher.publish()
+
+        queue: asyncio.Queue = asyncio.Queue(EVENT_QUEUE_BATCHES)
+        client = EventStreamClient(f"{EVENT_STREAM_URL}?since={since}", queue, headers={'User-Agent': USER_AGENT},
+                                   batch_size=EVENT_BATCH_SIZE, batch_seconds=EVENT_BATCH_SECONDS,
+                                   max_backoff=EVENT_STREAM_MAX_BACKOFF, data_filter=watcher.event_filter.accepts_raw)
+        consumer = asyncio.create_task(process_event_batches(queue, watcher.handle_event))
+        tasks = [asyncio.create_task(watcher.apply_edits(stop)), asyncio.create_task(watcher.publish_changes(stop)),
+                 asyncio.create_task(stop_on_kill(stop))]
+        try:
+            await client.run(stop)
+        finally:
+            stop.set()
+            await queue.put(None)
+            await consumer
+            await asyncio.gather(*tasks)
+            print(f"RfC watcher: {watcher.stats()}")
+    return watcher
@@ -0,0 +1,178 @@
+import re
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+
+import mwparserfromhell
+from mwparserfromhell.nodes import Heading
+from mwparserfromhell.wikicode import Wikicode
+
+from signature_scanner import iter_headings, section_spans
+
+# RfC ids as written in {{rfc|...|rfcid=...}} and in the rfc_<id> anchors that link to them
+RFC_MARKER_RE = re.compile(r'(?:rfcid\s*=\s*|rfc_)([0-9a-z]+)')
+# Headings found when mwparserfromhell cannot parse a page
+FALLBACK_HEADING_RE = re.compile(r"(?m)^(={2,})\s*(.+?)\s*\1\s*$")
+
+
+class SectionIndex:
+    """
+    The sections of one page revision, with the section of each RfC id worked out once.
+
+    Sections are those of get_sections(include_lead=False): from a heading to the next
+    heading of the same or a higher level. The section of an id is the first one whose
+    lowercased text contains it, as the linear scan over get_sections found it. That is
+    the outermost section around the first mention of the id, so a lookup is a find on
+    the lowercased page and a bisect over the outermost sections.
+    """
+
+    __slots__ = ('text', 'spans', 'wikicode', 'node_at', 'rfc_sections', 'lowered', 'outer', 'outer_starts')
+
+    def __init__(self, text: str, headings: list[tuple[int, int]], wikicode: Wikicode | None = None,
+                 node_at: dict[int, int] | None = None):
+        """
+        Args:
+            text (str): Wikitext of the page.
+            headings (list[tuple[int, int]]): Start and level of each top-level heading.
+            wikicode (Wikicode | None): The parsed page, when sections should be returned as Wikicode.
+            node_at (dict[int, int] | None): Index in wikicode.nodes of the node starting at each
+                heading offset and at len(text).
+        """
+        self.text = text
+        self.spans = section_spans(headings, len(text))
+        self.wikicode = wikicode
+        self.node_at = node_at
+        self.lowered = text.lower()
+        self.outer: list[tuple[int, int]] = []
+        for start, end in self.spans:
+            if not self.outer or start >= self.outer[-1][1]:
+                self.outer.append((start, end))
+        self.outer_starts = [start for start, _ in self.outer]
+        self.rfc_sections: dict[str, tuple[int, int] | None] = {}
+        for marker in RFC_MARKER_RE.finditer(self.lowered):
+            self.find(marker.group(1))
+
+    def find(self, rfc_id: str) -> tuple[int, int] | None:
+        """Return the (start, end) of the first section mentioning rfc_id (lowercase), or None."""
+        if rfc_id not in self.rfc_sections:
+            self.rfc_sections[rfc_id] = self._first_section_containing(rfc_id)
+        return self.rfc_sections[rfc_id]
+
+    def section(self, rfc_id: str) -> Wikicode | str | None:
+        """
+        Return the first section mentioning rfc_id (lowercase).
+
+        Returns:
+            Wikicode | str | None: The section's nodes when the page was parsed, else its wikitext.
+        """
+        span = self.find(rfc_id)
+        if span is None:
+            return None
+        start, end = span
+        if self.wikicode is not None:
+            return Wikicode(self.wikicode.nodes[self.node_at[start]:self.node_at[end]])
+        return self.text[start:end]
+
+    def _first_section_containing(self, needle: str) -> tuple[int, int] | None:
+        if len(self.lowered) != len(self.text):
+            # lowercasing changed some lengths, so offsets in the lowered page are not offsets in the text
+            return next(((start, end) for start, end in self.spans if needle in self.text[start:end].lower()), None)
+        position = self.lowered.find(needle)
+        while position >= 0:
+            number = bisect_right(self.outer_starts, position) - 1
+            # mentions in the lead, or running past the end of a section, are in no section
+            if number >= 0 and position + len(needle) <= self.outer[number][1]:
+                return self.outer[number]
+            position = self.lowered.find(needle, position + 1)
+        return None
+
+
+def parser_section_index(text: str) -> SectionIndex:
+    """Index the sections of a page parsed once with mwparserfromhell."""
+    wikicode = mwparserfromhell.parse(text)
+    headings = []
+    node_at = {}
+    offset = 0
+    for number, node in enumerate(wikicode.nodes):
+        if isinstance(node, Heading):
+            headings.append((offset, node.level))
+            node_at[offset] = number
+        offset += len(str(node))
+    node_at[offset] = len(wikicode.nodes)
+    return SectionIndex(text, headings, wikicode, node_at)
+
+
+def scanner_section_index(text: str) -> SectionIndex:
+    """Index the sections of a page found by signature_scanner, without a parse tree."""
+    return SectionIndex(text, list(iter_headings(text)))
+
+
+def regex_section_index(text: str) -> SectionIndex:
+    """Index the sections of a page split on heading lines with a regular expression."""
+    return SectionIndex(text, [(match.start(), len(match.group(1))) for match in FALLBACK_HEADING_RE.finditer(text)])
+
+
+def build_section_index(text: str, engine: str = 'parser') -> SectionIndex:
+    """
+    Index the sections of a page, falling back to the parser and then to regex headings.
+
+    Args:
+        text (str): Wikitext of the page.
+        engine (str): 'parser' or 'scanner', see calculate_statistics.
+    Returns:
+        SectionIndex: The index.
+    """
+    if engine == 'scanner':
+        try:
+            return scanner_section_index(text)
+        except RecursionError:
+            print("Section scan too deeply nested, parsing instead")
+    try:
+        return parser_section_index(text)
+    except Exception as e:
+        print(f"Could not parse page, splitting sections on headings instead: {e}")
+        return regex_section_index(text)
+
+
+class SectionIndexCache:
+    """
+    Section indexes of the most recently used page revisions, keyed by (title, revid).
+
+    Safe to share between threads. Indexes are built outside the lock, so two threads
+    asking for the same new revision at once may both build it; the first one is kept.
+    """
+
+    def __init__(self, max_pages: int = 32):
+        self.max_pages = max_pages
+        self.lock = threading.Lock()
+        self.indexes: OrderedDict[tuple[str, int], SectionIndex] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, title: str, revid: int, text: str, engine: str = 'parser') -> SectionIndex:
+        """
+        Return the index of a page revision, building it from text on first use.
+
+        Args:
+            title (str): Page title.
+            revid (int): Revision of the text.
+            text (str): Wikitext of that revision.
+            engine (str): 'parser' or 'scanner'.
+        Returns:
+            SectionIndex: The shared index.
+        """
+        key = (title, revid)
+        with self.lock:
+            index = self.indexes.get(key)
+            if index is not None:
+                self.hits += 1
+                self.indexes.move_to_end(key)
+                return index
+            self.misses += 1
+        index = build_section_index(text, engine)
+        with self.lock:
+            index = self.indexes.setdefault(key, index)
+            self.indexes.move_to_end(key)
+            if len(self.indexes) > self.max_pages:
+                self.indexes.popitem(last=False)
+        return index
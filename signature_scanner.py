@@ -0,0 +1,642 @@
+import re
+from html.entities import name2codepoint
+from typing import Iterator
+
+# Signature timestamps, e.g. 2025-12-30T01:02:00Z or 01:02, 30 December 2025 (UTC)
+DATETIME_RE = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}Z'
+                         r'|\d{2}:\d{2}, \d{1,2} [A-Za-z]+ \d{4} \(UTC\)')
+
+# URI schemes recognised by mwparserfromhell, and whether they need '//' after the colon
+URI_SCHEMES = {
+    'bitcoin': False, 'ftp': True, 'ftps': True, 'geo': False, 'git': True, 'gopher': True, 'http': True,
+    'https': True, 'irc': True, 'ircs': True, 'magnet': False, 'mailto': False, 'mms': True, 'news': False,
+    'nntp': True, 'redis': True, 'sftp': True, 'sip': False, 'sips': False, 'sms': False, 'ssh': True,
+    'svn': True, 'tel': False, 'telnet': True, 'urn': False, 'worldwind': True, 'xmpp': False,
+}
+# tags that may be left open, tags that never have contents, and tags whose contents are not wikitext
+SINGLE_TAGS = {'br', 'wbr', 'hr', 'meta', 'link', 'img', 'li', 'dt', 'dd', 'th', 'td', 'tr'}
+SINGLE_ONLY_TAGS = {'br', 'wbr', 'hr', 'meta', 'link', 'img'}
+RAW_TAGS = {'categorytree', 'ce', 'chem', 'gallery', 'graph', 'hiero', 'imagemap', 'inputbox', 'math', 'nowiki',
+            'pre', 'score', 'section', 'source', 'syntaxhighlight', 'templatedata', 'timeline'}
+
+SCHEME_PATTERN = '|'.join(sorted(URI_SCHEMES, key=len, reverse=True))
+# every position where a node other than text can start
+NODE_START_RE = re.compile(r"<!--|\{\{|\[|<|&|'{2,}|\n|\b(?=[a-z]{2,9}:)(?:" + SCHEME_PATTERN + r"):", re.IGNORECASE)
+# the same inside a definition list line, where ':' starts a definition
+DEFINITION_NODE_START_RE = re.compile(NODE_START_RE.pattern + '|:', re.IGNORECASE)
+LINK_TITLE_STOP_RE = re.compile(r'\|\]\]|\||\]\]|[\n\[\]{}<>]')
+TAG_OPEN_RE = re.compile(r'<([a-zA-Z][\w:-]*)((?:\s[^<>]*?)?)\s*(/?)>')
+ENTITY_RE = re.compile(r'&(?:#[xX]([0-9a-fA-F]+)|#(\d+)|([A-Za-z][A-Za-z0-9]*));')
+TICKS_RE = re.compile(r"'{2,}")
+# the characters that can start a nested node or end the node being scanned
+NESTED_STOP_RE = re.compile(r"[{}\[\]<&'\n]")
+URL_END_RE = re.compile(r'[\s\[\]<>"]|\{\{|\}\}|\'\'|&(?:nbsp|lt|gt);')
+# a heading runs to the last '=' run of its line and needs a title other than '='
+# Anything starting like a tag, closing tag or comment, for needs_parser
+TAG_LIKE_RE = re.compile(r'<!--|<(/?)([a-zA-Z][\w:-]*)?')
+CLOSE_TAG_RE = re.compile(r'</([a-zA-Z][\w:-]*)\s*>')
+HEADING_RE = re.compile(r'(=+)([^\n]*[^=\n])(=+)[^=\n]*(?=\n|$)')
+
+
+def _scheme_at(text: str, i: int) -> int:
+    """Return the end of a URI scheme and its separator starting at i, or -1."""
+    colon = text.find(':', i, i + 12)
+    if colon < 0:
+        return -1
+    slashes = URI_SCHEMES.get(text[i:colon].lower())
+    if slashes is None:
+        return -1
+    if slashes:
+        return colon + 3 if text.startswith('//', colon + 1) else -1
+    return colon + 1
+
+
+def _free_url_end(text: str, i: int) -> int:
+    """Return the end of a bare URL starting at i, or -1."""
+    start = _scheme_at(text, i)
+    if start < 0:
+        return -1
+    return _url_end(text, start)
+
+
+def _url_end(text: str, start: int) -> int:
+    """Return the end of a URL whose scheme ends at start, or -1."""
+    stop = URL_END_RE.search(text, start)
+    end = stop.start() if stop else len(text)
+    # trailing punctuation is not part of a free link, nor is ')' without '('
+    while end > start:
+        char = text[end - 1]
+        if char in ',;\\.:!?' or (char == ')' and '(' not in text[start:end]):
+            end -= 1
+        else:
+            break
+    return end if end > start else -1
+
+
+def _brackets_end(text: str, i: int) -> int:
+    """Return the end of an external link like [http://example.org label] at i, or -1."""
+    # in brackets, a protocol-relative URL is a link too
+    url_end = _url_end(text, i + 3) if text.startswith('//', i + 1) else _free_url_end(text, i + 1)
+    if url_end < 0:
+        return -1
+    j = url_end
+    while j < len(text):
+        stop = NESTED_STOP_RE.search(text, j)
+        if stop is None:
+            break
+        j = stop.start()
+        char = text[j]
+        if char == ']':
+            return j + 1
+        if char == '\n':
+            return -1
+        if char == '[':
+            inner = j + 1 if text.startswith('[[', j) else j
+            if _brackets_end(text, inner) >= 0:
+                # an external link in the title of another is text
+                j = inner + 1
+                continue
+        end = _node_end(text, j, False) if char in "{[<&'" else -1
+        j = end if end > j else _text_end(text, j)
+    return -1
+
+
+def _wikilink_end(text: str, i: int) -> int:
+    """Return the end of a [[wikilink]] starting at i, or -1."""
+    stop = LINK_TITLE_STOP_RE.search(text, i + 2)
+    if stop is None or stop.group() not in ('|', ']]'):
+        return -1
+    if stop.group() == ']]':
+        return stop.end()
+    j = stop.end()
+    while j < len(text):
+        stop = NESTED_STOP_RE.search(text, j)
+        if stop is None:
+            break
+        j = stop.start()
+        if text.startswith(']]', j):
+            return j + 2
+        char = text[j]
+        end = _node_end(text, j, False) if char in "{[<&'" else -1
+        j = end if end > j else _text_end(text, j)
+    return -1
+
+
+def _braces_body_end(text: str, j: int, opening: int, has_content: bool) -> int:
+    """Return the end of a template (opening 2) or argument (opening 3) whose body starts at j, or -1."""
+    closing = '}' * opening
+    # a template name needs text or a nested template, may not continue past a new line and holds no links or tags
+    in_name = opening == 2
+    has_text = has_content
+    fail_on_text = False
+    while j < len(text):
+        if not in_name:
+            stop = NESTED_STOP_RE.search(text, j)
+            if stop is None:
+                break
+            j = stop.start()
+        char = text[j]
+        if text.startswith(closing, j):
+            return j + opening if has_text or not in_name else -1
+        if char == '}' and opening == 3 and text.startswith('}}', j):
+            return -1
+        if in_name:
+            if char == '|':
+                if not has_text:
+                    return -1
+                in_name = False
+            elif char == '{':
+                # a brace must open a nested template, which counts as the name's text
+                end = _node_end(text, j, False)
+                if end < 0:
+                    return -1
+                has_text = True
+                j = end
+                continue
+            elif text.startswith('<!--', j):
+                # comments are allowed but are not text
+                pass
+            elif char in '[]<>}':
+                return -1
+            elif char == '\n':
+                fail_on_text = has_text
+            elif not char.isspace():
+                if fail_on_text:
+                    return -1
+                has_text = True
+        end = _node_end(text, j, False) if char in "{[<&'" else -1
+        j = end if end > j else _text_end(text, j)
+    return -1
+
+
+def _braces_span(text: str, i: int) -> tuple[int, int]:
+    """
+    Return the start and end of the templates and arguments opened by the run of braces at i.
+
+    Like mwparserfromhell, the innermost braces are matched first, as an argument if
+    possible and otherwise as a template; braces left over stay text in front of the node.
+    Returns (-1, -1) when the braces are all text.
+    """
+    run_end = i
+    while run_end < len(text) and text[run_end] == '{':
+        run_end += 1
+    braces = run_end - i
+    end = -1
+    while braces:
+        if braces == 1:
+            break
+        if braces == 2:
+            inner = _braces_body_end(text, run_end if end < 0 else end, 2, end >= 0)
+            if inner < 0:
+                break
+            return i, inner
+        inner = _braces_body_end(text, run_end if end < 0 else end, 3, end >= 0)
+        if inner >= 0:
+            braces -= 3
+        else:
+            inner = _braces_body_end(text, run_end if end < 0 else end, 2, end >= 0)
+            if inner < 0:
+                break
+            braces -= 2
+        end = inner
+    return (i + braces, end) if end >= 0 else (-1, -1)
+
+
+def _tag_end(text: str, i: int) -> int:
+    """Return the end of an HTML or extension tag starting at i, or -1."""
+    opening = TAG_OPEN_RE.match(text, i)
+    if opening is None:
+        return -1
+    name = opening.group(1).lower()
+    if opening.group(3) or name in SINGLE_ONLY_TAGS:
+        return opening.end()
+    close_re = re.compile(r'</' + re.escape(name) + r'\s*>', re.IGNORECASE)
+    if name in RAW_TAGS:
+        closing = close_re.search(text, opening.end())
+        return closing.end() if closing else -1
+    open_re = re.compile(r'<' + re.escape(name) + r'\b[^<>]*(?<!/)>', re.IGNORECASE)
+    depth = 1
+    j = opening.end()
+    while True:
+        closing = close_re.search(text, j)
+        if closing is None:
+            break
+        # tags of the same name nest
+        depth += len(open_re.findall(text, j, closing.start())) - 1
+        if depth == 0:
+            return closing.end()
+        j = closing.end()
+    return opening.end() if name in SINGLE_TAGS else -1
+
+
+def _entity_end(text: str, i: int) -> int:
+    """Return the end of an HTML entity starting at i, or -1."""
+    entity = ENTITY_RE.match(text, i)
+    if entity is None:
+        return -1
+    hexadecimal, decimal, name = entity.groups()
+    if name is not None:
+        return entity.end() if name in name2codepoint else -1
+    codepoint = int(hexadecimal, 16) if hexadecimal is not None else int(decimal)
+    return entity.end() if 0 < codepoint <= 0x10FFFF else -1
+
+
+def _style_body_end(text: str, j: int, italics: bool, second_pass: bool = False) -> tuple[int, bool]:
+    """
+    Return the end of an italic (or bold) body starting at j, or -1, as mwparserfromhell's tokenizer finds it.
+
+    Also returns whether a ''' that could not open bold was met, after which italics
+    that fail are tried again treating ''' as an apostrophe and a closing ''.
+    """
+    pass_again = False
+    while j < len(text):
+        stop = NESTED_STOP_RE.search(text, j)
+        if stop is None:
+            break
+        j = stop.start()
+        char = text[j]
+        if char == "'":
+            run = TICKS_RE.match(text, j)
+            if run is None:
+                j += 1
+                continue
+            start, ticks = _ticks_at(run)
+            after = start + ticks
+            if ticks == 5 or ticks == (2 if italics else 3):
+                # five ticks close the open style and leave the rest for the enclosing one
+                return (start + (2 if italics else 3) if ticks == 5 else after), pass_again
+            if ticks == 2:
+                end = _italics_end(text, after)
+            else:
+                end = _style_body_end(text, after, False)[0]
+                if end < 0:
+                    if second_pass:
+                        return after, pass_again
+                    pass_again = True
+            j = end if end >= 0 else after
+            continue
+        end = _node_end(text, j, False) if char in "{[<&" else -1
+        j = end if end > j else _text_end(text, j)
+    return -1, pass_again
+
+
+def _ticks_at(run: re.Match) -> tuple[int, int]:
+    """Return where the markup of a run of ticks starts and how many ticks it uses; leading extra ticks are text."""
+    length = len(run.group())
+    if length == 4:
+        return run.start() + 1, 3
+    return run.end() - min(length, 5), min(length, 5)
+
+
+def _italics_end(text: str, j: int) -> int:
+    """Return the end of italics whose body starts at j, or -1."""
+    end, pass_again = _style_body_end(text, j, True)
+    if end < 0 and pass_again:
+        end = _style_body_end(text, j, True, True)[0]
+    return end
+
+
+def _five_ticks_span(text: str, i: int) -> tuple[int, int]:
+    """Return the start and end of the styles opened by five ticks at i, or (-1, -1)."""
+    bold_end = _style_body_end(text, i + 5, False)[0]
+    if bold_end >= 0:
+        end = _style_body_end(text, bold_end, True)[0]
+        return (i, end) if end >= 0 else (i + 2, bold_end)
+    italics_end = _style_body_end(text, i + 5, True)[0]
+    if italics_end < 0:
+        return -1, -1
+    end = _style_body_end(text, italics_end, False)[0]
+    return (i, end) if end >= 0 else (i + 3, italics_end)
+
+
+def _ticks_span(text: str, i: int) -> tuple[int, int]:
+    """
+    Return the start and end of ''italic'', '''bold''' or '''''both''''' markup in the run of ticks at i.
+
+    Returns (-1, -1) when the ticks are text. A fourth tick, ticks beyond five and the
+    apostrophe left when bold falls back to italics are text before the node.
+    """
+    run = TICKS_RE.match(text, i)
+    if run is None:
+        return -1, -1
+    start, ticks = _ticks_at(run)
+    if ticks == 5:
+        return _five_ticks_span(text, start)
+    if ticks == 3:
+        end = _style_body_end(text, start + 3, False)[0]
+        if end >= 0:
+            return start, end
+        # bold that never closes is an apostrophe followed by italics
+        start += 1
+    end = _italics_end(text, start + 2)
+    return (start, end) if end >= 0 else (-1, -1)
+
+
+def _text_end(text: str, i: int) -> int:
+    """Return where scanning goes on after markup at i that turned out to be text: a failed '[[' is text as a pair."""
+    return i + 2 if text.startswith('[[', i) else i + 1
+
+
+def _node_end(text: str, i: int, top_level: bool) -> int:
+    """Return the end of the node starting at i, or -1 if the text there is plain text."""
+    char = text[i]
+    if char == '<':
+        if text.startswith('<!--', i):
+            end = text.find('-->', i + 4)
+            return end + 3 if end >= 0 else -1
+        return _tag_end(text, i)
+    if char == '{':
+        return _braces_span(text, i)[1] if text.startswith('{{', i) else -1
+    if char == '[':
+        if text.startswith('[[', i):
+            # [[http://example.org label]] is '[' followed by an external link
+            end = _brackets_end(text, i + 1)
+            return end if end >= 0 else _wikilink_end(text, i)
+        return _brackets_end(text, i)
+    if char == '&':
+        return _entity_end(text, i)
+    if char == "'":
+        return _ticks_span(text, i)[1]
+    if top_level:
+        return _free_url_end(text, i)
+    return -1
+
+
+def _line_start_nodes(text: str, i: int) -> tuple[list[tuple[str, int, int]], bool]:
+    """Return the nodes that start a line at i and whether the line is a definition list item."""
+    char = text[i] if i < len(text) else ''
+    if char in ('*', '#', ':', ';') and char:
+        nodes = []
+        j = i
+        while j < len(text) and text[j] in '*#:;':
+            nodes.append(('list', j, j + 1))
+            j += 1
+        return nodes, ';' in text[i:j]
+    if text.startswith('----', i):
+        j = i + 4
+        while j < len(text) and text[j] == '-':
+            j += 1
+        return [('hr', i, j)], False
+    if char == '=':
+        heading = HEADING_RE.match(text, i)
+        if heading:
+            return [('heading', i, heading.end(3))], False
+    if text.startswith('{|', i):
+        depth = 0
+        for line in re.finditer(r'^[ \t]*(\{\||\|\})', text[i:], re.MULTILINE):
+            depth += 1 if line.group(1) == '{|' else -1
+            if depth == 0:
+                return [('table', i, i + line.end())], False
+    return [], False
+
+
+def iter_top_level_nodes(text: str) -> Iterator[tuple[str, int, int]]:
+    """
+    Yield the nodes mwparserfromhell.parse(text).nodes would hold, other than text.
+
+    Args:
+        text (str): Wikitext.
+    Returns:
+        Iterator[tuple[str, int, int]]: (kind, start, end) of each node, in order. Everything
+            between them is plain text.
+    """
+    pos = 0
+    definition_line = False
+    line_start = 0
+    while pos <= len(text):
+        if pos == line_start:
+            nodes, definition_line = _line_start_nodes(text, pos)
+            for node in nodes:
+                yield node
+                pos = node[2]
+            if pos >= len(text):
+                return
+        node_start_re = DEFINITION_NODE_START_RE if definition_line else NODE_START_RE
+        candidate = node_start_re.search(text, pos)
+        if candidate is None:
+            return
+        i = candidate.start()
+        char = text[i]
+        if char == '\n':
+            pos = line_start = i + 1
+            definition_line = False
+            continue
+        if char == ':':
+            definition_line = False
+            yield ('list', i, i + 1)
+            pos = i + 1
+            continue
+        if char == "'" or char == '{' and text.startswith('{{', i):
+            # ticks and braces the markup did not use are text before the node
+            i, end = _ticks_span(text, i) if char == "'" else _braces_span(text, i)
+            if end < 0:
+                pos = candidate.end()
+                continue
+        else:
+            if text.startswith('[[', i) and _brackets_end(text, i + 1) >= 0:
+                # the first '[' is text before an external link
+                i += 1
+            end = _node_end(text, i, True)
+        if end > i:
+            yield ('node' if char != '[' or not text.startswith('[[', i) else 'wikilink', i, end)
+            pos = end
+        else:
+            pos = _text_end(text, i)
+
+
+def needs_parser(text: str) -> bool:
+    """
+    Return whether text has markup the scanner may read differently from mwparserfromhell.
+
+    That is unbalanced braces or brackets, an unclosed or malformed tag or comment, or a
+    line whose '' and ''' do not pair up: the parser's backtracking over such markup is
+    not reproduced by the scanner.
+    """
+    if text.count('{') != text.count('}') or text.count('[') != text.count(']'):
+        return True
+    open_tags: dict[str, int] = {}
+    pos = 0
+    while match := TAG_LIKE_RE.search(text, pos):
+        pos = match.end()
+        if match.group(0) == '<!--':
+            end = text.find('-->', pos)
+            if end < 0:
+                return True
+            # tags inside a comment are text
+            pos = end + 3
+            continue
+        closing, name = match.groups()
+        if name is None:
+            # a lone '<' or '</' is text to the parser only if it is not the start of a tag
+            if closing:
+                return True
+            continue
+        name = name.lower()
+        if closing:
+            if not CLOSE_TAG_RE.match(text, match.start()):
+                return True
+            open_tags[name] = open_tags.get(name, 0) - 1
+            continue
+        opening = TAG_OPEN_RE.match(text, match.start())
+        if opening is None:
+            return True
+        if not opening.group(3) and name not in SINGLE_ONLY_TAGS:
+            open_tags[name] = open_tags.get(name, 0) + 1
+    if any(count and name not in SINGLE_TAGS for name, count in open_tags.items()):
+        return True
+    for line in text.split('\n'):
+        italics = bold = 0
+        for run in TICKS_RE.finditer(line):
+            ticks = len(run.group(0))
+            if ticks == 2:
+                italics += 1
+            elif ticks in (3, 4):
+                bold += 1
+            else:
+                italics += 1
+                bold += 1
+        if italics % 2 or bold % 2:
+            return True
+    return False
+
+
+def scan_signatures(text: str) -> dict[str, tuple[int, int]]:
+    """
+    Count signed comments per user in raw wikitext, without building a parse tree.
+
+    Counts like calculate_statistics.calculate_statistics on mwparserfromhell.parse(text):
+    a comment counts when a [[User talk:...]] link is directly followed by text with a
+    timestamp, and its size is everything since the previous counted timestamp. The two
+    agree on text for which needs_parser is False; on other text, such as an unclosed
+    <small> followed by unbalanced '', they can differ, so calculate_statistics hands
+    that text to the parser.
+
+    Args:
+        text (str): Wikitext of an RfC section.
+    Returns:
+        dict[str, tuple[int, int]]: {user: (comments, bytes)} in order of first comment.
+    """
+    user_statistics: dict[str, tuple[int, int]] = {}
+    previous_length = 0
+    previous_link = None
+    pos = 0
+    for kind, start, end in iter_top_level_nodes(text):
+        if start > pos:
+            previous_length, previous_link = _scan_text(text, pos, start, previous_length, previous_link,
+                                                        user_statistics)
+        previous_length += end - start
+        previous_link = (start, end) if kind == 'wikilink' else None
+        pos = end
+    if pos < len(text):
+        _scan_text(text, pos, len(text), previous_length, previous_link, user_statistics)
+    return user_statistics
+
+
+def _scan_text(text: str, start: int, end: int, previous_length: int, previous_link: tuple[int, int] | None,
+               user_statistics: dict[str, tuple[int, int]]) -> tuple[int, None]:
+    """Account for one text node; return the new running length and previous link."""
+    if not DATETIME_RE.search(text, start, end):
+        return previous_length + end - start, None
+    if previous_link is not None:
+        link_start, link_end = previous_link
+        separator = text.find('|', link_start + 2, link_end - 2)
+        title = text[link_start + 2:separator if separator >= 0 else link_end - 2].strip()
+        if title.startswith('User talk:'):
+            username = title[10:].strip()
+            if username:
+                count, size = user_statistics.get(username, (0, 0))
+                user_statistics[username] = (count + 1, size + previous_length)
+                # ignore length of datetime
+                return end - start, None
+    return previous_length, None
+
+
+def iter_headings(text: str) -> Iterator[tuple[int, int]]:
+    """Yield the start and level of each top-level heading, as mwparserfromhell finds them."""
+    for kind, start, end in iter_top_level_nodes(text):
+        if kind == 'heading':
+            match = HEADING_RE.match(text, start)
+            yield start, min(len(match.group(1)), len(match.group(3)), 6)
+
+
+def section_spans(headings: list[tuple[int, int]], length: int) -> list[tuple[int, int]]:
+    """
+    Return the (start, end) of each section, in the order of get_sections(include_lead=False).
+
+    Args:
+        headings (list[tuple[int, int]]): Start and level of each heading, in text order.
+        length (int): Length of the text.
+    Returns:
+        list[tuple[int, int]]: A section runs from its heading to the next heading of the
+            same or a higher level, or to the end of the text.
+    """
+    ends = [length] * len(headings)
+    open_sections: list[int] = []
+    for index, (start, level) in enumerate(headings):
+        while open_sections and headings[open_sections[-1]][1] >= level:
+            ends[open_sections.pop()] = start
+        open_sections.append(index)
+    return [(start, end) for (start, _), end in zip(headings, ends)]
+
+
+def find_section(text: str, needle: str) -> str | None:
+    """
+    Return the first section whose text contains needle, without building a parse tree.
+
+    Gives the same section as the first match in mwparserfromhell.parse(text).get_sections(include_lead=False).
+
+    Args:
+        text (str): Wikitext of a page.
+        needle (str): Lowercase text to look for, e.g. an RfC id.
+    Returns:
+        str | None: Wikitext of the section, heading included, or None.
+    """
+    for start, end in section_spans(list(iter_headings(text)), len(text)):
+        section = text[start:end]
+        if needle in section.lower():
+            return section
+    return None
+
+
+if __name__ == "__main__":
+    # Benchmark against parsing with mwparserfromhell on rfc_section.txt, the RfC statements quoted
+    # in old-rfc.txt and the recall survey. The scanner is timed as analyze_rfcs runs it, through
+    # calculate_statistics(engine='scanner'), so needs_parser and the texts it hands to the parser count.
+    import ast
+    import re
+    import timeit
+    from pathlib import Path
+
+    import mwparserfromhell
+
+    from calculate_statistics import calculate_statistics
+
+    here = Path(__file__).parent
+    section = (here / 'rfc_section.txt').read_text(encoding='utf-8')
+    if section[:1] in ('"', "'"):
+        # the sample section is saved as a Python string literal
+        section = ast.literal_eval(section)
+    statements = [entry[entry.index('{{rfcquote|text=') + 16:entry.rstrip().rindex('}}')]
+                  for entry in re.split(r'(?m)^(?=== )', (here / 'old-rfc.txt').read_text(encoding='utf-8'))
+                  if '{{rfcquote|text=' in entry]
+    corpora = {
+        'rfc_section.txt': [section],
+        'old-rfc.txt statements': statements,
+        'docs/recall_survey.md': [(here / 'docs' / 'recall_survey.md').read_text(encoding='utf-8')],
+    }
+
+    rounds = 20
+    for name, texts in corpora.items():
+        stats = [calculate_statistics(text, engine='scanner') for text in texts]
+        assert stats == [calculate_statistics(mwparserfromhell.parse(text)) for text in texts], \
+            f"{name}: output differs from parser"
+        parser_seconds = timeit.timeit(
+            lambda: [calculate_statistics(mwparserfromhell.parse(text)) for text in texts], number=rounds)
+        scanner_seconds = timeit.timeit(
+            lambda: [calculate_statistics(text, engine='scanner') for text in texts], number=rounds)
+        print(f"{name}: {len(texts)} texts, {sum(map(len, texts))} chars, "
+              f"{sum(sum(c for c, _ in user_stats.values()) for user_stats in stats)} comments, "
+              f"{sum(map(needs_parser, texts))} sent to the parser, identical output")
+        print(f"  parse + calculate_statistics:          {parser_seconds * 1000 / rounds:.3f} ms")
+        print(f"  calculate_statistics(engine='scanner'): {scanner_seconds * 1000 / rounds:.3f} ms")
+        print(f"  speedup: {parser_seconds / scanner_seconds:.1f}x")
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import os
+import random
+from typing import Awaitable, Callable, NamedTuple
+
+import aiohttp
+
+
+class SseEvent(NamedTuple):
+    id: str | None
+    event: str
+    data: str
+
+
+class EventBatch(NamedTuple):
+    events: list[SseEvent]
+    # id to resume from once every event of the batch is processed
+    last_event_id: str | None
+
+
+class RawSseEvent(NamedTuple):
+    id: str | None
+    event: str
+    # the data lines as received, joined with b'\n' and not yet decoded
+    data: bytes
+
+    def decode(self) -> SseEvent:
+        return SseEvent(self.id, self.event, self.data.decode('utf-8'))
+
+
+class SseParser:
+    """Incremental parser of a text/event-stream, fed one line of bytes at a time."""
+
+    def __init__(self):
+        self.last_event_id: str | None = None
+        self.retry_ms: int | None = None
+        self._event = ''
+        self._data: list[bytes] = []
+
+    def feed(self, line: bytes) -> RawSseEvent | None:
+        """
+        Read one line, without its line ending; return the event a blank line completes.
+
+        Only the short id, event and retry values are decoded here. The data is returned as
+        bytes, so a filter can look at it before paying for decoding.
+        """
+        if line == b'':
+            if not self._data:
+                self._event = ''
+                return None
+            event = RawSseEvent(self.last_event_id, self._event or 'message', b'\n'.join(self._data))
+            self._event = ''
+            self._data = []
+            return event
+        if line.startswith(b':'):
+            return None
+        name, _, value = line.partition(b':')
+        if value.startswith(b' '):
+            value = value[1:]
+        if name == b'data':
+            self._data.append(value)
+        elif name == b'event':
+            self._event = value.decode('utf-8')
+        elif name == b'id' and b'\0' not in value:
+            self.last_event_id = value.decode('utf-8')
+        elif name == b'retry' and value.isdigit():
+            self.retry_ms = int(value)
+        return None
+
+
+def load_last_event_id(state_path: str | None) -> str | None:
+    """Return the id saved by save_last_event_id, or None."""
+    if not state_path or not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, encoding='utf-8') as state:
+            return json.load(state).get('last_event_id')
+    except (OSError, ValueError) as e:
+        print(f"Could not read event stream state {state_path}: {e}")
+        return None
+
+
+def save_last_event_id(state_path: str | None, last_event_id: str | None) -> None:
+    """Save the id to resume from, replacing the state file in one step."""
+    if not state_path or last_event_id is None:
+        return
+    temporary = f"{state_path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as state:
+        json.dump({'last_event_id': last_event_id}, state)
+    os.replace(temporary, state_path)
+
+
+class EventStreamClient:
+    """
+    Read a Server-Sent Events stream with aiohttp and queue its events in batches.
+
+    The client reconnects whenever the stream fails or ends, sending the id of the last
+    event it received as Last-Event-ID so the server resumes right after it. Reconnects
+    back off exponentially, with jitter, from the server's retry delay up to max_backoff
+    seconds, and the backoff resets once events flow again. Events are queued in batches
+    of up to batch_size, or whatever arrived within batch_seconds of a batch's first event;
+    the bounded queue makes the reader wait when processing falls behind instead of
+    dropping events.
+
+    The id to resume from after a restart is saved by process_event_batches, after each
+    batch is processed, so a restart redelivers the unprocessed events rather than losing
+    them.
+
+    data_filter, if given, sees the data of each event as the bytes read from the stream.
+    Events it rejects are never decoded or queued, so uninteresting events cost no more
+    than the filter itself.
+    """
+
+    def __init__(self, url: str, queue: asyncio.Queue, headers: dict[str, str] | None = None,
+                 last_event_id: str | None = None, batch_size: int = 50, batch_seconds: float = 1.0,
+                 initial_backoff: float = 1.0, max_backoff: float = 60.0, read_timeout: float = 60.0,
+                 data_filter: Callable[[bytes], bool] | None = None):
+        """
+        Args:
+            url (str): The stream URL.
+            queue (asyncio.Queue): Bounded queue receiving EventBatch items.
+            headers (dict[str, str] | None): Extra request headers, e.g. the User-Agent.
+            last_event_id (str | None): Id to resume after, see load_last_event_id.
+            batch_size (int): Most events per batch.
+            batch_seconds (float): Longest time the first event of a batch waits for the rest.
+            initial_backoff (float): Seconds before the first reconnect, unless the server sets retry.
+            max_backoff (float): Longest wait between reconnects.
+            read_timeout (float): Seconds without any data, heartbeats included, before reconnecting.
+            data_filter (Callable[[bytes], bool] | None): Cheap test of the raw event data; False drops the event.
+        """
+        self.url = url
+        self.queue = queue
+        self.headers = headers or {}
+        self.last_event_id = last_event_id
+        self.batch_size = max(1, batch_size)
+        self.batch_seconds = batch_seconds
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.read_timeout = read_timeout
+        self.data_filter = data_filter
+        self.connections = 0
+        self.events_received = 0
+        self.events_filtered = 0
+        self._failures = 0
+        self._retry_ms: int | None = None
+        # events read but not yet batched; bounded so a slow consumer also slows the reader
+        self._events: asyncio.Queue = asyncio.Queue(self.batch_size * 2)
+
+    async def run(self, stop: asyncio.Event | None = None) -> None:
+        """Read the stream until stop is set, reconnecting after every failure, then queue the last batch."""
+        stop = stop or asyncio.Event()
+        batcher = asyncio.create_task(self._batch_events())
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=self.read_timeout)
+        try:
+            async with aiohttp.ClientSession(timeout=timeout) as session:
+                while not stop.is_set():
+                    reader = asyncio.create_task(self._read_stream(session))
+                    stopper = asyncio.create_task(stop.wait())
+                    await asyncio.wait([reader, stopper], return_when=asyncio.FIRST_COMPLETED)
+                    stopper.cancel()
+                    if stop.is_set():
+                        reader.cancel()
+                        await asyncio.gather(reader, return_exceptions=True)
+                        break
+                    try:
+                        reader.result()
+                        print("Event stream ended, reconnecting")
+                    except Exception as e:
+                        print(f"Event stream error: {e!r}")
+                    self._failures += 1
+                    delay = self._backoff()
+                    print(f"Reconnecting to event stream in {delay:.1f}s (last event id: {self.last_event_id})")
+                    try:
+                        await asyncio.wait_for(stop.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            await self._events.put(None)
+            await batcher
+
+    def _backoff(self) -> float:
+        base = self._retry_ms / 1000 if self._retry_ms is not None else self.initial_backoff
+        delay = min(self.max_backoff, base * 2 ** (self._failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _read_stream(self, session: aiohttp.ClientSession) -> None:
+        headers = {'Accept': 'text/event-stream', **self.headers}
+        if self.last_event_id is not None:
+            headers['Last-Event-ID'] = self.last_event_id
+        async with session.get(self.url, headers=headers) as response:
+            response.raise_for_status()
+            self.connections += 1
+            print(f"Connected to event stream: {self.url}, status code {response.status}")
+            parser = SseParser()
+            parser.last_event_id = self.last_event_id
+            # no timeout around readline: cancelling it would drop a partly read line
+            while raw := await response.content.readline():
+                raw_event = parser.feed(raw.rstrip(b'\r\n'))
+                if parser.retry_ms is not None:
+                    self._retry_ms = parser.retry_ms
+                if raw_event is None:
+                    continue
+                self.events_received += 1
+                self._failures = 0
+                if self.data_filter is not None and not self.data_filter(raw_event.data):
+                    # a dropped event needs no processing, so resuming after it loses nothing
+                    self.events_filtered += 1
+                    self.last_event_id = raw_event.id
+                    continue
+                await self._events.put(raw_event.decode())
+                self.last_event_id = raw_event.id
+
+    async def _batch_events(self) -> None:
+        """Group events into batches for the output queue, until a None event."""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            event = await self._events.get()
+            if event is None:
+                break
+            batch = [event]
+            deadline = loop.time() + self.batch_seconds
+            while len(batch) < self.batch_size:
+                try:
+                    event = await asyncio.wait_for(self._events.get(), max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+                if event is None:
+                    stopping = True
+                    break
+                batch.append(event)
+            await self.queue.put(EventBatch(batch, batch[-1].id))
+
+
+async def process_event_batches(queue: asyncio.Queue, handle_event: Callable[[SseEvent], Awaitable[None] | None],
+                                state_path: str | None = None) -> None:
+    """
+    Hand every event of the queued batches to handle_event, until a None batch.
+
+    Once a batch is processed its last id is saved to state_path, so a restarted client
+    resumes after it. handle_event may be a plain function or a coroutine function; its
+    errors are printed and do not stop the batch.
+    """
+    while True:
+        batch = await queue.get()
+        try:
+            if batch is None:
+                break
+            for event in batch.events:
+                try:
+                    result = handle_event(event)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    print(f"event processing error: {e}")
+            save_last_event_id(state_path, batch.last_event_id)
+        finally:
+            queue.task_done()
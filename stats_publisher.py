@@ -2,7 +2,8 @@
 from pywikibot import Link, Page
 
 from find_rfc import RfcStats
-from config import site
+from config import site, PAGE_CACHE_MAX_BYTES, PAGE_CACHE_PATH
+from page_cache import cached_page_text, open_page_cache
 
 
 def draft_report(results: list[tuple[RfcStats, str, Link]]) -> str:
@@ -35,8 +36,10 @@ def publish_report(report: str, page_title: str) -> None:
     print(f"Result page ({page_title}) exists: {results_exist}")
 
     
+    cache = open_page_cache(PAGE_CACHE_PATH, PAGE_CACHE_MAX_BYTES)
     print(f"Current content of result page ({page_title}):")
-    print(result_page.text)
+    if results_exist:
+        print(cached_page_text(cache, result_page))
 
     result_page.text = report
     result_page.save(summary="Updating RFC analysis report", minor=False)
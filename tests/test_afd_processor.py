@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+
+import afd_processor
+from afd_processor import AfdBatchProcessor, extract_article_title, fast_article_title, parse_article_title
+
+AFD = """===[[:Foo Bar]]===
+{{REMOVE THIS TEMPLATE WHEN CLOSING THIS AfD|N}}
+:{{la|Foo Bar}} – (<includeonly>[[Wikipedia:Articles for deletion/Foo Bar|View AfD]]</includeonly>)
+:({{Find sources AFD|Foo Bar}})
+Non-notable subject. Fails [[WP:GNG]]. ~~~~
+"""
+
+# pages where a regex reading can differ from the parser's
+TRICKY = [
+    '<div>\n== [[Bar]] ==\n</div>\n',
+    '{{Foo|a=\n== [[Bar]] ==\n}}\n== [[Baz]] ==\n',
+    '{{{la|Foo}}}',
+    '{|\n== [[Bar]] ==\n|}\n',
+    '<!-- {{la|Hidden}} -->\n== [[Shown]] ==',
+    '== [[Heading]] ==\n<!-- c -->{{la|Template}}',
+    '<nowiki>{{la|N}}</nowiki>{{la|M}}',
+    '{{la|{{PAGENAME}}}}',
+    '{{la|[[Linked]]}}',
+    '{{outer|{{la|Nested}}}}',
+    '{{la}}{{la|Second}}',
+    '== [[Bar]] =={{x}}\n',
+]
+
+
+def test_fast_path_agrees_with_parser():
+    simple = [AFD, '{{la|1= Foo }}', '{{LA |Foo|x}}', '== [[:Baz]] ==\nx', '== x ==\n== [[Qux|q]] ===\n', '=[[One]]=\n']
+    for wikitext in simple:
+        assert fast_article_title(wikitext) is not None
+    for wikitext in simple + TRICKY:
+        fast = fast_article_title(wikitext)
+        assert fast is None or fast == parse_article_title(wikitext), wikitext
+        assert extract_article_title(wikitext) == parse_article_title(wikitext), wikitext
+    assert fast_article_title(AFD) == 'Foo Bar'
+    assert [extract_article_title(wikitext) for wikitext in TRICKY[:3]] == [None, 'Baz', None]
+
+
+def test_batch_processor_batches_and_counts(monkeypatch):
+    texts = {
+        'A': '{{la|A}}',
+        'B': '== [[B]] ==\n',
+        'C': '<div>\n== [[C]] ==\n</div>\n',
+        'E': '{{Foo|a=\n== [[X]] ==\n}}\n== [[E]] ==\n',
+        'F': '{{la|F}}',
+        'G': '{{la|G}}',
+    }
+    articles = []
+
+    def process_afd_article(afd_title, article_title, afd_timestamp, afd_user=None):
+        if article_title == 'F':
+            raise ValueError('no reviewers')
+        articles.append((afd_title, article_title))
+
+    monkeypatch.setattr(afd_processor, 'process_afd_article', process_afd_article)
+    fetched = []
+
+    def fetch_texts(afd_titles):
+        fetched.append(afd_titles)
+        return {afd_title: texts[afd_title] for afd_title in afd_titles if afd_title in texts}
+
+    processor = AfdBatchProcessor(batch_size=3, batch_seconds=5)
+    # the thread fetches nothing before the first submit
+    processor.fetch_texts = fetch_texts
+    timestamp = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for afd_title in 'ABCDEFG':
+        processor.submit(afd_title, timestamp, 'Alice')
+    processor.close()
+
+    assert fetched == [['A', 'B', 'C'], ['D', 'E', 'F'], ['G']]
+    assert articles == [('A', 'A'), ('B', 'B'), ('E', 'E'), ('G', 'G')]
+    stats = processor.stats()
+    assert {name: stats[name] for name in processor.counts} == {
+        'submitted': 7, 'batches': 3, 'processed': 7, 'missing': 1, 'no_title': 1,
+        'fast_path': 4, 'parser': 2, 'errors': 1}
+    assert stats['stages']['fetch']['items'] == 3 and stats['stages']['end_to_end']['items'] == 7
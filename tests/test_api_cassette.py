@@ -0,0 +1,157 @@
+import contextlib
+import json
+
+import pytest
+from pywikibot.comms import http
+from pywikibot.data import api
+
+from api_cassette import ApiCassette, CassetteMissError
+
+
+class RecordedRequest:
+    """The parts of api.Request the cassette reads."""
+
+    site = 'wikipedia:en'
+
+    def __init__(self, **params):
+        self.params = params
+
+    def _add_defaults(self):
+        self.params.setdefault('format', 'json')
+
+    def _encoded_items(self):
+        return self.params
+
+
+def test_replay_serves_recorded_responses_in_order(tmp_path):
+    path = str(tmp_path / 'cassette.jsonl')
+    answers = iter([{'compare': {'body': 'first'}}, {'compare': {'body': 'second'}}])
+    recorder = ApiCassette(path, 'record')
+    for token in ['a', 'b']:
+        recorder.submit(lambda request: next(answers), RecordedRequest(action='compare', fromrev=1, torev=2, token=token))
+    recorder.uninstall()
+    assert recorder.requests == 2
+
+    player = ApiCassette(path, 'replay')
+    request = RecordedRequest(action='compare', torev=2, fromrev=1, maxlag=5)
+    first = player.submit(None, request)
+    assert first == {'compare': {'body': 'first'}}
+    # the last response keeps answering once the earlier ones are used up
+    assert player.submit(None, request) == player.submit(None, request) == {'compare': {'body': 'second'}}
+    with pytest.raises(CassetteMissError):
+        player.submit(None, RecordedRequest(action='compare', fromrev=1, torev=3))
+    assert (player.requests, player.misses) == (3, 1)
+
+
+class StandInSite:
+    """The parts of APISite a GET api.Request reads, for a logged out user."""
+
+    family = 'wikipedia'
+    code = 'en'
+    _loginstatus = 0
+    userinfo = {'name': '127.0.0.1', 'anon': True, 'groups': ['*'], 'rights': ['read']}
+
+    def __str__(self):
+        return 'wikipedia:en'
+
+    def __repr__(self):
+        return "StandInSite('en', 'wikipedia')"
+
+    def encoding(self):
+        return 'utf-8'
+
+    def user(self):
+        return None
+
+    def username(self):
+        return None
+
+    def has_extension(self, name):
+        return False
+
+    def is_oauth_token_available(self):
+        return False
+
+    def protocol(self):
+        return 'https'
+
+    def scriptpath(self):
+        return '/w'
+
+    def apipath(self):
+        return '/w/api.php'
+
+    def throttle(self, *args, **kwargs):
+        return contextlib.nullcontext()
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {'content-type': 'application/json; charset=utf-8'}
+
+    def __init__(self, data):
+        self.data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self.data
+
+
+def test_install_records_and_replays_real_requests(tmp_path, monkeypatch):
+    original_submits = {cls: cls.__dict__['submit'] for cls in (api.Request, api.CachedRequest)}
+    monkeypatch.setattr(api.CachedRequest, '_get_cache_dir', classmethod(lambda cls: tmp_path))
+    sent = []
+
+    def fake_http_request(site, uri=None, method='GET', data=None, headers=None, **kwargs):
+        sent.append(uri)
+        return FakeResponse({'batchcomplete': True, 'parse': {'title': 'API', 'wikitext': f'answer {len(sent)}'}})
+
+    monkeypatch.setattr(http, 'request', fake_http_request)
+    site = StandInSite()
+
+    def make_requests():
+        return (api.Request(site=site, use_get=True, parameters={'action': 'parse', 'text': 'x'}),
+                api.CachedRequest(1, site=site, use_get=True, parameters={'action': 'parse', 'text': 'y'}))
+
+    path = str(tmp_path / 'cassette.jsonl')
+    recorder = ApiCassette(path, 'record').install()
+    try:
+        assert api.Request.__dict__['submit'] is not original_submits[api.Request]
+        assert api.CachedRequest.__dict__['submit'] is not original_submits[api.CachedRequest]
+        request, cached = make_requests()
+        assert request.submit()['parse']['wikitext'] == 'answer 1'
+        # CachedRequest.submit reaches Request.submit through super(): sent once, recorded once
+        assert cached.submit()['parse']['wikitext'] == 'answer 2'
+        assert not request._cassette_handled and not cached._cassette_handled
+    finally:
+        recorder.uninstall()
+    assert {cls: cls.__dict__['submit'] for cls in original_submits} == original_submits
+    assert (len(sent), recorder.requests) == (2, 2)
+
+    def no_network(*args, **kwargs):
+        raise AssertionError('replay must not reach the HTTP layer')
+
+    monkeypatch.setattr(http, 'request', no_network)
+    player = ApiCassette(path, 'replay').install()
+    try:
+        request, cached = make_requests()
+        assert request.submit()['parse']['wikitext'] == 'answer 1'
+        assert cached.submit()['parse']['wikitext'] == 'answer 2'
+        assert cached._data['parse']['wikitext'] == 'answer 2'
+    finally:
+        player.uninstall()
+    assert player.requests == 2
+
+
+def test_handled_request_goes_straight_to_original(tmp_path):
+    player = ApiCassette(str(tmp_path / 'empty.jsonl'), 'record')
+    request = RecordedRequest(action='compare', fromrev=1, torev=2)
+    request._cassette_handled = True
+    calls = []
+
+    assert player.submit(lambda r: calls.append(r) or {'ok': True}, request) == {'ok': True}
+    assert calls == [request]
+    # not recorded, and the flag belongs to the outer submit, which resets it
+    assert player.requests == 0
+    assert request._cassette_handled
+    player.uninstall()
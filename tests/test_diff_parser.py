@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip('bs4')
+
+from pywikibot.diff import html_comparator
+
+import diff_parser
+
+DIFF_TABLE = """<tr>
+  <td colspan="2" class="diff-lineno">Line 21:</td>
+  <td colspan="2" class="diff-lineno">Line 21:</td>
+</tr>
+<tr>
+  <td class="diff-marker"></td>
+  <td class="diff-context diff-side-deleted"><div>{{rfcquote|text=</div></td>
+  <td class="diff-marker"></td>
+  <td class="diff-context diff-side-added"><div>{{rfcquote|text=</div></td>
+</tr>
+<tr>
+  <td class="diff-marker" data-marker="−"></td>
+  <td class="diff-deletedline diff-side-deleted"><div>'''[[Talk:Ted Cruz#rfc_76C58B0|Talk:Ted Cruz]]'''</div></td>
+  <td colspan="2" class="diff-empty diff-side-added"></td>
+</tr>
+<tr>
+  <td class="diff-marker" data-marker="−"></td>
+  <td class="diff-deletedline diff-side-deleted"><br /></td>
+  <td colspan="2" class="diff-empty diff-side-added"></td>
+</tr>
+<tr>
+  <td class="diff-marker" data-marker="−"></td>
+  <td class="diff-deletedline diff-side-deleted"><div>[https://en.wikipedia.org/w/index.php?title=X&amp;oldid=1 Here] &lt;sub&gt;[[User talk:Careless hx|talk]]&lt;/sub&gt;&nbsp;&#039;quoted&#039; &quot;x&quot; 16:04, 28 December 2020 (UTC)}}</div></td>
+  <td colspan="2" class="diff-empty diff-side-added"></td>
+</tr>
+<tr>
+  <td class="diff-marker" data-marker="−"></td>
+  <td class="diff-deletedline diff-side-deleted"><div>Should the <del class="diffchange diffchange-inline">lead</del> note</div></td>
+  <td class="diff-marker" data-marker="+"></td>
+  <td class="diff-addedline diff-side-added"><div>Should the <ins class="diffchange diffchange-inline">intro</ins> note</div></td>
+</tr>
+<tr>
+  <td>-</td>
+  <td class="diff-deletedline"><div>old style deleted line</div></td>
+  <td>+</td>
+  <td class="diff-addedline"><div>old style added line</div></td>
+</tr>
+<tr>
+  <td colspan="2" class="diff-empty diff-side-deleted"></td>
+  <td class="diff-marker" data-marker="+"></td>
+  <td class="diff-addedline diff-side-added"></td>
+</tr>
+"""
+
+
+def test_extract_diff_lines_matches_html_comparator():
+    assert diff_parser.extract_diff_lines(DIFF_TABLE) == html_comparator(DIFF_TABLE)
+
+
+def test_iter_diff_lines_keeps_document_order():
+    kinds = [kind for kind, _ in diff_parser.iter_diff_lines(DIFF_TABLE)]
+
+    assert kinds == ['deleted-context'] * 4 + ['added-context', 'deleted-context', 'added-context', 'added-context']
+
+
+def test_entities_are_unescaped():
+    deleted = diff_parser.extract_diff_lines(DIFF_TABLE)['deleted-context']
+
+    assert deleted[2].startswith('[https://en.wikipedia.org/w/index.php?title=X&oldid=1 Here] <sub>')
+    assert "\xa0'quoted' \"x\"" in deleted[2]
+
+
+def test_empty_input():
+    assert diff_parser.extract_diff_lines('') == {'deleted-context': [], 'added-context': []}
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip('bs4')
+
+from pywikibot.diff import html_comparator
+
+import diff_storage
+
+DIFF_TABLE = """<tr>
+  <td class="diff-marker"></td>
+  <td class="diff-context diff-side-deleted"><div>'''[[Talk:Donald Gary Young#rfc_F9665B6|Talk:Donald Gary Young]]'''</div></td>
+  <td class="diff-marker"></td>
+  <td class="diff-context diff-side-added"><div>'''[[Talk:Donald Gary Young#rfc_F9665B6|Talk:Donald Gary Young]]'''</div></td>
+</tr>
+<tr>
+  <td class="diff-marker" data-marker="−"></td>
+  <td class="diff-deletedline diff-side-deleted"><div>'''[[Talk:Ted Cruz#rfc_76C58B0|Talk:Ted Cruz]]'''</div></td>
+  <td colspan="2" class="diff-empty diff-side-added"></td>
+</tr>
+<tr>
+  <td class="diff-marker" data-marker="−"></td>
+  <td class="diff-deletedline diff-side-deleted"><div>Previous [https://en.wikipedia.org/w/index.php?title=Emily_VanDerWerff&amp;oldid=996643305 Here] &lt;sub&gt;[[User talk:Careless hx|talk]]&lt;/sub&gt; 16:04, 28 December 2020 (UTC)}}</div></td>
+  <td colspan="2" class="diff-empty diff-side-added"></td>
+</tr>
+<tr>
+  <td colspan="2" class="diff-empty diff-side-deleted"></td>
+  <td class="diff-marker" data-marker="+"></td>
+  <td class="diff-addedline diff-side-added"><div>'''[[Talk:Arthur Laffer#rfc_1AAC44C|Talk:Arthur Laffer]]'''</div></td>
+</tr>
+"""
+
+
+def test_compact_diff_matches_html_comparator():
+    compact = diff_storage.compact_diff(DIFF_TABLE)
+    details = {'revid': 1, 'diff_compact': compact}
+
+    assert compact['format'] == diff_storage.COMPACT_DIFF_FORMAT
+    assert len(compact['lines']) < len(DIFF_TABLE)
+    assert diff_storage.diff_lines(details) == html_comparator(DIFF_TABLE)
+
+
+def test_diff_lines_falls_back_to_raw_table():
+    assert diff_storage.diff_lines({'revid': 1, 'diff_table': DIFF_TABLE}) == html_comparator(DIFF_TABLE)
+
+
+def test_diff_text_covers_changed_lines_only():
+    text = diff_storage.diff_text({'diff_compact': diff_storage.compact_diff(DIFF_TABLE)})
+
+    assert '#rfc_76C58B0' in text
+    assert '#rfc_1AAC44C' in text
+    assert '#rfc_F9665B6' not in text
+    assert diff_storage.diff_text({'diff_table': DIFF_TABLE}) == DIFF_TABLE
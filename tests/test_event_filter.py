@@ -0,0 +1,51 @@
+import json
+
+from event_filter import EventFilter, EventRule
+
+TALK_RULE = EventRule('talk', fields={'wiki': 'enwiki', 'namespace': 1})
+AFD_RULE = EventRule('afd', fields={'wiki': 'enwiki', 'type': 'new'}, title_prefix='Wikipedia:Articles for deletion/',
+                     predicate=lambda event: '/Log/' not in event['title'])
+
+
+def test_raw_check_accepts_compact_spaced_and_escaped_json():
+    event = {'type': 'new', 'wiki': 'enwiki', 'namespace': 4, 'title': 'Wikipedia:Articles for deletion/Foo'}
+    for raw in [json.dumps(event, separators=(',', ':')), json.dumps(event, indent=2),
+                json.dumps(event).replace('/', '\\/')]:
+        assert AFD_RULE.may_match(raw.encode())
+    assert not AFD_RULE.may_match(json.dumps({**event, 'wiki': 'dewiki'}).encode())
+
+
+def test_numbers_must_match_whole():
+    assert TALK_RULE.may_match(b'{"wiki":"enwiki","namespace":1}')
+    assert not TALK_RULE.may_match(b'{"wiki":"enwiki","namespace":10}')
+    # a bytes match inside another field is caught once the event is decoded
+    assert TALK_RULE.may_match(b'{"wiki":"enwiki","namespace":0,"log_params":{"namespace":1}}')
+    assert not TALK_RULE.matches({'wiki': 'enwiki', 'namespace': 0, 'log_params': {'namespace': 1}})
+
+
+def test_filter_counts_dropped_and_decoded_events():
+    event_filter = EventFilter([AFD_RULE, TALK_RULE])
+    events = [
+        {'wiki': 'enwiki', 'namespace': 1, 'title': 'Talk:Foo'},
+        {'wiki': 'enwiki', 'namespace': 0, 'title': 'Foo'},
+        {'wiki': 'enwiki', 'type': 'new', 'namespace': 4, 'title': 'Wikipedia:Articles for deletion/Log/2024'},
+        {'wiki': 'enwiki', 'type': 'new', 'namespace': 4, 'title': 'Wikipedia:Articles for deletion/Bar'},
+    ]
+    names = []
+    for event in events:
+        raw = json.dumps(event)
+        if event_filter.accepts_raw(raw.encode()):
+            decoded = event_filter.decode(raw)
+            names.append(decoded and decoded[1].name)
+    assert names == ['talk', None, 'afd']
+    assert event_filter.stats() == {'seen': 4, 'dropped': 1, 'decoded': 3, 'rejected': 1, 'errors': 0,
+                                    'matched': {'afd': 1, 'talk': 1}}
+
+
+def test_titles_are_read_live_and_unescaped():
+    titles = {'Talk:Foo'}
+    rule = EventRule('watched', fields={'wiki': 'enwiki'}, titles=titles)
+    raw = json.dumps({'wiki': 'enwiki', 'title': 'Talk:Café/Bar'}).encode()
+    assert not rule.may_match(raw)
+    titles.add('Talk:Café/Bar')
+    assert rule.may_match(raw) and rule.matches(json.loads(raw))
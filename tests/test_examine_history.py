@@ -0,0 +1,282 @@
+import datetime
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pywikibot.exceptions import APIError
+from pywikibot.page import Revision
+from pywikibot.site import APISite
+from pywikibot.time import Timestamp
+
+import examine_history
+import handle_revision
+from history_store import HistoryStore
+from output_writers import OutputWriters
+from page_cache import PageCache
+
+BIOGRAPHIES = 'Wikipedia:Requests_for_comment/Biographies'
+POLITICS = 'Wikipedia:Requests_for_comment/Politics'
+
+
+def revision(revid):
+    return Revision(revid=revid, parentid=revid - 1, timestamp=Timestamp(2021, 1, 1, 0, revid), user='Legobot',
+                    comment=f'Removed: [[Talk:Page {revid}]].')
+
+
+class StubSite(APISite):
+    """An APISite answering loadrevisions and compare from fixed page histories, with no network."""
+
+    def __init__(self, histories):
+        self.histories = histories
+        self.loads = []
+        self.compares = []
+        self._stub_lock = threading.Lock()
+
+    def __str__(self):
+        return 'wikipedia:en'
+
+    def __repr__(self):
+        return 'StubSite()'
+
+    def loadrevisions(self, page, user=None, starttime=None, endtime=None, rvdir=None, **kwargs):
+        self.loads.append((page.page_title, starttime))
+        page._revisions = {entry.revid: entry for entry in self.histories[page.page_title]
+                           if starttime is None or entry.timestamp >= starttime}
+
+    def compare(self, old, diff, difftype='table'):
+        with self._stub_lock:
+            self.compares.append(diff)
+        return f'<tr><td class="diff-deletedline">[[Talk:Page {diff}#rfc_{diff}|Talk:Page {diff}]]</td></tr>'
+
+
+class StubPage:
+    def __init__(self, site, page_title):
+        self.site = site
+        self.page_title = page_title
+        self._revisions = None
+
+
+@pytest.fixture
+def wiki(tmp_path, monkeypatch):
+    site = StubSite({BIOGRAPHIES: [revision(1), revision(2), revision(3)], POLITICS: [revision(11), revision(12)]})
+    cache = PageCache(str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(examine_history, 'site', site)
+    monkeypatch.setattr(examine_history, 'Page', StubPage)
+    monkeypatch.setattr(examine_history, 'open_page_cache', lambda path, max_bytes: cache)
+    yield site
+    cache.close()
+
+
+def test_merged_shards_keep_revisions_the_main_store_processed(wiki, tmp_path):
+    main = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    main['RevisionRunEntryDetails-2'] = {
+        'revid': 2, 'parentid': 1, 'timestamp': Timestamp(2021, 1, 1, 0, 2), 'user': 'Legobot',
+        'comment': 'Removed: kept from the main store', 'diff_table': '', 'page_title': BIOGRAPHIES,
+        'bot_username': 'Legobot', 'year': 2021}
+    main['RevisionRunEntryId-2'] = True
+    main.sync()
+
+    stats = []
+    for page_title in (BIOGRAPHIES, POLITICS):
+        shard_path = str(tmp_path / f"{page_title.replace('/', '_')}.sqlite")
+        # as examine_history_sharded hands them out: no mark yet, and the revisions already processed
+        processed = main.processed_revids(2021, page_title)
+        stats.append(examine_history.collect_shard(2021, page_title, 'Legobot', shard_path, 2, True, None, False,
+                                                   processed))
+        examine_history.merge_shard(main, shard_path)
+        assert not os.path.exists(shard_path)
+
+    assert sorted(wiki.compares) == [1, 3, 11, 12]
+    assert [s['revisions_examined'] for s in stats] == [2, 2]
+    assert main['RevisionRunEntryDetails-2']['comment'] == 'Removed: kept from the main store'
+    assert all(main.is_processed(revid) for revid in (1, 2, 3, 11, 12))
+    assert main.get_high_water_mark(2021, BIOGRAPHIES, 'Legobot')[0] == 3
+    assert main.get_high_water_mark(2021, POLITICS, 'Legobot')[0] == 12
+    main.close()
+
+
+def removal_details(revid, year, rfc_id, question, comment='Removed'):
+    line = (f"[[Talk:Page {rfc_id}#rfc_{rfc_id}|Talk:Page {rfc_id}]] '''{question}''' "
+            f"[[User talk:Alice|talk]] 05:33, 24 December {year - 1} (UTC)}}}}")
+    return {
+        'revid': revid, 'parentid': revid - 1, 'timestamp': Timestamp(year, 1, 2, 3, revid % 60), 'user': 'Legobot',
+        'comment': f'{comment}: [[Talk:Page {rfc_id}]].', 'page_title': BIOGRAPHIES, 'bot_username': 'Legobot',
+        'year': year, 'diff_table': f'<tr><td class="diff-deletedline">{line}</td></tr>',
+    }
+
+
+def test_worker_processes_write_the_same_year_files_as_one_process(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    questions = ['Should the lead mention the pardon?', 'Is the infobox image appropriate?',
+                 'Should the article be split?', 'Is the source reliable for the date?', 'Should the lead mention the trial?']
+    rfc_ids = {}
+    revid = 100
+    for year in (2021, 2022):
+        for number, question in enumerate(questions):
+            rfc_id = f'{year}ABC{number}'
+            rfc_ids[rfc_id] = {'rfc_id': rfc_id, 'rfc_page': f'Talk:Page {rfc_id}'}
+            store[f'RevisionRunEntryDetails-{revid}'] = removal_details(revid, year, rfc_id, question, 'Added')
+            store[f'RevisionRunEntryDetails-{revid + 1}'] = removal_details(revid + 1, year, rfc_id, question)
+            revid += 2
+    store[f'RevisionRunEntryDetails-{revid}'] = {**removal_details(revid, 2022, 'X', 'q'), 'diff_table': ''}
+    store.replace_rfc_ids(rfc_ids)
+    store.sync()
+
+    outputs = []
+    for workers in (0, 2):
+        run_dir = tmp_path / f'workers-{workers}'
+        run_dir.mkdir()
+        monkeypatch.chdir(run_dir)
+        # links already printed are remembered per process
+        monkeypatch.setattr(handle_revision, 'printed_links', {})
+        file_names = {}
+        with OutputWriters() as writers:
+            handled = examine_history.stream_entry_details(store, rfc_ids, file_names, writers, workers=workers,
+                                                           chunk_size=3)
+        assert handled == 11
+        outputs.append({name: (run_dir / 'logs' / name).read_bytes() for name in sorted(os.listdir(run_dir / 'logs'))})
+    store.close()
+
+    assert sorted(outputs[0]) == ['removed_rfcs_2021.txt', 'removed_rfcs_2022.txt', 'removed_rfcs_errors_2022.txt']
+    assert outputs[1] == outputs[0]
+    assert outputs[0]['removed_rfcs_2021.txt'].count(b'* Revisions affecting this RFC:') == 5
+
+
+def test_run_times_start_when_the_run_starts():
+    started = datetime.datetime.now().timestamp()
+    run = examine_history.RevisionRun(2021, BIOGRAPHIES)
+    assert run.timestamp >= started
+    assert run.get_complete_stats()[1]['seconds_taken'] < 60
+    runs = [{'year': 2021, 'seconds_taken': 1.5, 'revisions_examined': 2}, {'year': 2021, 'seconds_taken': 2.0}]
+    assert examine_history.summarize_run_stats(runs)[2021] == {
+        'runs': 2, 'revisions_examined': 2, 'revisions_with_errors': 0, 'seconds_taken': 3.5}
+
+
+def test_list_entry_details_sums_the_runs_and_closes_the_store(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / 'rfc.sqlite')
+    store = HistoryStore(path)
+    store['RevisionRunStats-r-1-2021-x-Legobot-1'] = {'year': 2021, 'revisions_examined': 3}
+    store['RevisionRunStats-r-1-2021-y-Legobot-2'] = {'year': 2021, 'revisions_examined': 4}
+    store.close()
+    opened = []
+
+    def open_history_db():
+        opened.append(HistoryStore(path))
+        return opened[-1]
+
+    uploads = []
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(examine_history, 'open_history_db', open_history_db)
+    monkeypatch.setattr(examine_history, 'get_rfc_id_list', lambda: {})
+    monkeypatch.setattr(examine_history, 'upload_changes_to_wiki', uploads.append)
+    monkeypatch.setattr(examine_history, 'stream_entry_details', lambda *args: 0)
+
+    examine_history.list_entry_details(workers=0)
+    assert 'Year 2021: 7 revisions examined' in capsys.readouterr().out
+    assert uploads == [{}]
+
+    def killed(*args):
+        raise examine_history.KillSwitchEngaged('kill switch set after 0 revisions')
+
+    monkeypatch.setattr(examine_history, 'stream_entry_details', killed)
+    examine_history.list_entry_details(workers=0)
+    assert 'stopped by kill switch' in capsys.readouterr().out
+    assert uploads == [{}]
+    # both runs closed the store, whether they published or not
+    for store in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            store.conn.execute('SELECT 1')
+
+
+class SlowSite(StubSite):
+    """A StubSite whose compare takes a random time, counts the requests running at once, and fails for one revision."""
+
+    def __init__(self, histories, failing_revid):
+        super().__init__(histories)
+        self.failing_revid = failing_revid
+        self.running = 0
+        self.max_running = 0
+
+    def compare(self, old, diff, difftype='table'):
+        with self._stub_lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            time.sleep(random.uniform(0, 0.02))
+            if diff == self.failing_revid:
+                raise APIError('nosuchrevid', f'There is no revision with ID {diff}.')
+            return super().compare(old, diff, difftype)
+        finally:
+            with self._stub_lock:
+                self.running -= 1
+
+
+def test_diff_tables_come_in_revision_order_with_a_bounded_number_in_flight(wiki, monkeypatch):
+    site = SlowSite({}, failing_revid=7)
+    monkeypatch.setattr(examine_history, 'site', site)
+    random.seed(1)
+    results = []
+    # more threads than the limit, so only fetch_diff_tables keeps the requests down
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        for entry, future in examine_history.fetch_diff_tables([revision(revid) for revid in range(1, 31)], executor, 4):
+            try:
+                results.append((entry.revid, future.result()))
+            except APIError:
+                results.append((entry.revid, None))
+
+    assert [revid for revid, _ in results] == list(range(1, 31))
+    assert all(f'#rfc_{revid}|' in diff_table for revid, diff_table in results if revid != 7)
+    assert dict(results)[7] is None
+    assert 1 < site.max_running <= 4
+
+
+def test_a_failed_compare_is_retried_by_the_next_run(wiki, monkeypatch, tmp_path, capsys):
+    site = SlowSite({BIOGRAPHIES: [revision(revid) for revid in range(1, 11)]}, failing_revid=7)
+    monkeypatch.setattr(examine_history, 'site', site)
+    db = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        stats = examine_history.collect_page_history(db, executor, 2021, BIOGRAPHIES, 'Legobot', concurrency=3)
+
+        assert 'Error saving revision 7: nosuchrevid' in capsys.readouterr().out
+        assert stats['revisions_examined'] == 9
+        assert [revid for revid in range(1, 11) if not db.is_processed(revid)] == [7]
+        assert db.get_high_water_mark(2021, BIOGRAPHIES, 'Legobot')[0] == 6
+
+        site.failing_revid = None
+        examine_history.collect_page_history(db, executor, 2021, BIOGRAPHIES, 'Legobot', concurrency=3)
+    assert site.compares.count(7) == 1 and site.compares.count(8) == 1
+    assert all(db.is_processed(revid) for revid in range(1, 11))
+    assert db.get_high_water_mark(2021, BIOGRAPHIES, 'Legobot')[0] == 10
+    db.close()
+
+
+def test_a_resumed_run_fetches_only_revisions_not_processed_yet(wiki, tmp_path):
+    db = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        examine_history.collect_page_history(db, executor, 2021, BIOGRAPHIES, 'Legobot', concurrency=2)
+        assert wiki.loads == [(BIOGRAPHIES, Timestamp(2021, 1, 1))]
+        assert sorted(wiki.compares) == [1, 2, 3]
+        assert db.get_high_water_mark(2021, BIOGRAPHIES, 'Legobot') == (3, '2021-01-01T00:03:00Z')
+
+        # the bot edited the page again: 4 was collected by a shard, 6 by an earlier run, 5 is new
+        wiki.histories[BIOGRAPHIES] += [revision(4), revision(5), revision(6)]
+        db['RevisionRunEntryDetails-6'] = {
+            'revid': 6, 'parentid': 5, 'timestamp': Timestamp(2021, 1, 1, 0, 6), 'user': 'Legobot',
+            'comment': 'Removed: [[Talk:Page 6]].', 'diff_table': '', 'page_title': BIOGRAPHIES,
+            'bot_username': 'Legobot', 'year': 2021}
+        db['RevisionRunEntryId-6'] = True
+        db.sync()
+        wiki.compares.clear()
+        stats = examine_history.collect_page_history(db, executor, 2021, BIOGRAPHIES, 'Legobot', concurrency=2,
+                                                     processed_elsewhere=frozenset({4}))
+
+    # loaded from the mark's timestamp, which still holds revision 3, but diffed only the new revision
+    assert wiki.loads[-1] == (BIOGRAPHIES, Timestamp(2021, 1, 1, 0, 3))
+    assert wiki.compares == [5]
+    assert stats['revisions_examined'] == 1
+    assert db.get_high_water_mark(2021, BIOGRAPHIES, 'Legobot') == (6, '2021-01-01T00:06:00Z')
+    db.close()
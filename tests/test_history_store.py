@@ -0,0 +1,222 @@
+import shelve
+from datetime import datetime
+
+import history_store
+from history_store import HistoryStore
+
+
+class DummyRun:
+    def __init__(self, year, page_title):
+        self.year = year
+        self.page_title = page_title
+        self.bot_username = 'Legobot'
+        self.timestamp = 1700000000.0
+        self.revisions_examined = 3
+
+
+def make_details(revid, year=2021, page_title='Wikipedia:Requests_for_comment/Biographies'):
+    return {
+        'revid': revid,
+        'parentid': revid - 1,
+        'timestamp': datetime(year, 1, 14, 3, 1, 30),
+        'user': 'Legobot',
+        'comment': 'Removed: [[Talk:Ted Cruz]].',
+        'diff_table': '<tr><td class="diff-deletedline">[[Talk:Ted Cruz#rfc_76C58B0|Talk:Ted Cruz]]</td></tr>',
+        'page_title': page_title,
+        'bot_username': 'Legobot',
+        'year': year,
+    }
+
+
+def test_shelve_style_round_trip(tmp_path):
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    run = DummyRun(2021, 'Wikipedia:Requests_for_comment/Biographies')
+    store['RevisionRunStart-r-1-2021-x-Legobot-1'] = run
+    store['RevisionRunStats-r-1-2021-x-Legobot-1'] = {'year': 2021, 'revisions_examined': 3}
+    store['RevisionRunEntryId-100'] = False
+    store['RevisionRunEntryDetails-100'] = make_details(100)
+    store['RevisionRunEntryId-100'] = True
+    store['Other-key'] = [1, 2]
+    store.sync()
+
+    assert store['RevisionRunStart-r-1-2021-x-Legobot-1'].revisions_examined == 3
+    assert store['RevisionRunStats-r-1-2021-x-Legobot-1']['revisions_examined'] == 3
+    assert store['RevisionRunEntryId-100'] is True
+    assert store['RevisionRunEntryDetails-100']['comment'] == 'Removed: [[Talk:Ted Cruz]].'
+    assert store['Other-key'] == [1, 2]
+    assert 'RevisionRunEntryDetails-101' not in store
+    assert sorted(store.keys()) == sorted([
+        'RevisionRunStart-r-1-2021-x-Legobot-1',
+        'RevisionRunStats-r-1-2021-x-Legobot-1',
+        'RevisionRunEntryId-100',
+        'RevisionRunEntryDetails-100',
+        'Other-key',
+    ])
+    assert list(store.keys('RevisionRunEntryDetails-')) == ['RevisionRunEntryDetails-100']
+    store.close()
+
+
+def test_processed_flag_without_details(tmp_path):
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    store['RevisionRunEntryId-7'] = False
+
+    assert store['RevisionRunEntryId-7'] is False
+    assert not store.is_processed(7)
+    assert list(store.keys('RevisionRunEntryDetails-')) == []
+    store.close()
+
+
+def test_iter_revisions_filters_and_orders(tmp_path):
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    store['RevisionRunEntryDetails-30'] = make_details(30, year=2022)
+    store['RevisionRunEntryDetails-10'] = make_details(10)
+    store['RevisionRunEntryDetails-20'] = make_details(20, page_title='Wikipedia:Requests_for_comment/Unsorted')
+
+    assert [d['revid'] for d in store.iter_revisions()] == [10, 20, 30]
+    assert [d['revid'] for d in store.iter_revisions(year=2021)] == [10, 20]
+    assert [d['revid'] for d in store.iter_revisions(page_title='Wikipedia:Requests_for_comment/Unsorted')] == [20]
+    assert store.revids() == [10, 20, 30]
+    assert store.revids(year=2021, comment_contains='removed') == [10, 20]
+    store.close()
+
+
+def test_migrate_shelve(tmp_path):
+    shelve_path = str(tmp_path / 'rfc.db')
+    with shelve.open(shelve_path) as legacy:
+        legacy['RevisionRunStats-r-1-2021-x-Legobot-1'] = {'year': 2021, 'revisions_examined': 1}
+        legacy['RevisionRunEntryId-5'] = True
+        legacy['RevisionRunEntryDetails-5'] = make_details(5)
+
+    assert history_store.legacy_shelve_exists(shelve_path)
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    copied = history_store.migrate_shelve(shelve_path, store)
+
+    assert copied == 3
+    assert store[history_store.MIGRATED_FROM_KEY] == shelve_path
+    assert store['RevisionRunEntryDetails-5']['revid'] == 5
+    assert store.is_processed(5)
+    assert [key for key, _ in store.iter_run_stats(year=2021)] == ['RevisionRunStats-r-1-2021-x-Legobot-1']
+    store.close()
+
+
+def test_checkpoint_commits_every_n_units(tmp_path):
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'), checkpoint_every=3)
+    committed = []
+    for revid in range(1, 7):
+        store[f'RevisionRunEntryId-{revid}'] = False
+        store[f'RevisionRunEntryDetails-{revid}'] = make_details(revid)
+        store[f'RevisionRunEntryId-{revid}'] = True
+        committed.append(store.checkpoint())
+
+    assert committed == [False, False, True, False, False, True]
+    assert not store.conn.in_transaction
+    store.close()
+
+
+def test_uncommitted_window_is_lost_as_a_whole(tmp_path):
+    path = str(tmp_path / 'rfc.sqlite')
+    store = HistoryStore(path, checkpoint_every=2)
+    for revid in (1, 2, 3):
+        store[f'RevisionRunEntryId-{revid}'] = False
+        store[f'RevisionRunEntryDetails-{revid}'] = make_details(revid)
+        store[f'RevisionRunEntryId-{revid}'] = True
+        store.checkpoint()
+    # simulate a crash: drop the connection without committing
+    store.conn.rollback()
+    store.conn.close()
+
+    reopened = HistoryStore(path)
+    assert [d['revid'] for d in reopened.iter_revisions()] == [1, 2]
+    assert 'RevisionRunEntryId-3' not in reopened
+    reopened.close()
+
+
+def test_high_water_marks(tmp_path):
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    page_title = 'Wikipedia:Requests_for_comment/Biographies'
+
+    assert store.get_high_water_mark(2021, page_title, 'Legobot') is None
+    store.set_high_water_mark(2021, page_title, 'Legobot', 100, datetime(2021, 1, 14, 3, 1, 30))
+    store.set_high_water_mark(2021, page_title, 'Legobot', 120, datetime(2021, 2, 1, 0, 0, 0))
+
+    assert store.get_high_water_mark(2021, page_title, 'Legobot') == (120, '2021-02-01T00:00:00')
+    assert store.get_high_water_mark(2022, page_title, 'Legobot') is None
+    assert store.get_high_water_mark(2021, page_title, 'RFC bot') is None
+    store.close()
+
+
+def test_merge_from_shard(tmp_path):
+    page_title = 'Wikipedia:Requests_for_comment/Biographies'
+    main = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    main['RevisionRunEntryDetails-1'] = make_details(1)
+    main['RevisionRunEntryId-1'] = True
+    main.set_high_water_mark(2021, page_title, 'Legobot', 1, datetime(2021, 1, 1))
+    main.sync()
+
+    shard_path = str(tmp_path / 'shard.sqlite')
+    shard = HistoryStore(shard_path)
+    # a failed retry of revision 1 must not clobber the processed copy
+    shard['RevisionRunEntryId-1'] = False
+    shard['RevisionRunEntryDetails-2'] = make_details(2)
+    shard['RevisionRunEntryId-2'] = True
+    shard['RevisionRunStats-r-1-2021-x-Legobot-2'] = {'year': 2021, 'revisions_examined': 1}
+    shard.set_high_water_mark(2021, page_title, 'Legobot', 2, datetime(2021, 1, 2))
+    shard.close()
+
+    main.merge_from(shard_path)
+
+    assert main.is_processed(1)
+    assert main.is_processed(2)
+    assert [d['revid'] for d in main.iter_revisions()] == [1, 2]
+    assert main.get_high_water_mark(2021, page_title, 'Legobot')[0] == 2
+    assert [key for key, _ in main.iter_run_stats()] == ['RevisionRunStats-r-1-2021-x-Legobot-2']
+    main.close()
+
+
+def test_rfc_index_is_maintained_on_save(tmp_path):
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    added = make_details(1)
+    added['comment'] = 'Added: [[Talk:Ted Cruz]].'
+    added['timestamp'] = datetime(2020, 12, 30)
+    store['RevisionRunEntryDetails-1'] = added
+    store['RevisionRunEntryDetails-2'] = make_details(2)
+
+    revisions = store.revisions_for_rfc('76C58B0')
+    assert [r['revid'] for r in revisions] == [1, 2]
+    assert [r['comment_kw'] for r in revisions] == ['added', 'removed']
+    assert [r['revid'] for r in store.revisions_for_rfc('76C58B0', comment_kw='removed')] == [2]
+    assert store.revisions_for_rfc('1AAC44C') == []
+    assert [(rfc_id, revid) for rfc_id, revid, *_ in store.iter_rfc_index()] == [('76C58B0', 1), ('76C58B0', 2)]
+
+    # rewriting a revision replaces its index rows
+    changed = make_details(2)
+    changed['diff_table'] = '<tr><td class="diff-deletedline">[[Talk:Arthur Laffer#rfc_1AAC44C|x]]</td></tr>'
+    store['RevisionRunEntryDetails-2'] = changed
+    assert [r['revid'] for r in store.revisions_for_rfc('76C58B0')] == [1]
+    assert [r['revid'] for r in store.revisions_for_rfc('1AAC44C')] == [2]
+    store.close()
+
+
+def test_rebuild_rfc_index(tmp_path):
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    store['RevisionRunEntryDetails-5'] = make_details(5)
+    store.conn.execute('DELETE FROM rfc_revisions')
+
+    assert store.rebuild_rfc_index() == 1
+    assert [r['revid'] for r in store.revisions_for_rfc('76C58B0')] == [5]
+    assert history_store.RFC_INDEX_KEY in store
+    store.close()
+
+
+def test_processed_revids_after_mark(tmp_path):
+    page_title = 'Wikipedia:Requests_for_comment/Biographies'
+    store = HistoryStore(str(tmp_path / 'rfc.sqlite'))
+    for revid in (1, 2, 3, 4):
+        store[f'RevisionRunEntryDetails-{revid}'] = make_details(revid)
+        store[f'RevisionRunEntryId-{revid}'] = revid != 3
+    store['RevisionRunEntryDetails-5'] = make_details(5, year=2022)
+    store['RevisionRunEntryId-5'] = True
+
+    assert store.processed_revids(2021, page_title, after_revid=1) == [2, 4]
+    assert store.processed_revids(2022, page_title) == [5]
+    store.close()
@@ -0,0 +1,76 @@
+import threading
+
+import pywikibot
+
+import kill_page
+from kill_page import KillSwitchWatcher
+
+
+class FakePage:
+    """A kill page whose latest revision is set by the test; counts the texts read."""
+
+    revid = 1
+    text = 'Bot running'
+    text_reads = 0
+
+    def __init__(self, site, title):
+        self.site = site
+        self.title = title
+
+    def exists(self):
+        return FakePage.revid is not None
+
+    @property
+    def latest_revision_id(self):
+        return FakePage.revid
+
+
+def read_text(cache, page):
+    FakePage.text_reads += 1
+    return FakePage.text
+
+
+def stub_wiki(monkeypatch, revid, text):
+    monkeypatch.setattr(pywikibot, 'Page', FakePage)
+    monkeypatch.setattr(kill_page, 'open_page_cache', lambda path, max_bytes: None)
+    monkeypatch.setattr(kill_page, 'cached_page_text', read_text)
+    monkeypatch.setattr(FakePage, 'revid', revid)
+    monkeypatch.setattr(FakePage, 'text', text)
+    monkeypatch.setattr(FakePage, 'text_reads', 0)
+
+
+def test_poll_reads_the_text_only_when_the_revision_changes(monkeypatch):
+    stub_wiki(monkeypatch, 1, 'Bot running')
+    watcher = KillSwitchWatcher('User:Test/kill', interval=60)
+
+    assert not watcher.poll()
+    assert not watcher.poll()
+    assert (watcher.polls, watcher.text_reads, FakePage.text_reads, watcher.last_revid) == (2, 1, 1, 1)
+
+    FakePage.revid, FakePage.text = 2, 'Still running'
+    assert not watcher.poll()
+    assert (watcher.text_reads, FakePage.text_reads, watcher.last_revid) == (2, 2, 2)
+
+    # a deleted page asks nothing, and its next revision is read whatever its id
+    FakePage.revid = None
+    assert not watcher.poll()
+    assert watcher.last_revid is None
+    FakePage.revid, FakePage.text = 2, 'Please KILL the bot'
+    assert watcher.poll()
+    assert FakePage.text_reads == 3
+
+
+def test_watcher_sets_the_kill_switch(monkeypatch):
+    stub_wiki(monkeypatch, 1, 'Bot running')
+    monkeypatch.setattr(kill_page, 'kill_switch', threading.Event())
+    watcher = KillSwitchWatcher('User:Test/kill', interval=60)
+    watcher.start()
+    try:
+        FakePage.revid, FakePage.text = 2, 'kill'
+        watcher.check_now()
+        watcher.join(5)
+        assert not watcher.is_alive()
+        assert kill_page.kill_requested()
+        assert watcher.last_revid == 2
+    finally:
+        watcher.stop()
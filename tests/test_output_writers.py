@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from output_writers import PARTIAL_SUFFIX, OutputWriters
+
+
+def test_one_handle_per_path_and_rename_on_commit(tmp_path):
+    path = str(tmp_path / 'logs' / 'removed_rfcs_2021.txt')
+    writers = OutputWriters()
+    first = writers.open(path)
+    first.write('=== a ===\n')
+    assert writers.open(path) is first
+    writers.open(path).write('=== b ===\n')
+
+    assert not os.path.exists(path)
+    assert writers.commit() == [path]
+    assert not os.path.exists(path + PARTIAL_SUFFIX)
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == '=== a ===\n=== b ===\n'
+
+
+def test_failed_run_keeps_previous_output(tmp_path):
+    path = str(tmp_path / 'removed_rfcs_2021.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('complete\n')
+
+    with pytest.raises(RuntimeError):
+        with OutputWriters() as writers:
+            writers.open(path).write('half written\n')
+            raise RuntimeError('interrupted')
+
+    assert not os.path.exists(path + PARTIAL_SUFFIX)
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == 'complete\n'
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+from page_cache import PageCache, cached_compare, cached_page_text, diff_key, text_key
+
+
+class CompareCountingSite:
+    def __init__(self):
+        self.requests = 0
+
+    def compare(self, old, diff, difftype):
+        self.requests += 1
+        return f"<tr><td>{old}-{diff}-{difftype}</td></tr>"
+
+    def __str__(self):
+        return 'wikipedia:en'
+
+
+def test_values_survive_reopening_and_are_stored_once(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    with PageCache(path) as cache:
+        assert cache.get('text|wikipedia:en|Talk:A|1') is None
+        cache.put('text|wikipedia:en|Talk:A|1', 'same text é')
+        cache.put('text|wikipedia:en|Talk:B|7', 'same text é')
+        assert cache.conn.execute('SELECT COUNT(*) FROM blobs').fetchone()[0] == 1
+    with PageCache(path) as cache:
+        assert cache.get('text|wikipedia:en|Talk:A|1') == 'same text é'
+        assert cache.stats()['entries'] == 2
+        assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    values = {key: f"{key} {'x' * 200} {index}" * 20 for index, key in enumerate('abc')}
+    with PageCache(str(tmp_path / 'cache.sqlite')) as probe:
+        probe.put('a', values['a'])
+        size = probe.total_bytes
+    with PageCache(str(tmp_path / 'small.sqlite'), max_bytes=int(size * 2.5)) as cache:
+        cache.put('a', values['a'])
+        cache.put('b', values['b'])
+        cache.get('a')
+        cache.put('c', values['c'])
+        assert 'b' not in cache
+        assert cache.get('a') == values['a'] and cache.get('c') == values['c']
+        assert cache.evictions == 1 and cache.total_bytes <= cache.max_bytes
+
+
+def test_cached_compare_asks_the_wiki_once(tmp_path):
+    site = CompareCountingSite()
+    with PageCache(str(tmp_path / 'cache.sqlite')) as cache:
+        first = cached_compare(cache, site, 10, 11)
+        assert cached_compare(cache, site, 10, 11) == first
+        assert site.requests == 1
+        assert diff_key(site, 10, 11) in cache
+
+
+class EditedPage:
+    """A page whose info was loaded at one revision while the wiki already has a newer one."""
+
+    site = 'wikipedia:en'
+
+    def __init__(self, info_revid, revid, text):
+        self.latest_revision_id = info_revid
+        self.revision = SimpleNamespace(revid=revid, text=text)
+        self.revision_reads = 0
+
+    def title(self):
+        return 'Talk:A'
+
+    @property
+    def latest_revision(self):
+        self.revision_reads += 1
+        return self.revision
+
+
+def test_page_text_is_cached_under_the_revision_it_was_read_from(tmp_path):
+    with PageCache(str(tmp_path / 'cache.sqlite')) as cache:
+        page = EditedPage(5, 6, 'edited text')
+        assert cached_page_text(cache, page) == 'edited text'
+        assert text_key(page.site, 'Talk:A', 5) not in cache
+        assert cache.get(text_key(page.site, 'Talk:A', 6)) == 'edited text'
+
+        current = EditedPage(6, 6, 'not read')
+        assert cached_page_text(cache, current) == 'edited text'
+        assert current.revision_reads == 0
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+
+from pipeline_metrics import LatencyHistogram, MeteredQueue, PipelineMetrics
+
+
+class StepClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_histogram_quantiles_use_bucket_bounds():
+    histogram = LatencyHistogram()
+    for seconds in [0.002] * 9 + [20.0]:
+        histogram.record(seconds)
+    summary = histogram.as_dict()
+    assert summary['p50_seconds'] == 0.005
+    assert summary['p95_seconds'] == summary['max_seconds'] == 20.0
+    assert summary['histogram'] == {'<=0.005': 9, '>10.0': 1}
+
+
+def test_timed_stage_counts_items_and_errors():
+    clock = StepClock()
+    metrics = PipelineMetrics(clock)
+
+    def work(seconds):
+        clock.now += seconds
+        if seconds > 1:
+            raise ValueError(seconds)
+        return seconds
+
+    assert metrics.timed('fetch', work, 0.5) == 0.5
+    with pytest.raises(ValueError):
+        metrics.timed('fetch', work, 1.5)
+    stage = json.loads(metrics.to_json())['stages']['fetch']
+    assert (stage['items'], stage['errors'], stage['items_per_second']) == (2, 1, 1.0)
+
+
+def test_queue_records_wait_and_blocked_time():
+    clock = StepClock()
+    metrics = PipelineMetrics(clock)
+
+    async def run():
+        queue = MeteredQueue('sections', 1, metrics)
+        await queue.put('a')
+        blocked = asyncio.create_task(queue.put('b'))
+        await asyncio.sleep(0)
+        clock.now = 2.0
+        assert await queue.get() == 'a'
+        await blocked
+        clock.now = 3.0
+        assert queue.get_nowait() == 'b'
+
+    asyncio.run(run())
+    summary = metrics.summary()['queues']['sections']
+    assert summary['producer_blocked_seconds'] == 2.0 and summary['puts_blocked_over_1ms'] == 1
+    # 'a' waited from 0 to 2, 'b' from when it got in at 2 until 3
+    assert summary['wait']['total_seconds'] == 3.0 and summary['max_depth'] == 1
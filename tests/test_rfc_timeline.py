@@ -0,0 +1,56 @@
+from rfc_timeline import EMPTY_TIMELINE, build_timelines, sorted_timeline, timeline_from_rows
+
+SHORTCUTS = {
+    'Wikipedia:Requests_for_comment/Biographies': 'bio',
+    'Wikipedia:Requests_for_comment/Unsorted': 'unsorted',
+}
+
+
+def shortcut_of(page_title):
+    return SHORTCUTS.get(page_title, page_title)
+
+
+def row(revid, timestamp, page_title='Wikipedia:Requests_for_comment/Biographies', comment_kw='added'):
+    return {'revid': revid, 'timestamp': timestamp, 'page_title': page_title, 'comment_kw': comment_kw}
+
+
+def test_first_and_last_per_list_page():
+    timeline = timeline_from_rows([
+        row(1, '2021-01-01T00:00:00'),
+        row(2, '2021-01-02T00:00:00', 'Wikipedia:Requests_for_comment/Unsorted'),
+        row(3, '2021-01-03T00:00:00', comment_kw='maintenance'),
+        row(4, '2021-01-04T00:00:00', comment_kw='removed'),
+    ], shortcut_of)
+
+    assert len(timeline) == 4
+    assert timeline.first['bio'].revid == 1
+    assert timeline.last['bio'].revid == 4
+    assert timeline.first['unsorted'] is timeline.last['unsorted']
+    assert [entry.revid for entry in timeline.first_and_last] == [1, 2, 4]
+    assert timeline.last['bio'].keywords == 'removed'
+    assert timeline.diff_templates()[0] == '{{Diff|Wikipedia:Requests_for_comment/Biographies|prev|1|bio 1}}'
+
+
+def test_sorted_timeline_from_revision_details():
+    timeline = sorted_timeline([
+        {'revid': 9, 'timestamp': '2021-02-01T00:00:00', 'page_title': 'Wikipedia:Requests_for_comment/Biographies',
+         'comment': 'Removed: [[Talk:Ted Cruz]].'},
+        {'revid': 5, 'timestamp': '2021-01-01T00:00:00', 'page_title': 'Wikipedia:Requests_for_comment/Biographies',
+         'comment': 'Added: [[Talk:Ted Cruz]].'},
+    ], shortcut_of)
+
+    assert [(entry.revid, entry.keywords) for entry in timeline.entries] == [(5, 'added'), (9, 'removed')]
+    assert EMPTY_TIMELINE.diff_templates() == []
+
+
+def test_build_timelines_groups_index_rows():
+    index_rows = [
+        ('1AAC44C', 7, '2021-01-01T00:00:00', 'Wikipedia:Requests_for_comment/Unsorted', 'added'),
+        ('76C58B0', 3, '2020-12-30T00:00:00', 'Wikipedia:Requests_for_comment/Biographies', 'added'),
+        ('76C58B0', 8, '2021-01-14T00:00:00', 'Wikipedia:Requests_for_comment/Biographies', 'removed'),
+    ]
+
+    timelines = build_timelines(index_rows, shortcut_of)
+    assert sorted(timelines) == ['1AAC44C', '76C58B0']
+    assert [entry.revid for entry in timelines['76C58B0'].first_and_last] == [3, 8]
+    assert list(build_timelines(index_rows, shortcut_of, rfc_ids={'76C58B0': {}})) == ['76C58B0']
@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import rfc_watcher
+from rfc_watcher import RfcWatcher
+from sse_client import SseEvent
+
+LISTS = ['Wikipedia:Requests for comment/Biographies', 'Wikipedia:Requests for comment/Politics']
+
+
+class FakeWiki:
+    """List pages and RfC sections standing in for the wiki, recording every read and edit."""
+
+    def __init__(self):
+        self.lists = {LISTS[0]: [('Talk:A', 'AAA0001'), ('Talk:B', 'BBB0001')],
+                      LISTS[1]: [('Talk:B', 'BBB0001'), ('Talk:B', 'BBB0002')]}
+        self.sections = {'Talk:A': {'AAA0001': 'a1'}, 'Talk:B': {'BBB0001': 'b1', 'BBB0002': 'c1'}}
+        self.reads = []
+        self.digests = {}
+        self.published = []
+
+    def list_open_rfcs(self, list_title):
+        self.reads.append(list_title)
+        return [(page_title, rfc_id, f'[[{page_title}#rfc_{rfc_id}]]') for page_title, rfc_id in self.lists[list_title]]
+
+    def count_changed_sections(self, page_title, digests):
+        self.reads.append(page_title)
+        self.digests[page_title] = dict(digests)
+        changed = {}
+        for rfc_id, digest in digests.items():
+            text = self.sections[page_title].get(rfc_id)
+            if text is None:
+                changed[rfc_id] = (None, None)
+            elif text != digest:
+                changed[rfc_id] = (text, {'Alice': (len(text), 10)})
+        return changed
+
+    def publish_report(self, content, page_title):
+        self.published.append(content)
+
+    def watcher(self, debounce=0.05):
+        return RfcWatcher(LISTS, debounce=debounce, page_title='User:Test/RfcEditStats',
+                          list_open_rfcs=self.list_open_rfcs, count_changed_sections=self.count_changed_sections,
+                          publish_report=self.publish_report)
+
+
+def edit(title):
+    return SseEvent('1', 'message', json.dumps({'wiki': 'enwiki', 'type': 'edit', 'title': title}))
+
+
+def test_relist_drops_closed_rfcs():
+    wiki = FakeWiki()
+
+    async def run():
+        watcher = wiki.watcher()
+        await watcher.scan()
+        assert sorted(watcher.counted) == [('Talk:A', 'AAA0001'), ('Talk:B', 'BBB0001'), ('Talk:B', 'BBB0002')]
+        assert 'Talk:A' in watcher.titles
+        watcher.report_changed.clear()
+
+        wiki.lists[LISTS[0]] = [('Talk:B', 'BBB0001')]
+        await watcher.relist(LISTS[0])
+        return watcher
+
+    watcher = asyncio.run(run())
+    assert sorted(watcher.counted) == [('Talk:B', 'BBB0001'), ('Talk:B', 'BBB0002')]
+    assert watcher.report_changed.is_set()
+    # edits to the page of the closed RfC are no longer let through
+    assert 'Talk:A' not in watcher.titles and 'Talk:B' in watcher.titles
+
+
+def test_refresh_page_skips_unchanged_sections():
+    wiki = FakeWiki()
+
+    async def run():
+        watcher = wiki.watcher()
+        await watcher.scan()
+        watcher.report_changed.clear()
+        recounts = watcher.recounts
+
+        await watcher.refresh_page('Talk:B')
+        assert wiki.digests['Talk:B'] == {'BBB0001': 'b1', 'BBB0002': 'c1'}
+        assert watcher.recounts == recounts and not watcher.report_changed.is_set()
+
+        wiki.sections['Talk:B']['BBB0002'] = 'c22'
+        await watcher.refresh_page('Talk:B')
+        assert watcher.recounts == recounts + 1 and watcher.report_changed.is_set()
+        return watcher
+
+    watcher = asyncio.run(run())
+    assert watcher.counted[('Talk:B', 'BBB0002')][1].user_counts == {'Alice': (3, 10)}
+    assert watcher.counted[('Talk:B', 'BBB0001')][0] == 'b1'
+
+
+def test_edits_to_a_page_are_coalesced():
+    wiki = FakeWiki()
+
+    async def run():
+        watcher = wiki.watcher()
+        await watcher.scan()
+        wiki.reads.clear()
+        stop = asyncio.Event()
+        applier = asyncio.create_task(watcher.apply_edits(stop))
+        for title in ['Talk:B', 'Talk:B', 'Talk:Unwatched', 'Talk:B']:
+            raw = edit(title).data.encode()
+            if watcher.event_filter.accepts_raw(raw):
+                await watcher.handle_event(edit(title))
+        await asyncio.sleep(0.05)
+        stop.set()
+        await applier
+        return watcher
+
+    watcher = asyncio.run(run())
+    assert wiki.reads == ['Talk:B']
+    assert watcher.event_filter.stats()['dropped'] == 1
+    assert not watcher.pending
+
+
+def test_report_is_published_once_per_debounce_and_not_when_unchanged(monkeypatch):
+    monkeypatch.setattr(rfc_watcher, 'DRY_RUN', False)
+    wiki = FakeWiki()
+
+    async def run():
+        watcher = wiki.watcher(debounce=0.1)
+        await watcher.scan()
+        await watcher.publish()
+        assert len(wiki.published) == 1
+
+        stop = asyncio.Event()
+        publisher = asyncio.create_task(watcher.publish_changes(stop))
+        # two changes within the debounce interval go into one edit
+        wiki.sections['Talk:A']['AAA0001'] = 'a22'
+        await watcher.refresh_page('Talk:A')
+        await asyncio.sleep(0.03)
+        wiki.sections['Talk:B']['BBB0001'] = 'b333'
+        await watcher.refresh_page('Talk:B')
+        await asyncio.sleep(0.15)
+        assert len(wiki.published) == 2
+        assert wiki.published[-1] == watcher.draft()
+        assert ' | 3 \n' in wiki.published[-1] and ' | 4 \n' in wiki.published[-1]
+
+        # a change that leaves the report as it was is not published again
+        watcher.report_changed.set()
+        await asyncio.sleep(0.15)
+        stop.set()
+        await publisher
+        return watcher
+
+    watcher = asyncio.run(run())
+    assert len(wiki.published) == 2
+    assert watcher.publishes == 2
@@ -0,0 +1,56 @@
+import mwparserfromhell
+
+from section_index import (SectionIndexCache, parser_section_index, regex_section_index,
+                           scanner_section_index)
+
+PAGE = """Lead mentioning rfc_aaa1111.
+== First RfC ==
+{{rfc|pol|rfcid=AAA1111}}
+Question one?
+=== Survey ===
+* Yes, see [[#rfc_BBB2222|the other RfC]].
+== Second RfC ==
+{{rfc|soc|rfcid=BBB2222}}
+Question two?
+== Unrelated ==
+Nothing here.
+"""
+
+
+def linear_scan(text, rfc_id):
+    for section in mwparserfromhell.parse(text).get_sections(include_lead=False):
+        if rfc_id in str(section).lower():
+            return str(section)
+    return None
+
+
+def test_index_matches_linear_scan():
+    parser_index = parser_section_index(PAGE)
+    scanner_index = scanner_section_index(PAGE)
+    # ids from the {{rfc}} templates and anchors are indexed up front
+    assert set(parser_index.rfc_sections) == {'aaa1111', 'bbb2222'}
+    for rfc_id in ['aaa1111', 'bbb2222', 'survey', 'nothing', 'lead', 'ccc3333']:
+        expected = linear_scan(PAGE, rfc_id)
+        section = parser_index.section(rfc_id)
+        assert (str(section) if section is not None else None) == expected
+        assert scanner_index.section(rfc_id) == expected
+    # bbb2222 is first mentioned in the survey of the first RfC
+    assert parser_index.section('bbb2222').startswith('== First RfC ==')
+    assert isinstance(parser_index.section('aaa1111'), mwparserfromhell.wikicode.Wikicode)
+
+
+def test_regex_fallback_builds_the_same_index():
+    index = regex_section_index(PAGE)
+    assert index.spans == parser_section_index(PAGE).spans
+    assert index.section('nothing') == "== Unrelated ==\nNothing here.\n"
+
+
+def test_cache_shares_index_per_revision():
+    cache = SectionIndexCache(max_pages=2)
+    first = cache.get('Talk:A', 1, PAGE)
+    assert cache.get('Talk:A', 1, PAGE) is first
+    assert cache.get('Talk:A', 2, PAGE) is not first
+    cache.get('Talk:B', 1, PAGE)
+    # the least recently used revision was dropped
+    assert ('Talk:A', 1) not in cache.indexes
+    assert (cache.hits, cache.misses) == (1, 3)
@@ -0,0 +1,93 @@
+import ast
+import re
+from pathlib import Path
+
+import mwparserfromhell
+
+from calculate_statistics import calculate_statistics
+from signature_scanner import find_section, iter_top_level_nodes, needs_parser, scan_signatures
+
+ROOT = Path(__file__).parent.parent
+
+SECTION = """== RfC on the lead ==
+{{rfc|pol|rfcid=ABD0AB3}}
+Should the lead mention the pardon? [[User:Alice|Alice]] ([[User talk:Alice|talk]]) 01:02, 30 December 2025 (UTC)
+* '''Yes''' per [[WP:DUE]], {{tq|it is widely covered}}. [[User talk:Bob]] 02:03, 30 December 2025 (UTC)
+*: ''Not'' convinced.<ref>[https://example.org source]</ref> [[User talk:Alice|talk]] 03:04, 31 December 2025 (UTC)
+* No. Unsigned comment 04:05, 31 December 2025 (UTC)
+"""
+
+
+def test_same_statistics_as_parser():
+    expected = calculate_statistics(mwparserfromhell.parse(SECTION))
+    assert scan_signatures(SECTION) == expected
+    assert calculate_statistics(SECTION, engine='scanner') == expected
+    assert list(expected) == ['Alice', 'Bob'] and expected['Alice'][0] == 2
+
+
+def real_rfc_texts():
+    """rfc_section.txt, and each entry of old-rfc.txt together with the RfC statement it quotes."""
+    section = (ROOT / 'rfc_section.txt').read_text(encoding='utf-8')
+    texts = [ast.literal_eval(section) if section[:1] in ('"', "'") else section]
+    for entry in re.split(r'(?m)^(?=== )', (ROOT / 'old-rfc.txt').read_text(encoding='utf-8')):
+        if entry.startswith('== '):
+            texts.append(entry)
+            if '{{rfcquote|text=' in entry:
+                texts.append(entry[entry.index('{{rfcquote|text=') + 16:entry.rstrip().rindex('}}')])
+    return texts
+
+
+def parser_nodes(text):
+    return [str(node) for node in mwparserfromhell.parse(text).nodes
+            if not isinstance(node, mwparserfromhell.nodes.Text)]
+
+
+def test_same_top_level_nodes_as_parser():
+    texts = [
+        SECTION,
+        "a ''' bold\nacross lines ''' b",
+        "{{{{{subst:X|a={a}}}}}} and {{{{a}}}}} and {{a\nb}}",
+        "== h == x\n==\n=== a ==\n'''' four ''''''six''''''",
+        "[[https://apnews.com/article/x 1]] [//example.org a] [[]] [[|x]]",
+        "[http://a [http://b c] d] [http://a [[http://b c]] d] [[a|[[http://b c]]]]",
+        "[[User talk:B]][[[User talk:B]]] 01:02, 1 January 2025 (UTC)",
+    ]
+    for text in texts:
+        assert [text[start:end] for _, start, end in iter_top_level_nodes(text)] == parser_nodes(text)
+
+
+def test_same_nodes_and_statistics_as_parser_on_real_rfcs():
+    texts = real_rfc_texts()
+    assert len(texts) > 500
+    signed = 0
+    for text in texts:
+        expected = calculate_statistics(mwparserfromhell.parse(text))
+        assert calculate_statistics(text, engine='scanner') == expected
+        if not needs_parser(text):
+            assert [text[start:end] for _, start, end in iter_top_level_nodes(text)] == parser_nodes(text)
+            assert scan_signatures(text) == expected
+            signed += bool(expected)
+    assert signed > 200
+
+
+def test_find_section_matches_get_sections():
+    page = "lead rfc\n== One ==\nx\n=== Sub rfc ===\ny\n== Two rfc ==\nz\n"
+    sections = [str(section) for section in mwparserfromhell.parse(page).get_sections(include_lead=False)]
+    assert find_section(page, 'rfc') == sections[0] == "== One ==\nx\n=== Sub rfc ===\ny\n"
+    assert find_section(page, 'two') == "== Two rfc ==\nz\n"
+    assert find_section(page, 'lead') is None
+
+
+def test_markup_the_scanner_misreads_goes_to_the_parser():
+    texts = [
+        "<small>''[[User talk:Bob|talk]] 01:02, 1 January 2025 (UTC)'''",
+        "<span>''[[User talk:Bob|talk]] 01:02, 1 January 2025 (UTC)'''",
+        '[[User talk:B]]<ref 01:02, 0 r 2025 (UTC)></</ref>',
+        "<div>{{{'''</div>[[User talk:B]] 01:02, 1 January 2025 (UTC)<nowiki></nowiki>''''",
+        '[[User talk:Bob|talk]]* [[]][[ 01:02, 1 January 2025 (UTC)',
+        '[[User talk:B]]<small> 01:02, 1 January 2025 (UTC)<!--</small>-->',
+    ]
+    for text in texts:
+        assert needs_parser(text)
+        assert calculate_statistics(text, engine='scanner') == calculate_statistics(mwparserfromhell.parse(text))
+    assert not needs_parser(SECTION)
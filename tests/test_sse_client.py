@@ -0,0 +1,111 @@
+import asyncio
+
+from aiohttp import web
+
+from sse_client import EventStreamClient, SseParser, load_last_event_id, process_event_batches
+
+
+def test_parser_follows_the_event_stream_format():
+    parser = SseParser()
+    lines = [b': heartbeat', b'retry: 1500', b'id: 7', b'event: edit', b'data: {"a":', b'data:  1}', b'', b'',
+             b'data: x', b'']
+    events = [event for event in map(parser.feed, lines) if event is not None]
+    assert [tuple(event) for event in events] == [('7', 'edit', b'{"a":\n 1}'), ('7', 'message', b'x')]
+    assert events[0].decode().data == '{"a":\n 1}'
+    assert parser.retry_ms == 1500
+
+
+def test_client_resumes_after_a_dropped_connection(tmp_path):
+    total = 25
+    requested_ids = []
+
+    async def stream(request):
+        last = request.headers.get('Last-Event-ID')
+        requested_ids.append(last)
+        start = int(last) + 1 if last is not None else 0
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        await response.write(b'retry: 10\n\n')
+        # the first connection drops after ten events, the second after seven, both in the middle of an event
+        stop = min(total, start + [10, 7][len(requested_ids) - 1]) if len(requested_ids) <= 2 else total
+        for number in range(start, stop):
+            await response.write(f'id: {number}\ndata: event {number}\n\n'.encode())
+        if stop < total:
+            await response.write(f'id: {stop}\ndata: half'.encode())
+            request.transport.close()
+        return response
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/stream', stream)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+
+        state_path = str(tmp_path / 'state.json')
+        queue = asyncio.Queue(2)
+        stop = asyncio.Event()
+        received = []
+
+        def handle(event):
+            received.append(event.data)
+            if len(received) == total:
+                stop.set()
+
+        client = EventStreamClient(f'http://127.0.0.1:{port}/stream', queue, batch_size=4, batch_seconds=0.05,
+                                   initial_backoff=0.01, max_backoff=0.05)
+        consumer = asyncio.create_task(process_event_batches(queue, handle, state_path))
+        await asyncio.wait_for(client.run(stop), 10)
+        await queue.put(None)
+        await consumer
+        await runner.cleanup()
+        return client, received, state_path
+
+    client, received, state_path = asyncio.run(run())
+    assert received == [f'event {number}' for number in range(total)]
+    # every reconnect resumed after an event already received, so none was lost or repeated
+    assert requested_ids[0] is None and len(requested_ids) >= 3
+    assert all(0 <= int(last) < total for last in requested_ids[1:3])
+    assert load_last_event_id(state_path) == str(total - 1)
+
+
+def test_filter_sees_raw_bytes_and_rejected_events_are_not_decoded():
+    async def stream(request):
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        # the rejected events are not valid UTF-8: decoding them would end the stream
+        await response.write(b'id: 1\ndata: skip \xff\n\nid: 2\ndata: keep caf\xc3\xa9\n\nid: 3\ndata: skip \xfe\n\n')
+        # hold the connection open until the client stops
+        await asyncio.sleep(1)
+        return response
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/stream', stream)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+
+        queue = asyncio.Queue()
+        stop = asyncio.Event()
+        seen = []
+
+        def data_filter(raw):
+            seen.append(raw)
+            if len(seen) == 3:
+                stop.set()
+            return not raw.startswith(b'skip')
+
+        client = EventStreamClient(f'http://127.0.0.1:{port}/stream', queue, batch_seconds=0.01, data_filter=data_filter)
+        await asyncio.wait_for(client.run(stop), 10)
+        await runner.cleanup()
+        return client, seen, [event for batch in queue._queue for event in batch.events]
+
+    client, seen, queued = asyncio.run(run())
+    assert seen == [b'skip \xff', b'keep caf\xc3\xa9', b'skip \xfe']
+    assert [tuple(event) for event in queued] == [('2', 'message', 'keep café')]
+    assert (client.events_received, client.events_filtered, client.last_event_id) == (3, 2, '3')
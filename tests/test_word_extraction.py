@@ -0,0 +1,39 @@
+import pickle
+
+from word_extraction import KeywordEngine, find_words
+
+QUESTIONS = [
+    "Should the lead mention that Trump pardoned him?",
+    "Should the infobox include a photo of Trump?",
+    "Should the article include the subject's birth name in the lead?",
+]
+
+
+def build_engine(questions, top_k=3):
+    engine = KeywordEngine(top_k=top_k)
+    for question in questions:
+        engine.add_document(find_words(question))
+    return engine
+
+
+def test_distinctive_words_in_text_order():
+    engine = build_engine(QUESTIONS)
+    # 'should' is in every question and 'the' is a stop word
+    assert engine.keywords(find_words(QUESTIONS[0])) == "mention pardoned him"
+
+
+def test_keywords_do_not_depend_on_order():
+    forward = build_engine(QUESTIONS)
+    backward = build_engine(reversed(QUESTIONS))
+    for question in QUESTIONS:
+        assert forward.keywords(find_words(question)) == backward.keywords(find_words(question))
+    # asking for keywords leaves the counts alone
+    assert forward.document_frequency == build_engine(QUESTIONS).document_frequency
+
+
+def test_engine_survives_pickling():
+    engine = build_engine(QUESTIONS)
+    copy = pickle.loads(pickle.dumps(engine))
+    words = find_words(QUESTIONS[1])
+    assert copy.keywords(words, top_k=2) == engine.keywords(words, top_k=2)
+    assert engine.keywords([]) == ""
@@ -1,3 +1,7 @@
+import heapq
+import math
+from collections import Counter
+
 
 
 common_words = {
@@ -25,6 +29,9 @@ common_words = {
     'be': 1000,
 }
 
+# words that are never picked as keywords: wiki markup names and English function words
+STOP_WORDS = frozenset(common_words)
+
 def remove_common_words(word_list) -> list[str]:
     """
     Removes common words from the provided list of words.
@@ -64,22 +71,38 @@ def remove_common_words(word_list) -> list[str]:
 
     return filtered_words
 
-def extract_words(text) -> str:
+def find_words(text) -> list[str]:
     """
-    Extracts words from the given text. A word is defined as a sequence of
+    Finds the words in the given text. A word is defined as a sequence of
     alphabetic characters (a-z, A-Z). Non-alphabetic characters are treated
     as delimiters.
 
+    This step does not touch common_words, so it can run in any process and order.
+
     Parameters:
-    text (str): The input text from which to extract words.
+    text (str): The input text from which to find words.
 
     Returns:
-    str: A string of extracted words separated by spaces.
+    list of str: The words in the order they appear.
     """
     import re
 
     # Use regular expression to find all sequences of alphabetic characters
-    words = re.findall(r'[a-zA-Z]+', text)
+    return re.findall(r'[a-zA-Z]+', text)
+
+def select_words(words) -> str:
+    """
+    Removes common words and keeps the first 20 of the rest.
+
+    The word counts in common_words carry over between calls, so the result
+    depends on the order in which texts are passed in.
+
+    Parameters:
+    words (list of str): Words as returned by find_words.
+
+    Returns:
+    str: A string of extracted words separated by spaces.
+    """
     # Remove common words
     words = remove_common_words(words)
 
@@ -88,6 +111,77 @@ def extract_words(text) -> str:
 
     return " ".join(words)
 
+def extract_words(text) -> str:
+    """
+    Extracts words from the given text. A word is defined as a sequence of
+    alphabetic characters (a-z, A-Z). Non-alphabetic characters are treated
+    as delimiters.
+
+    Parameters:
+    text (str): The input text from which to extract words.
+
+    Returns:
+    str: A string of extracted words separated by spaces.
+    """
+    return select_words(find_words(text))
+
+class KeywordEngine:
+    """
+    Picks the most distinctive words of each RfC question by TF-IDF.
+
+    The first pass feeds every question to add_document to count in how many
+    questions each word appears. The second pass calls keywords for each question.
+    keywords does not change the engine, so its results do not depend on the order
+    questions are processed in, and a built engine can be pickled to worker processes.
+    """
+
+    def __init__(self, top_k: int = 20, stop_words: frozenset[str] = STOP_WORDS):
+        self.top_k = top_k
+        self.stop_words = stop_words
+        self.documents = 0
+        self.document_frequency: Counter[str] = Counter()
+
+    def add_document(self, words: list[str]) -> None:
+        """
+        Count one question towards the document frequencies.
+
+        Parameters:
+        words (list of str): The question's words, as returned by find_words.
+        """
+        self.documents += 1
+        self.document_frequency.update({word.lower() for word in words})
+
+    def idf(self, word: str) -> float:
+        """Smoothed inverse document frequency of a lower case word."""
+        return math.log((1 + self.documents) / (1 + self.document_frequency[word])) + 1
+
+    def keywords(self, words: list[str], top_k: int | None = None) -> str:
+        """
+        Returns the top_k words of a question with the highest TF-IDF, in the order they first appear.
+
+        Ties go to the word that appears first.
+
+        Parameters:
+        words (list of str): The question's words, as returned by find_words.
+        top_k (int): How many words to keep, defaults to the engine's top_k.
+
+        Returns:
+        str: A string of keywords separated by spaces.
+        """
+        term_frequency: Counter[str] = Counter()
+        first_seen: dict[str, tuple[int, str]] = {}
+        for position, word in enumerate(words):
+            word_lower = word.lower()
+            if word_lower in self.stop_words:
+                continue
+            term_frequency[word_lower] += 1
+            first_seen.setdefault(word_lower, (position, word))
+
+        chosen = heapq.nlargest(top_k or self.top_k, term_frequency,
+                                key=lambda w: (term_frequency[w] * self.idf(w), -first_seen[w][0]))
+        chosen.sort(key=lambda w: first_seen[w][0])
+        return " ".join(first_seen[w][1] for w in chosen)
+
 if __name__ == "__main__":
     sample_text = """
 {{rfcquote|text=